@@ -1,6 +1,23 @@
 from .lock    import DynamoDBLock
+from .metrics import DynamoDBLockMetrics
+from .cache   import DynamoDBLockCache
+from .limiter import DynamoDBLockLimiter, DynamoDBLockThrottledError
+from .codec   import DynamoDBLockCodec, DynamoDBLockJSONCodec, DynamoDBLockMsgpackCodec, DynamoDBLockCompressedCodec
+from .backoff import DynamoDBLockBackoff, DynamoDBLockExponentialBackoff, DynamoDBLockJitterBackoff
 from .policy  import DynamoDBLockPolicy
 from .schema  import DynamoDBLockSchema
+from .memory  import DynamoDBLockMemoryTable
+from .backend import DynamoDBLockBackend, DynamoDBLockTableBackend
+from .sqlite  import DynamoDBLockSQLiteBackend
+from .sharding import DynamoDBLockShardedBackend, DynamoDBLockPrefixBackend
+from .semaphore import DynamoDBLockSemaphore
+from .watcher import DynamoDBLockWatcher, DynamoDBLockChange, DynamoDBLockLocalFeed, DynamoDBLockStreamFeed
 from .worker  import DynamoDBLockWorker
 from .client  import DynamoDBLockClient
+from .manager import DynamoDBLockManager
 from .context import DynamoDBLockContext as locker
+
+try:
+    from .aio import AsyncDynamoDBLockClient
+    from .aio import AsyncDynamoDBLockContext as async_locker
+except ImportError: pass # trollius is not installed
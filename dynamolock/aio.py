@@ -0,0 +1,357 @@
+'''
+An event loop driven version of the lock client. The lock protocol
+is exactly the same as the blocking client (it is in fact driven by
+one), however all the waiting between retries and the heartbeat that
+renews the held leases run on the event loop instead of blocking a
+thread. The heartbeat renews each lock on its own lease deadline and
+keeps throttled locks to retry them, exactly like the worker of the
+blocking client (whose renewal logic it uses). The renewals are made
+on the executor of the event loop client, never on the worker pool.
+
+The blocking client waits out its fair queue (`fair`), its local
+handoff (`coalesce`) and its change feed (`watcher`) on a thread, so
+a blocking client with any of those options cannot be driven from
+the event loop and is refused.
+
+The boto dynamodb client is itself blocking, so each individual
+database call is made on a bounded executor; a waiter only occupies
+a thread while one of its requests is actually in flight. This allows
+a single event loop to wait on thousands of locks at once.
+
+This requires the `trollius` package to be installed.
+'''
+from functools import partial
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import trollius as asyncio
+from trollius import From, Return
+
+from .client  import DynamoDBLockClient
+from .limiter import DynamoDBLockThrottledError
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class AsyncDynamoDBLockClient(object):
+    ''' An asynchronous lock client that exposes the same operations
+    as the `DynamoDBLockClient` as coroutines::
+
+        from trollius import From
+        from dynamolock import AsyncDynamoDBLockClient
+
+        @asyncio.coroutine
+        def work(client):
+            lock = yield From(client.acquire_lock("my.lock"))
+            # perform locked activity here
+            yield From(client.release_lock(lock))
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the AsyncDynamoDBLockClient class
+
+        All the supplied parameters that are not listed are passed on
+        to the underlying blocking client if one is not supplied.
+
+        :param client: The blocking client to drive the protocol with
+        :param loop: The event loop to operate on (default the current loop)
+        :param executor: The executor to perform database calls with
+        :param concurrency: The maximum number of calls in flight (default 8)
+        :param period: The longest time in seconds between heartbeat checks (default 10)
+        :raises ValueError: If the blocking client is fair, coalesced, or watched
+        '''
+        self.loop        = kwargs.pop('loop', None) or asyncio.get_event_loop()
+        self.concurrency = max(kwargs.pop('concurrency', 8), 1)
+        self.executor    = kwargs.pop('executor', None) or ThreadPoolExecutor(self.concurrency)
+        self.period      = kwargs.pop('period', timedelta(seconds=10).total_seconds())
+        self.client      = kwargs.pop('client', None) or DynamoDBLockClient(**kwargs)
+        if self.client.queue or self.client.coalesce or self.client.watcher:
+            raise ValueError("the event loop client cannot wait on a fair, coalesced, or watched client")
+        self.locks       = self.client.locks
+        self.policy      = self.client.policy
+        self.owner       = self.client.owner
+        self.worker      = self.client.worker
+        self._heartbeat  = None
+        self._wakeup     = asyncio.Event(loop=self.loop)
+        self._deadlines  = {} # name -> (lock, next renewal deadline)
+
+    # ------------------------------------------------------------
+    # worker methods
+    # ------------------------------------------------------------
+
+    def startup(self):
+        ''' Start the heartbeat task on the event loop.
+        '''
+        if not self._heartbeat:
+            self._heartbeat = asyncio.ensure_future(self._run_heartbeat(), loop=self.loop)
+
+    @asyncio.coroutine
+    def shutdown(self):
+        ''' Stop the heartbeat task and close all of the existing
+        lock handles that we have outstanding leases to.
+        '''
+        if self._heartbeat:
+            self._heartbeat.cancel()
+            try:
+                yield From(self._heartbeat)
+            except asyncio.CancelledError: pass
+            self._heartbeat = None
+        result = yield From(self.release_all_locks())
+        raise Return(result)
+
+    # ------------------------------------------------------------
+    # locking manipulation methods
+    # ------------------------------------------------------------
+
+    @asyncio.coroutine
+    def touch_lock(self, lock):
+        ''' Touch the lock and update its version to renew the
+        lease we are currently holding on the lock (if we can).
+
+        :param lock: The lock to attempt to touch
+        :returns: The new lock if it was updated, None otherwise
+        '''
+        result = yield From(self._execute(self.client.touch_lock, lock))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def release_lock(self, lock, delete=None, **params):
+        ''' Release the supplied lock and apply any supplied udpates
+        to the underlying name.
+
+        :param lock: The lock to attempt to release
+        :param delete: True to also delete locks, False to mark them unlocked
+        :returns: True if the lock was released, False otherwise
+        '''
+        result = yield From(self._execute(self.client.release_lock, lock, delete, **params))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def release_all_locks(self, delete=None, **params):
+        ''' Release all the currently held locks by this instance of
+        the lock client (cached).
+
+        :param delete: True to also delete locks, False to mark them unlocked
+        :returns: True if all locks were released, False otherwise
+        '''
+        locks    = list(self.locks.values())
+        released = yield From(asyncio.gather(*[self.release_lock(lock, delete, **params)
+            for lock in locks], loop=self.loop))
+        raise Return(all(released))
+
+    @asyncio.coroutine
+    def acquire_lock(self, name, no_wait=False, **params):
+        ''' Attempt to acquire the lock with the paramaters
+        specified in the initial lock policy.
+
+        :param name: The name of the lock to acquire
+        :param no_wait: Try to acquire the lock without waiting
+        :returns: The acquired lock on success, or None
+        '''
+        if not self.client._is_name_acquirable(name):
+            raise Return(None)
+
+        attempt = self.client._start_acquire(name, no_wait)
+        created_lock = None
+        while self.client._is_acquiring(attempt):
+            tries = attempt.tries
+            try:
+                created_lock = yield From(self._execute(self.client._try_acquire, attempt, **params))
+                if created_lock:
+                    self._wakeup.set() # renew the new lock on its own lease
+                    break
+            except DynamoDBLockThrottledError:
+                _logger.debug("throttled trying to acquire lock: %s", name)
+                attempt.tries = max(attempt.tries, tries + 1) # count it as a try
+
+            if self.client._is_acquiring(attempt):
+                delay = self.client._get_acquire_delay(attempt)
+                _logger.debug("waiting %d ms to acquire lock %s, total wait %d ms", delay, name, attempt.waited_time)
+                yield From(asyncio.sleep(delay / 1000.0, loop=self.loop))
+                attempt.waited_time += delay
+
+        self.client._record_acquire(attempt, created_lock)
+        raise Return(created_lock)
+
+    @asyncio.coroutine
+    def try_acquire_lock(self, name, **params):
+        ''' Attempt to acquire the lock without waiting, instead
+        simply fail fast.
+
+        :param name: The name of the lock to acquire
+        :returns: The lock on success, None on failure
+        '''
+        result = yield From(self.acquire_lock(name, no_wait=True, **params))
+        raise Return(result)
+
+    @asyncio.coroutine
+    def try_acquire_any(self, names, limit=1, **params):
+        ''' Attempt to acquire up to `limit` of the locks in the
+        supplied candidate names without waiting.
+
+        :param names: The candidate names of the locks to acquire
+        :param limit: The maximum number of locks to acquire (default 1)
+        :returns: The list of acquired locks (possibly empty)
+        '''
+        result = yield From(self._execute(self.client.try_acquire_any, names, limit, **params))
+        if result: self._wakeup.set()
+        raise Return(result)
+
+    @asyncio.coroutine
+    def does_lock_exist(self, name, consistent=True):
+        ''' Check if a lock with the given name exists on the
+        backend database and is active.
+
+        :param name: The name of the lock to check for existance
+        :param consistent: False to allow an eventually consistent (or cached) read
+        :returns: True if the lock exists, False otherwise
+        '''
+        result = yield From(self.retrieve_lock(name, consistent))
+        raise Return(bool(result))
+
+    @asyncio.coroutine
+    def retrieve_lock(self, name, consistent=True):
+        ''' Retrieve the lock by the supplied name strictly
+        to view its data, but not to perform any updates.
+
+        :param name: The lock name to retrieve
+        :param consistent: False to allow an eventually consistent (or cached) read
+        :returns: The lock at the supplied name or None
+        '''
+        result = yield From(self._execute(self.client.retrieve_lock, name, consistent))
+        raise Return(result)
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _execute(self, method, *args, **kwargs):
+        ''' Run the supplied blocking client method on our
+        executor.
+
+        :param method: The blocking method to run
+        :returns: A future of the result of the method
+        '''
+        return self.loop.run_in_executor(self.executor, partial(method, *args, **kwargs))
+
+    @asyncio.coroutine
+    def _run_heartbeat(self):
+        ''' The event loop task used to update the lock leases
+        for the currently handled locks. Each lock is renewed when
+        its renewal deadline (see `DynamoDBLockWorker`) is due, and we
+        sleep until the earliest deadline or until a new lock is
+        acquired.
+        '''
+        while True:
+            self._wakeup.clear()
+            locks, deadline = self._get_due_locks()
+            if locks:
+                _logger.debug("starting next round of heartbeat: %d locks", len(locks))
+                start    = self.policy.get_new_timestamp()
+                touched  = yield From(asyncio.gather(*[self._touch_lock(lock)
+                    for lock in locks], loop=self.loop))
+                renewals = self.worker.settle(locks, touched, start)
+                for lock, renew_at in renewals:
+                    self._deadlines[lock.name] = (lock, renew_at)
+                continue
+
+            delay = self.period * 1000
+            if deadline is not None:
+                delay = min(delay, deadline - self.policy.get_new_timestamp())
+            try:
+                yield From(asyncio.wait_for(self._wakeup.wait(), max(delay, 0) / 1000.0, loop=self.loop))
+            except asyncio.TimeoutError: pass
+
+    @asyncio.coroutine
+    def _touch_lock(self, lock):
+        ''' Helper to renew a single lock on our executor, making
+        sure that an error on one lock does not abort the rest of the
+        heartbeat.
+
+        :param lock: The lock to renew
+        :returns: The renewed lock, the same lock if throttled, or None on failure
+        '''
+        try:
+            result = yield From(self.touch_lock(lock))
+        except DynamoDBLockThrottledError:
+            _logger.warning("throttled renewing lock, will retry: %s", lock.name)
+            result = lock
+        except Exception:
+            _logger.exception("failed to renew lock: %s", lock.name)
+            result = None
+        raise Return(result)
+
+    def _get_due_locks(self):
+        ''' Collect the held locks whose renewal is due, scheduling
+        any lock that we have not seen yet by its lease and dropping
+        the deadlines of the locks that are no longer held.
+
+        :returns: The due locks and the earliest deadline of the rest (or None)
+        '''
+        now, locks, deadline = self.policy.get_new_timestamp(), [], None
+        for name in set(self._deadlines) - set(self.locks):
+            del self._deadlines[name]
+
+        for name, lock in list(self.locks.items()):
+            scheduled = self._deadlines.get(name)
+            if not scheduled or scheduled[0] is not lock:
+                scheduled = self._deadlines[name] = (lock, self.worker.get_renewal_deadline(lock))
+            if scheduled[1] <= now:
+                locks.append(lock)
+            elif deadline is None or scheduled[1] < deadline:
+                deadline = scheduled[1]
+        return locks, deadline
+
+
+class AsyncDynamoDBLockContext(object):
+    ''' An asynchronous context manager to help using locks from a
+    coroutine. The trollius coroutines are generators, which cannot
+    use an `async with` statement, so it is entered and exited
+    explicitly:
+
+    .. code-block:: python
+
+        from dynamolock import AsyncDynamoDBLockContext as async_locker
+
+        context = async_locker(client=client, name="lock-to-get")
+        yield From(context.__aenter__())
+        try:
+            pass # perform locked activity here
+        finally: yield From(context.__aexit__(None, None, None))
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the AsyncDynamoDBLockContext
+
+        :param client: The asynchronous client to acquire the lock with
+        :param name: The name of the lock to acquire
+        '''
+        self.client = kwargs.get('client')
+        self.name   = kwargs.get('name')
+        self.lock   = None
+
+    @asyncio.coroutine
+    def __aenter__(self):
+        ''' On enter of the context manager, this will acquire
+        the specified lock.  When the lock has been acquired,
+        this will return.
+        '''
+        self.lock = yield From(self.client.acquire_lock(self.name))
+        raise Return(self)
+
+    @asyncio.coroutine
+    def __aexit__(self, ex_type, value, traceback):
+        ''' On exit of the contet manager, this will release
+        the currently being held lock. When this operation is
+        finished, this will return.
+        '''
+        if self.lock:
+            yield From(self.client.release_lock(self.lock))
@@ -0,0 +1,525 @@
+'''
+The backends implement the raw storage operations of the lock entries
+that the lock client builds the lock protocol on top of. Every write is
+a check-and-set against the expected values of the current entry, which
+is all that the protocol needs from the underlying storage.
+
+The default backend stores the locks in a dynamodb table, however any
+storage that can perform an atomic compare-and-swap may be used by
+implementing the `DynamoDBLockBackend` interface::
+
+    from dynamolock import DynamoDBLockClient
+    from dynamolock import DynamoDBLockSQLiteBackend
+
+    backend = DynamoDBLockSQLiteBackend(path='/var/run/locks.db')
+    client  = DynamoDBLockClient(backend=backend)
+'''
+import time
+import json
+from threading import Lock
+
+from boto.exception import JSONResponseError
+from boto.dynamodb2 import connect_to_region
+from boto.dynamodb2.layer1 import DynamoDBConnection
+from boto.dynamodb2.fields import HashKey
+from boto.dynamodb2.types import STRING
+from boto.dynamodb2.table import Table
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException, ItemNotFound
+
+from .schema  import DynamoDBLockSchema
+from .limiter import DynamoDBLockThrottledError
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+THROTTLE_ERRORS = frozenset([
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+])
+
+THROTTLE_REASONS = frozenset([
+    'ProvisionedThroughputExceeded',
+    'ThrottlingError',
+])
+
+TRANSACT_LIMIT = 100 # the most entries a single dynamodb transaction may write
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockBackend(object):
+    ''' The interface for the storage of the lock entries. All of
+    the entries are supplied and returned as dicts keyed by the lock
+    field names (`name`, `owner`, `version`, ...); it is up to each
+    backend to convert them with the schema.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockBackend class
+
+        :param schema: The schema of the database table to work with
+        '''
+        self.schema = kwargs.get('schema', None) or DynamoDBLockSchema()
+
+    def create_entry(self, record):
+        ''' Create a new lock entry as long as there is not already
+        an entry with the same name.
+
+        :param record: The fields of the entry to create
+        :returns: True if successful, False otherwise
+        '''
+        raise NotImplementedError("create_entry")
+
+    def retrieve_entry(self, name, consistent=True):
+        ''' Retrieve the current lock entry with the supplied name.
+
+        :param name: The name of the entry to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        raise NotImplementedError("retrieve_entry")
+
+    def retrieve_entries(self, names, consistent=True):
+        ''' Retrieve the current lock entries with the supplied
+        names. Backends that can read many entries at once should
+        override this, by default each entry is read in turn.
+
+        :param names: The names of the entries to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: A dict of the fields of the entries that exist by name
+        '''
+        entries = { name : self.retrieve_entry(name, consistent) for name in names }
+        return { name : entry for name, entry in entries.items() if entry }
+
+    def update_entry(self, name, update, expect):
+        ''' Update the fields of the lock entry with the supplied
+        name as long as all the expected fields are unchanged.
+
+        :param name: The name of the entry to update
+        :param update: The fields of the entry to update
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        raise NotImplementedError("update_entry")
+
+    def delete_entry(self, name, expect):
+        ''' Delete the lock entry with the supplied name as long
+        as all the expected fields are unchanged.
+
+        :param name: The name of the entry to delete
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        raise NotImplementedError("delete_entry")
+
+    def transact_entries(self, writes):
+        ''' Apply all of the supplied writes atomically, so that
+        either every write is applied or none are. Each write is a
+        (name, update, expect) tuple: with an expect of None it creates
+        the entry from the update (see `create_entry`), otherwise it
+        updates the existing entry (see `update_entry`).
+
+        :param writes: The (name, update, expect) writes to apply
+        :returns: True if every write was applied, False otherwise
+        '''
+        raise NotImplementedError("transact_entries")
+
+    def can_transact(self, names):
+        ''' Check if the entries with the supplied names can be
+        written together by `transact_entries`. A backend that stores
+        all of its entries in one place can always write them together.
+
+        :param names: The names of the entries to write together
+        :returns: True if they can be written in one transaction, False otherwise
+        '''
+        return True
+
+
+class DynamoDBLockTableBackend(DynamoDBLockBackend):
+    ''' The backend that stores the lock entries in a dynamodb
+    table (or anything that mimics the boto `Table` such as the
+    `DynamoDBLockMemoryTable`).
+
+    The table handles (and their connections) are shared by every
+    backend in the process with the same table name and region, and
+    each table is only verified to exist once per process. So only
+    the first client in a process pays for the `describe` round trip,
+    and it can skip even that with `verify=False`::
+
+        backend = DynamoDBLockTableBackend(region='us-west-2', verify='lazy')
+        backend.create_table(wait=True) # if the table may not exist yet
+    '''
+
+    _tables       = {}      # (table name, region) -> table handle
+    _connections  = {}      # region -> connection
+    _verified     = set()   # (table name, region) known to exist
+    _tables_mutex = Lock()
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockTableBackend class
+
+        :param schema: The schema of the database table to work with
+        :param table: The current handle to the dynamodb table client
+        :param region: The region of the dynamodb table (default the boto default)
+        :param verify: True to verify the table now, 'lazy' on first use, False never (default True)
+        :param create: True to create the table if verifying finds it missing (default False)
+        '''
+        super(DynamoDBLockTableBackend, self).__init__(**kwargs)
+        self.region = kwargs.get('region', None)
+        self.verify = kwargs.get('verify', True)
+        self.create = kwargs.get('create', False)
+        self.table  = kwargs.get('table', None)
+
+        if self.table is not None:
+            self.verify = False # the caller owns the table handle
+        else: self.table = self._get_table()
+
+        if self.verify is True:
+            self.verify_table()
+
+    @classmethod
+    def clear_cache(cls):
+        ''' Clear the process wide cache of table handles and
+        connections so that the next backend starts fresh.
+        '''
+        with cls._tables_mutex:
+            cls._tables.clear()
+            cls._connections.clear()
+            cls._verified.clear()
+
+    def verify_table(self):
+        ''' Verify that the underlying table exists (unless it has
+        already been verified in this process), creating it if the
+        backend was asked to.
+
+        :returns: True if the table exists, False otherwise
+        '''
+        key = self._get_cache_key()
+        if key in self._verified:
+            return True
+
+        try:
+            _logger.debug("current table description:\n%s", self.table.describe())
+        except JSONResponseError, ex:
+            if not self.create: raise
+            _logger.info("table %s does not exist, creating it", self.schema.table_name)
+            self.create_table(wait=True)
+
+        with self._tables_mutex:
+            self._verified.add(key)
+        return True
+
+    def create_table(self, wait=False, timeout=None):
+        ''' Create the underlying dynamodb table for the locks.
+
+        :param wait: True to wait until the table is ACTIVE, False otherwise
+        :param timeout: The seconds to wait for the table (default forever)
+        :returns: True if the table is ACTIVE, False otherwise
+        '''
+        self.table = Table.create(self.schema.table_name,
+            schema = [ HashKey(self.schema.name, data_type=STRING) ],
+            throughput = {
+                'read':  self.schema.read_capacity,
+                'write': self.schema.write_capacity,
+            },
+            connection = self.table.connection)
+
+        with self._tables_mutex:
+            self._tables[self._get_cache_key()] = self.table
+        return self.wait_for_table(timeout) if wait else False
+
+    def wait_for_table(self, timeout=None, period=1.0):
+        ''' Wait for the underlying dynamodb table to become ACTIVE.
+
+        :param timeout: The seconds to wait for the table (default forever)
+        :param period: The seconds to wait between checks (default 1)
+        :returns: True if the table is ACTIVE, False if we timed out
+        '''
+        deadline = (time.time() + timeout) if timeout is not None else None
+        while True:
+            status = self.table.describe()['Table']['TableStatus']
+            _logger.debug("table %s is %s", self.schema.table_name, status)
+            if status == 'ACTIVE':
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(period)
+
+    def create_entry(self, record):
+        ''' Create a new lock entry as long as there is not already
+        an entry with the same name.
+
+        :param record: The fields of the entry to create
+        :returns: True if successful, False otherwise
+        '''
+        self._check_table()
+
+        expects = { self.schema.name: { 'Exists' : "false" } }
+        encoded = self.schema.to_schema(record)
+        encoded = self.table._encode_keys(encoded)
+
+        try:
+            return self._call(self.table._put_item, encoded, expects=expects)
+        except ConditionalCheckFailedException:
+            _logger.debug("lost the race to create lock entry for: %s", record['name'])
+        except JSONResponseError:
+            _logger.exception("failed to create lock entry for: %s", record['name'])
+        return False
+
+    def retrieve_entry(self, name, consistent=True):
+        ''' Retrieve the current lock entry with the supplied name.
+
+        :param name: The name of the entry to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        self._check_table()
+
+        query  = {
+            self.schema.name: name,
+            'consistent': consistent,
+        }
+
+        try:
+            record = self._call(self.table.get_item, **query)
+            return self.schema.to_dict(record)
+        except ItemNotFound, ex:
+            _logger.debug("lock entry does not exist: %s", name)
+        return None
+
+    def retrieve_entries(self, names, consistent=True):
+        ''' Retrieve the current lock entries with the supplied
+        names using as few `BatchGetItem` requests as possible.
+
+        :param names: The names of the entries to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: A dict of the fields of the entries that exist by name
+        '''
+        self._check_table()
+
+        if not names:
+            return {}
+
+        keys    = [{ self.schema.name : name } for name in names]
+        records = self._call(lambda: list(self.table.batch_get(keys=keys, consistent=consistent)))
+        records = [self.schema.to_dict(record) for record in records]
+        return { record['name'] : record for record in records }
+
+    def update_entry(self, name, update, expect):
+        ''' Update the fields of the lock entry with the supplied
+        name as long as all the expected fields are unchanged.
+
+        :param name: The name of the entry to update
+        :param update: The fields of the entry to update
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        self._check_table()
+
+        key     = { self.schema.name : name }
+
+        updated = self.schema.to_schema(update)
+        updated = self.table._encode_keys(updated)
+        updated = { k : { 'Value': v, 'Action': 'PUT' } for k, v in updated.items() }
+
+        expects = self.schema.to_schema(expect)
+        expects = self.table._encode_keys(expects)
+        expects = { k : { 'Value': v } for k, v in expects.items() }
+
+        try:
+            return self._call(self.table._update_item, key, updated, expects=expects)
+        except ConditionalCheckFailedException:
+            _logger.debug("lost the race to update lock entry for: %s", name)
+        return False
+
+    def delete_entry(self, name, expect):
+        ''' Delete the lock entry with the supplied name as long
+        as all the expected fields are unchanged.
+
+        :param name: The name of the entry to delete
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        self._check_table()
+
+        expected = self.schema.to_schema(expect)
+        expected = { '%s__eq' % key : val for key, val in expected.items() }
+        params   = { self.schema.name : name }
+
+        try:
+            return self._call(self.table.delete_item, expected=expected, **params)
+        except ConditionalCheckFailedException, ex:
+            _logger.debug("lost the race to delete lock entry for: %s", name)
+        return False
+
+    def transact_entries(self, writes):
+        ''' Apply all of the supplied writes atomically with a single
+        `TransactWriteItems` request (boto 2 has no wrapper for it, so
+        the request is made directly on the table connection).
+
+        :param writes: The (name, update, expect) writes to apply
+        :returns: True if every write was applied, False otherwise
+        :raises DynamoDBLockThrottledError: If the request was throttled
+        '''
+        return self.transact_tables([(self, write) for write in writes])
+
+    def transact_tables(self, writes):
+        ''' Apply all of the supplied writes to the entries of this
+        and other table backends atomically with a single request made
+        through our table. Every other backend must be one that we
+        `can_transact_with`.
+
+        :param writes: The (backend, (name, update, expect)) writes to apply
+        :returns: True if every write was applied, False otherwise
+        :raises DynamoDBLockThrottledError: If the request was throttled
+        '''
+        for backend in set(write[0] for write in writes):
+            backend._check_table()
+
+        items = [backend._get_transact_item(*write) for backend, write in writes]
+        try:
+            self._call(self._transact_write_items, items)
+            return True
+        except JSONResponseError, ex:
+            if ex.error_code != 'TransactionCanceledException': raise
+            reasons = [reason.get('Code') for reason in (ex.body or {}).get('CancellationReasons', [])]
+            if THROTTLE_REASONS.intersection(reasons):
+                raise DynamoDBLockThrottledError("%s: %s" % (ex.error_code, ex.error_message))
+            _logger.debug("lost the race to write lock entries for: %s", [write[1][0] for write in writes])
+        return False
+
+    def can_transact_with(self, other):
+        ''' Check if the entries of the supplied backend can be
+        written in the same transaction as ours: it must be a table
+        backend on the same connection (a dynamodb transaction may span
+        tables of one account and region). A table that applies the
+        transactions itself (such as the in-memory table) can only
+        write its own entries.
+
+        :param other: The backend to write together with
+        :returns: True if we can write both in one transaction, False otherwise
+        '''
+        if other is self or getattr(other, 'table', None) is self.table:
+            return True
+        if getattr(self.table, 'transact_write_items', None) is not None:
+            return False
+        return (isinstance(other, DynamoDBLockTableBackend)
+            and getattr(other.table, 'transact_write_items', None) is None
+            and other.table.connection is self.table.connection)
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _call(self, method, *args, **kwargs):
+        ''' Call the supplied table method, converting the errors
+        that mean the table is out of capacity (or briefly failing)
+        into a `DynamoDBLockThrottledError` so the client can retry.
+
+        :param method: The table method to call
+        :returns: The result of the table method
+        :raises DynamoDBLockThrottledError: If the request was throttled
+        '''
+        try:
+            return method(*args, **kwargs)
+        except JSONResponseError, ex:
+            if (ex.status >= 500) or (ex.error_code in THROTTLE_ERRORS):
+                raise DynamoDBLockThrottledError("%s: %s" % (ex.error_code or ex.status, ex.error_message))
+            raise
+
+    def _transact_write_items(self, items):
+        ''' Make a `TransactWriteItems` request of the supplied items,
+        through the table itself if it supports them (as the in-memory
+        table does), otherwise through its connection.
+
+        :param items: The encoded transaction items to write
+        :returns: The response of the request
+        '''
+        transact = getattr(self.table, 'transact_write_items', None)
+        if transact is not None:
+            return transact(items)
+        body = json.dumps({ 'TransactItems': items })
+        return self.table.connection.make_request('TransactWriteItems', body)
+
+    def _get_transact_item(self, name, update, expect):
+        ''' Build the transaction item of a single write: a `Put`
+        that the entry does not exist yet, or an `Update` of the
+        existing entry that the expected fields are unchanged.
+
+        :param name: The name of the entry to write
+        :param update: The fields of the entry to write
+        :param expect: The fields we expect to not have changed (None to create)
+        :returns: The encoded transaction item
+        '''
+        names, values = { '#n': self.schema.name }, {}
+        if expect is None:
+            record = self.table._encode_keys(self.schema.to_schema(dict(update, name=name)))
+            return { 'Put': {
+                'TableName': self.table.table_name,
+                'Item': record,
+                'ConditionExpression': 'attribute_not_exists(#n)',
+                'ExpressionAttributeNames': names,
+            } }
+
+        updated = self.table._encode_keys(self.schema.to_schema(update))
+        updated.pop(self.schema.name, None) # the key cannot be updated
+        expects = self.table._encode_keys(self.schema.to_schema(expect))
+        sets, checks = [], []
+        for index, (key, value) in enumerate(sorted(updated.items())):
+            names['#u%d' % index], values[':u%d' % index] = key, value
+            sets.append('#u%d = :u%d' % (index, index))
+        for index, (key, value) in enumerate(sorted(expects.items())):
+            names['#e%d' % index], values[':e%d' % index] = key, value
+            checks.append('#e%d = :e%d' % (index, index))
+
+        return { 'Update': {
+            'TableName': self.table.table_name,
+            'Key': self.table._encode_keys({ self.schema.name: name }),
+            'UpdateExpression': 'SET ' + ', '.join(sets),
+            'ConditionExpression': ' AND '.join(['attribute_exists(#n)'] + checks),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        } }
+
+    def _get_cache_key(self):
+        ''' Retrieve the key of our table in the process cache.
+
+        :returns: The (table name, region) of our table
+        '''
+        return (self.schema.table_name, self.region)
+
+    def _get_table(self):
+        ''' Retrieve the shared handle to the underlying dynamodb
+        table, creating it (and its connection) if this is the first
+        use of the table in this process. This makes no network calls.
+
+        :returns: A handle to the underlying dynamodb table
+        '''
+        key = self._get_cache_key()
+        with self._tables_mutex:
+            if key not in self._tables:
+                if self.region not in self._connections:
+                    self._connections[self.region] = (connect_to_region(self.region)
+                        if self.region else DynamoDBConnection())
+                self._tables[key] = Table(self.schema.table_name,
+                    schema = [ HashKey(self.schema.name, data_type=STRING) ],
+                    connection = self._connections[self.region])
+            return self._tables[key]
+
+    def _check_table(self):
+        ''' Perform the lazy verification of the table before the
+        first operation if it was requested.
+        '''
+        if self.verify == 'lazy':
+            self.verify_table()
+            self.verify = False
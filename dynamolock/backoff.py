@@ -0,0 +1,117 @@
+'''
+The backoff strategies decide how long an acquire attempt waits
+between each read of a lock that it failed to get. They can be
+supplied to the policy to tune how quickly contended locks are picked
+up versus how hard the waiters hit the lock table::
+
+    from datetime import timedelta
+    from dynamolock import DynamoDBLockPolicy
+    from dynamolock import DynamoDBLockJitterBackoff
+
+    backoff = DynamoDBLockJitterBackoff(
+        base=timedelta(milliseconds=25), cap=timedelta(seconds=2))
+    policy  = DynamoDBLockPolicy(backoff=backoff)
+
+All of the delays are in milliseconds.
+'''
+import json
+import random
+from datetime import timedelta
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockBackoff(object):
+    ''' The constant backoff strategy, which always waits the
+    same base period between retries. This is the default strategy
+    and is the base class of the other strategies.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockBackoff class
+
+        :param base: The base time to wait between retries (default 10 seconds)
+        :param cap: The maximum time to wait between retries (default 1 minute)
+        '''
+        base = kwargs.get('base', timedelta(seconds=10))
+        cap  = kwargs.get('cap',  timedelta(minutes=1))
+
+        self.base = long(base.total_seconds() * 1000)
+        self.cap  = max(long(cap.total_seconds() * 1000), self.base)
+
+    def get_delay(self, tries, last_delay=None):
+        ''' Retrieve the amount of time to wait before the next
+        retry of an acquire attempt.
+
+        :param tries: The number of tries made so far
+        :param last_delay: The previous delay in milliseconds (or None)
+        :returns: The time to wait in milliseconds
+        '''
+        return self.base
+
+    # ------------------------------------------------------------
+    # magic methods
+    # ------------------------------------------------------------
+
+    def __str__(self):
+        return json.dumps(dict(self.__dict__, strategy=self.__class__.__name__))
+
+    __repr__ = __str__
+
+
+class DynamoDBLockExponentialBackoff(DynamoDBLockBackoff):
+    ''' The exponential backoff strategy, which doubles the wait
+    after every failed try up to the cap. With `jitter` enabled
+    (the default) the actual wait is chosen uniformly from zero up
+    to that value so that waiters do not retry in lockstep.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockExponentialBackoff class
+
+        :param base: The base time to wait between retries (default 10 seconds)
+        :param cap: The maximum time to wait between retries (default 1 minute)
+        :param jitter: True to randomize each wait, False otherwise (default True)
+        '''
+        super(DynamoDBLockExponentialBackoff, self).__init__(**kwargs)
+        self.jitter = kwargs.get('jitter', True)
+
+    def get_delay(self, tries, last_delay=None):
+        ''' Retrieve the amount of time to wait before the next
+        retry of an acquire attempt.
+
+        :param tries: The number of tries made so far
+        :param last_delay: The previous delay in milliseconds (or None)
+        :returns: The time to wait in milliseconds
+        '''
+        delay = min(self.cap, self.base * (2 ** min(max(tries - 1, 0), 32)))
+        if self.jitter:
+            delay = long(random.uniform(0, delay))
+        return delay
+
+
+class DynamoDBLockJitterBackoff(DynamoDBLockBackoff):
+    ''' The decorrelated jitter backoff strategy, which picks each
+    wait at random between the base and three times the previous
+    wait, up to the cap. This spreads out waiters that started at
+    the same time while still backing off under contention.
+    '''
+
+    def get_delay(self, tries, last_delay=None):
+        ''' Retrieve the amount of time to wait before the next
+        retry of an acquire attempt.
+
+        :param tries: The number of tries made so far
+        :param last_delay: The previous delay in milliseconds (or None)
+        :returns: The time to wait in milliseconds
+        '''
+        last_delay = max(last_delay or self.base, self.base)
+        return min(self.cap, long(random.uniform(self.base, last_delay * 3)))
@@ -0,0 +1,15 @@
+'''
+The benchmarks of the lock protocol, which run the real lock client
+against a local stand-in of the lock table so that the results measure
+the protocol itself rather than the network. The results are emitted as
+JSON so that they can be compared across releases::
+
+    python -m dynamolock.benchmark --threads=32 --names=4 --duration=10 > before.json
+
+The same benchmarks can be run from code::
+
+    from dynamolock.benchmark import DynamoDBLockBenchmark
+
+    results = DynamoDBLockBenchmark(threads=32, names=4).run()
+'''
+from .contention import DynamoDBLockBenchmark
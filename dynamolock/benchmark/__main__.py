@@ -0,0 +1,79 @@
+'''
+Run the lock benchmarks from the command line and print the results
+as JSON.
+'''
+import sys
+import json
+from optparse import OptionParser
+
+from .contention import DynamoDBLockBenchmark, BACKOFFS
+
+#---------------------------------------------------------------------------#
+# get script configuration
+#---------------------------------------------------------------------------#
+
+def _get_options():
+    ''' A helper method to parse the command line options
+
+    :returns: The options manager
+    '''
+    parser = OptionParser(prog='python -m dynamolock.benchmark')
+
+    parser.add_option("-t", "--threads", type="int",
+        help="The number of contending threads per process",
+        dest="threads", default=8)
+
+    parser.add_option("-p", "--processes", type="int",
+        help="The number of contending processes",
+        dest="processes", default=1)
+
+    parser.add_option("-n", "--names", type="int",
+        help="The number of lock names to contend for",
+        dest="names", default=1)
+
+    parser.add_option("-d", "--duration", type="float",
+        help="The seconds to run the contention for",
+        dest="duration", default=5.0)
+
+    parser.add_option("--hold", type="int",
+        help="The milliseconds to hold each acquired lock",
+        dest="hold", default=1)
+
+    parser.add_option("--acquire-timeout", type="int",
+        help="The milliseconds to try each acquire for",
+        dest="acquire_timeout", default=1000)
+
+    parser.add_option("--retry-period", type="int",
+        help="The milliseconds of the base retry delay",
+        dest="retry_period", default=5)
+
+    parser.add_option("--lock-duration", type="int",
+        help="The milliseconds of each lock lease",
+        dest="lock_duration", default=10000)
+
+    parser.add_option("--backoff", type="choice", choices=sorted(BACKOFFS),
+        help="The backoff strategy of the acquire retries",
+        dest="backoff", default='constant')
+
+    parser.add_option("--held-locks", type="int",
+        help="The number of held locks to sweep",
+        dest="held_locks", default=1000)
+
+    (opt, arg) = parser.parse_args()
+    return opt
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+
+def main():
+    ''' Run the benchmarks with the command line options and
+    print their results as JSON.
+    '''
+    options = vars(_get_options())
+    results = DynamoDBLockBenchmark(**options).run()
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+'''
+The contention benchmark runs a number of contenders (each a separate
+lock client, as if on separate hosts) that repeatedly acquire, hold, and
+release a random lock from a small set of names for a fixed amount of
+time. The threads of a single process share an in-memory table, while
+multiple processes share a SQLite backend in a temporary file.
+
+The acquire latencies are reported for the successful acquires, while
+the time spent on acquires that gave up is reported separately (as the
+time to give up is bounded by the acquire timeout, not by contention).
+'''
+import os
+import math
+import time
+import random
+import shutil
+import tempfile
+from threading import Thread
+from datetime import timedelta
+from multiprocessing import Pool
+
+from ..backoff import DynamoDBLockBackoff, DynamoDBLockExponentialBackoff, DynamoDBLockJitterBackoff
+from ..policy  import DynamoDBLockPolicy
+from ..memory  import DynamoDBLockMemoryTable
+from ..backend import DynamoDBLockTableBackend
+from ..sqlite  import DynamoDBLockSQLiteBackend
+from ..metrics import DynamoDBLockMetrics
+from ..client  import DynamoDBLockClient
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+BACKOFFS = {
+    'constant':    DynamoDBLockBackoff,
+    'exponential': DynamoDBLockExponentialBackoff,
+    'jitter':      DynamoDBLockJitterBackoff,
+}
+
+#--------------------------------------------------------------------------------
+# utilities
+#--------------------------------------------------------------------------------
+
+def get_percentile(values, percentile):
+    ''' Retrieve the nearest rank percentile of the supplied
+    sorted values.
+
+    :param values: The sorted values to get the percentile of
+    :param percentile: The percentile to retrieve (0 to 100)
+    :returns: The percentile value, or None without values
+    '''
+    if not values: return None
+    rank = int(math.ceil(round(percentile * len(values) / 100.0, 6))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+def get_fairness(counts):
+    ''' Retrieve the Jain fairness index of the supplied counts,
+    which is 1.0 when every contender got the same share and 1/n
+    when a single contender got everything.
+
+    :param counts: The number of acquires of each contender
+    :returns: The fairness index of the counts
+    '''
+    total = sum(counts)
+    if not total: return None
+    return total ** 2 / float(len(counts) * sum(count ** 2 for count in counts))
+
+def _run_process(options):
+    ''' Run the contenders of a single process and collect their
+    raw results. This is at the module level so that it can be run
+    by a multiprocessing pool.
+
+    :param options: The options of the benchmark and the process
+    :returns: The raw results of the process
+    '''
+    benchmark = DynamoDBLockBenchmark(**options)
+    backend   = DynamoDBLockSQLiteBackend(path=options['path'])
+    return benchmark._run_contenders(backend)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockBenchmark(object):
+    ''' The benchmark of the lock protocol under contention and of
+    the heartbeat sweep of many held locks.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockBenchmark class
+
+        :param threads: The number of contending threads per process (default 8)
+        :param processes: The number of contending processes (default 1)
+        :param names: The number of lock names to contend for (default 1)
+        :param duration: The seconds to run the contention for (default 5)
+        :param hold: The milliseconds to hold each acquired lock (default 1)
+        :param acquire_timeout: The milliseconds to try each acquire for (default 1000)
+        :param retry_period: The milliseconds of the base retry delay (default 5)
+        :param lock_duration: The milliseconds of each lock lease (default 10000)
+        :param backoff: The backoff strategy, constant|exponential|jitter (default constant)
+        :param held_locks: The number of held locks to sweep (default 1000)
+        '''
+        self.threads         = kwargs.get('threads', 8)
+        self.processes       = kwargs.get('processes', 1)
+        self.names           = kwargs.get('names', 1)
+        self.duration        = kwargs.get('duration', 5.0)
+        self.hold            = kwargs.get('hold', 1)
+        self.acquire_timeout = kwargs.get('acquire_timeout', 1000)
+        self.retry_period    = kwargs.get('retry_period', 5)
+        self.lock_duration   = kwargs.get('lock_duration', 10000)
+        self.backoff         = kwargs.get('backoff', 'constant')
+        self.held_locks      = kwargs.get('held_locks', 1000)
+
+    def get_options(self):
+        ''' Retrieve the options the benchmark was run with.
+
+        :returns: A dict of the options of the benchmark
+        '''
+        return {
+            'threads':         self.threads,
+            'processes':       self.processes,
+            'names':           self.names,
+            'duration':        self.duration,
+            'hold':            self.hold,
+            'acquire_timeout': self.acquire_timeout,
+            'retry_period':    self.retry_period,
+            'lock_duration':   self.lock_duration,
+            'backoff':         self.backoff,
+            'held_locks':      self.held_locks,
+        }
+
+    def get_policy(self):
+        ''' Retrieve the policy that every contender runs with.
+
+        :returns: The policy of the contenders
+        '''
+        retry_period = timedelta(milliseconds=self.retry_period)
+        return DynamoDBLockPolicy(
+            acquire_timeout = timedelta(milliseconds=self.acquire_timeout),
+            retry_period    = retry_period,
+            lock_duration   = timedelta(milliseconds=self.lock_duration),
+            backoff         = BACKOFFS[self.backoff](base=retry_period))
+
+    def run(self):
+        ''' Run all of the benchmarks and report their results.
+
+        :returns: A dict of the options and results of the benchmarks
+        '''
+        return {
+            'options':    self.get_options(),
+            'contention': self.run_contention(),
+            'sweep':      self.run_sweep(),
+        }
+
+    def run_contention(self):
+        ''' Run the contention benchmark and summarize its results.
+
+        :returns: A dict of the results of the contention benchmark
+        '''
+        if self.processes <= 1:
+            backend = DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable())
+            results = [self._run_contenders(backend)]
+        else:
+            folder = tempfile.mkdtemp(prefix='dynamolock')
+            try:
+                options = dict(self.get_options(), path=os.path.join(folder, 'locks.db'))
+                DynamoDBLockSQLiteBackend(path=options['path']) # create the table once
+                pool    = Pool(processes=self.processes)
+                try:
+                    results = pool.map(_run_process, [options] * self.processes)
+                finally: pool.close()
+            finally: shutil.rmtree(folder, ignore_errors=True)
+
+        return self._summarize(results)
+
+    def run_sweep(self):
+        ''' Run the heartbeat sweep benchmark of a single client
+        holding many locks.
+
+        :returns: A dict of the results of the sweep benchmark
+        '''
+        client = DynamoDBLockClient(table=DynamoDBLockMemoryTable(), policy=self.get_policy())
+        for index in range(self.held_locks):
+            client.acquire_lock('sweep.%d' % index, no_wait=True)
+
+        sweeps = [client.worker.sweep() for _ in range(5)]
+        client.worker.stop()
+        duration = sorted(sweep.duration for sweep in sweeps)[len(sweeps) // 2]
+        return {
+            'held_locks':  len(client.locks),
+            'failures':    sum(sweep.failures for sweep in sweeps),
+            'duration_ms': duration,
+            'per_1k_ms':   duration * 1000.0 / max(self.held_locks, 1),
+        }
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _run_contenders(self, backend):
+        ''' Run the contender threads of this process against the
+        supplied backend until the duration has passed.
+
+        :param backend: The backend that all of the contenders share
+        :returns: The raw results of this process
+        '''
+        metrics   = DynamoDBLockMetrics()
+        policy    = self.get_policy()
+        names     = ['lock.%d' % index for index in range(self.names)]
+        deadline  = time.time() + self.duration
+        latencies = [[] for _ in range(self.threads)]
+        failed    = [[] for _ in range(self.threads)]
+        acquires  = [0] * self.threads
+
+        def contend(index):
+            client = DynamoDBLockClient(backend=backend, policy=policy, metrics=metrics)
+            while time.time() < deadline:
+                start = time.time()
+                lock  = client.acquire_lock(random.choice(names))
+                if not lock:
+                    failed[index].append((time.time() - start) * 1000)
+                    continue
+                latencies[index].append((time.time() - start) * 1000)
+                acquires[index] += 1
+                if self.hold: time.sleep(self.hold / 1000.0)
+                client.release_lock(lock)
+
+        threads = [Thread(target=contend, args=(index,)) for index in range(self.threads)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+
+        def get_count(operation):
+            histogram = metrics.get_histogram('dynamolock_backend_latency_ms', operation=operation)
+            return histogram.count if histogram else 0
+
+        conflicts = sum(value for (name, _), value in metrics.counters.items()
+            if name == 'dynamolock_acquire_conflicts_total')
+
+        return {
+            'latencies': [latency for values in latencies for latency in values],
+            'failed':    [latency for values in failed for latency in values],
+            'acquires':  acquires,
+            'reads':     get_count('get'),
+            'conflicts': conflicts,
+        }
+
+    def _summarize(self, results):
+        ''' Merge the raw results of every process into the final
+        report of the contention benchmark.
+
+        :param results: The raw results of each process
+        :returns: A dict of the results of the contention benchmark
+        '''
+        latencies = sorted(latency for result in results for latency in result['latencies'])
+        failed    = sorted(latency for result in results for latency in result['failed'])
+        acquires  = [count for result in results for count in result['acquires']]
+        total     = sum(acquires)
+        reads     = sum(result['reads'] for result in results)
+        conflicts = sum(result['conflicts'] for result in results)
+
+        return {
+            'acquires':         total,
+            'failures':         len(failed),
+            'acquires_per_sec': total / float(self.duration),
+            'latency_p50_ms':   get_percentile(latencies, 50),
+            'latency_p99_ms':   get_percentile(latencies, 99),
+            'latency_p999_ms':  get_percentile(latencies, 99.9),
+            'failed_p50_ms':    get_percentile(failed, 50),
+            'failed_p99_ms':    get_percentile(failed, 99),
+            'wasted_reads':     (reads - total) / float(total) if total else None,
+            'wasted_writes':    conflicts / float(total) if total else None,
+            'fairness':         get_fairness(acquires),
+            'min_acquires':     min(acquires) if acquires else 0,
+            'max_acquires':     max(acquires) if acquires else 0,
+        }
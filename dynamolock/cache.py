@@ -0,0 +1,137 @@
+'''
+The cache keeps the recently observed states of the locks that a client
+does not hold, so that frequent calls to `retrieve_lock` and
+`does_lock_exist` do not each cost a read of the lock table::
+
+    from datetime import timedelta
+    from dynamolock import DynamoDBLockClient, DynamoDBLockCache
+
+    cache  = DynamoDBLockCache(size=4096, ttl=timedelta(seconds=2))
+    client = DynamoDBLockClient(cache=cache)
+    client.does_lock_exist('reports', consistent=False)
+    print cache.hits, cache.misses
+
+Locks that were seen to not exist are cached as well. A cached lock is
+never kept past the end of its observed lease, and the client drops the
+cached state of any lock that it acquires or releases itself. A cache may
+be shared by many clients, as long as they all use the same clock.
+'''
+from threading import Lock
+from datetime import timedelta
+from collections import OrderedDict
+
+from .policy import DynamoDBLockPolicy
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockCache(object):
+    ''' A bounded, thread safe, least recently used cache of the
+    observed lock states by name, each with its own time to live.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockCache class
+
+        :param size: The maximum number of lock states to keep (default 1024)
+        :param ttl: The timedelta to keep an observed lock (default 1 second)
+        :param absent_ttl: The timedelta to keep an absent lock (default the ttl)
+        :param policy: The policy to read the time from (default the policy of the first client it is given to)
+        '''
+        ttl = kwargs.get('ttl', timedelta(seconds=1))
+        self.size       = kwargs.get('size', 1024)
+        self.ttl        = long(ttl.total_seconds() * 1000)
+        self.absent_ttl = long(kwargs.get('absent_ttl', ttl).total_seconds() * 1000)
+        self.policy     = kwargs.get('policy', None) or DynamoDBLockPolicy()
+        self.hits       = 0
+        self.misses     = 0
+        self._entries   = OrderedDict() # name -> (expires, lock)
+        self._mutex     = Lock()
+        self._is_bound  = kwargs.get('policy', None) is not None
+
+    def use_policy(self, policy):
+        ''' Read the time from the clock of the supplied policy,
+        unless the cache is already bound to a policy. The expiries of
+        all the entries are kept on a single clock, so every policy
+        that shares the cache must use the same clock.
+
+        :param policy: The policy of a client using the cache
+        :raises ValueError: If the cache is bound to another clock
+        '''
+        with self._mutex:
+            if not self._is_bound:
+                self.policy, self._is_bound = policy, True
+            elif self.policy.clock != policy.clock:
+                raise ValueError("the cache is already used with another clock")
+
+    def get(self, name):
+        ''' Retrieve the cached state of the supplied lock name.
+
+        :param name: The name of the lock to retrieve
+        :returns: (True, lock or None) on a hit, (False, None) on a miss
+        '''
+        now = self.policy.get_new_timestamp()
+        with self._mutex:
+            entry = self._entries.pop(name, None)
+            if entry and entry[0] > now:
+                self._entries[name] = entry # most recently used
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+        return False, None
+
+    def put(self, name, lock, policy=None):
+        ''' Cache the observed state of the supplied lock name. A
+        held lock is only cached until its observed lease ends.
+
+        :param name: The name of the observed lock
+        :param lock: The observed lock, or None if it does not exist
+        :param policy: The policy with the margins of the lease (default the cache policy)
+        '''
+        if lock is None:
+            expires = self.policy.get_new_timestamp() + self.absent_ttl
+        else:
+            expires = self.policy.get_new_timestamp() + self.ttl
+            if lock.is_locked:
+                expires = min(expires, (policy or self.policy).get_expiry(lock))
+
+        with self._mutex:
+            self._entries.pop(name, None)
+            self._entries[name] = (expires, lock)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name):
+        ''' Drop the cached state of the supplied lock name.
+
+        :param name: The name of the lock to drop
+        '''
+        with self._mutex:
+            self._entries.pop(name, None)
+
+    def clear(self):
+        ''' Drop all of the cached lock states and reset the
+        hit and miss counters.
+        '''
+        with self._mutex:
+            self._entries.clear()
+            self.hits   = 0
+            self.misses = 0
+
+    # ------------------------------------------------------------
+    # magic methods
+    # ------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
@@ -1,18 +1,22 @@
+import time
+import random
 from time import sleep
 from copy import copy
-
-from boto.exception import JSONResponseError
-from boto.dynamodb2.types import Dynamizer
-from boto.dynamodb2.fields import HashKey
-from boto.dynamodb2.types import STRING
-from boto.dynamodb2.items import Item
-from boto.dynamodb2.table import Table
-from boto.dynamodb2.exceptions import ConditionalCheckFailedException, ItemNotFound
-
-from .lock   import DynamoDBLock
-from .policy import DynamoDBLockPolicy
-from .schema import DynamoDBLockSchema
-from .worker import DynamoDBLockWorker
+from threading import local
+from collections import namedtuple
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from .lock    import DynamoDBLock, DynamoDBLockAttempt
+from .policy  import DynamoDBLockPolicy
+from .schema  import DynamoDBLockSchema
+from .worker  import DynamoDBLockWorker
+from .backend import DynamoDBLockTableBackend, TRANSACT_LIMIT
+from .handoff import DynamoDBLockHandoff
+from .tickets import DynamoDBLockTicketQueue, QUEUE_PREFIX
+from .shared  import DynamoDBLockShared
+from .metrics import DynamoDBLockMetrics
+from .limiter import DynamoDBLockThrottledError
 
 #--------------------------------------------------------------------------------
 # logging
@@ -25,6 +29,10 @@ _logger = logging.getLogger(__name__)
 # classes
 #--------------------------------------------------------------------------------
 
+DynamoDBLockRelease = namedtuple('DynamoDBLockRelease',
+    ['released', 'failed', 'pending', 'duration'])
+
+
 class DynamoDBLockClient(object):
 
     def __init__(self, **kwargs):
@@ -35,14 +43,41 @@ class DynamoDBLockClient(object):
         :param schema: The schema of the database table to work with
         :param owner: The owner of the locks created by this client
         :param table: The current handle to the dynamodb table client
+        :param backend: The storage backend of the locks (default the dynamodb table)
+        :param region: The region of the default dynamodb table backend
+        :param verify: How to verify the default dynamodb table (see the backend)
         :param worker: The underlying heartbeat worker to work with
+        :param coalesce: True to have one thread per name contend for locks (default False)
+        :param handoff: True to hand released locks directly to local waiters (default False)
+        :param fair: True to queue for contended locks in FIFO order (default False)
+        :param max_readers: The most readers that may share a lock (default 64)
+        :param cache: The cache of observed locks to read through, on the same clock (default None)
+        :param metrics: The metrics registry to record to (default a new registry)
+        :param limiter: The rate limiter of the backend requests (default None)
+        :param watcher: The watcher of the table change feed to wake acquires with, on the same clock (default None)
         '''
-        self.locks  = kwargs.get('locks', {})
-        self.policy = kwargs.get('policy', DynamoDBLockPolicy())
-        self.schema = kwargs.get('schema', DynamoDBLockSchema())
-        self.owner  = kwargs.get('owner', self.policy.get_new_owner())
-        self.table  = kwargs.get('table', None) or self._create_table()
-        self.worker = kwargs.get('worker', DynamoDBLockWorker(client=self))
+        self.locks   = kwargs.get('locks', {})
+        self.metrics = kwargs.get('metrics', None) or DynamoDBLockMetrics()
+        self.policy  = kwargs.get('policy', DynamoDBLockPolicy())
+        self.schema  = kwargs.get('schema', DynamoDBLockSchema())
+        self.owner   = kwargs.get('owner', self.policy.get_new_owner())
+        self.backend = kwargs.get('backend', None) or DynamoDBLockTableBackend(
+            schema=self.schema, table=kwargs.get('table', None),
+            region=kwargs.get('region', None), verify=kwargs.get('verify', True))
+        self.worker  = kwargs.get('worker', None) or DynamoDBLockWorker(client=self)
+        self.coalesce = kwargs.get('coalesce', False)
+        self.handoff  = kwargs.get('handoff', False)
+        self.cache    = kwargs.get('cache', None)
+        self.limiter  = kwargs.get('limiter', None)
+        self.watcher  = kwargs.get('watcher', None)
+        if self.cache is not None: self.cache.use_policy(self.policy)     # read the time on our clock
+        if self.watcher is not None: self.watcher.use_policy(self.policy)
+        self._handoff = DynamoDBLockHandoff()
+        self.queue    = DynamoDBLockTicketQueue(client=self) if kwargs.get('fair', False) else None
+        self._shared  = DynamoDBLockShared(client=self, max_readers=kwargs.get('max_readers', 64))
+        self.last_release = None
+        self._local   = local() # the limiter priority of the calls of each thread
+        self.metrics.gauge('dynamolock_held_locks', lambda: len(self.locks), owner=self.owner)
 
     # ------------------------------------------------------------
     # worker methods
@@ -50,41 +85,52 @@ class DynamoDBLockClient(object):
 
     def startup(self):
         ''' Start the heartbeat thread and perform any lock
-        initialization.
+        initialization. A worker shared with other clients (say by a
+        `DynamoDBLockManager`) is started and stopped by its owner.
         '''
-        self.worker.start()
+        if self.worker.client is self:
+            self.worker.start()
 
-    def shutdown(self):
+    def shutdown(self, timeout=None):
         ''' Stop the heartbeat thread and close all of the existing
-        lock handles that we have outstanding leases to.
+        lock handles that we have outstanding leases to. The locks are
+        released concurrently, see `release_locks`. The held locks
+        gauge of this client is removed from the metrics.
+
+        :param timeout: The seconds to wait for the releases (default no limit)
+        :returns: True if all locks were released, False otherwise
         '''
-        self.worker.stop(timeout=self.policy.retry_period)
-        self.release_all_locks()
+        if self.worker.client is self:
+            self.worker.stop(timeout=self.policy.retry_period / 1000.0)
+        is_released = self.release_all_locks(timeout=timeout)
+        self.metrics.remove_gauge('dynamolock_held_locks', owner=self.owner)
+        return is_released
 
     # ------------------------------------------------------------
     # lock validation methods
     # ------------------------------------------------------------
 
     def is_lock_expired(self, lock):
-        ''' Given a lock, test if it is expired or not. This is
-        equivalent to to `not is_lock_active(lock)`.
+        ''' Given a lock that someone else holds, test if it is
+        expired (so that it may be taken over) or not. This waits the
+        `takeover_margin` of the policy past the end of the lease, so
+        with any margins it is not quite `not is_lock_active(lock)`.
 
         :param lock: The lock to check if it is expired
         :returns: True if the lock is expired, False otherwise
         '''
-        expired_timestamp = lock.timestamp + lock.duration
-        return self.policy.get_new_timestamp() > expired_timestamp
+        return self.policy.get_new_timestamp() > self.policy.get_expiry(lock)
 
     def is_lock_active(self, lock):
-        ''' Given a lock, test if it the lock is still active
-        based on our current time information. This is equivalent
-        to `not is_lock_expired(lock)`.
+        ''' Given a lock that we hold, test if the lock is still
+        active based on our current time information. This stops the
+        `lease_margin` of the policy before the end of the lease, so
+        with any margins it is not quite `not is_lock_expired(lock)`.
 
         :param lock: The lock to check if it is active
         :returns: True if the lock is active, False otherwise
         '''
-        active_timestamp = lock.timestamp + lock.duration
-        return  self.policy.get_new_timestamp() <= active_timestamp
+        return self.policy.get_new_timestamp() <= self.policy.get_lease_end(lock)
 
     def is_lock_valid(self, lock):
         ''' Given a lock, test if it is still a valid lock for
@@ -109,16 +155,24 @@ class DynamoDBLockClient(object):
 
     def touch_lock(self, lock):
         ''' Touch the lock and update its version to renew the
-        lease we are currently holding on the lock (if we can).
+        lease we are currently holding on the lock (if we can). The
+        ticket of a lock acquired through the fair queue is renewed
+        along with it.
 
         :param lock: The lock to attempt to touch
         :returns: The new lock if it was updated, None otherwise
+        :raises DynamoDBLockThrottledError: If the table kept throttling us
         '''
         if not self.is_lock_valid(lock):
             _logger.debug("failed touching invalid lock:\n%s", str(lock))
             return None
 
-        new_lock = self._update_entry(lock)
+        priority = self._set_priority('high')
+        try:
+            new_lock = self._shared.touch(lock) if lock.readers else self._update_entry(lock)
+            if new_lock and self.queue and not lock.readers:
+                self.queue.touch(new_lock)
+        finally: self._set_priority(priority)
         if new_lock:
             _logger.debug("success touching lock:\n%s", str(lock))
             self.locks[lock.name] = new_lock
@@ -129,7 +183,12 @@ class DynamoDBLockClient(object):
         to the underlying name.
         
         If the delete flag is not set, it will default to the currently
-        installed policy value `delete_lock`.
+        installed policy value `delete_lock`. Locks with `counter`
+        versions are never deleted, so that their fencing tokens keep
+        increasing across releases.
+
+        If the table keeps throttling the release, the lock is kept
+        (and renewed) so that it can be released again later.
 
         :param lock: The lock to attempt to release
         :param delete: True to also delete locks, False to mark them unlocked
@@ -139,7 +198,60 @@ class DynamoDBLockClient(object):
             _logger.debug("failed releasing invalid lock:\n%s", str(lock))
             return False
 
+        priority = self._set_priority('high')
+        try:
+            return self._release_lock(lock, delete, **params)
+        except DynamoDBLockThrottledError:
+            _logger.warning("throttled releasing lock, keeping it: %s", lock.name)
+        finally: self._set_priority(priority)
+        return False
+
+    def _release_lock(self, lock, delete=None, **params):
+        ''' Release the supplied valid lock, see `release_lock`.
+
+        :param lock: The lock to attempt to release
+        :param delete: True to also delete locks, False to mark them unlocked
+        :returns: True if the lock was released, False otherwise
+        '''
         delete = delete if (delete != None) else self.policy.delete_lock
+        delete = delete and self.policy.versioning != 'counter'
+
+        # ------------------------------------------------------------
+        # Handoff:
+        # ------------------------------------------------------------
+        # If another thread in this process is waiting for the lock,
+        # we can hand it over directly by renewing it (so the next
+        # holder gets a fresh lease and version) instead of releasing
+        # it to the backend only for them to fight over it again.
+        # ------------------------------------------------------------
+        if self.coalesce and self.handoff and not lock.readers and self._handoff.has_waiters(lock.name):
+            new_lock = self._update_entry(lock, update=params)
+            if new_lock:
+                self.locks[lock.name] = new_lock
+                if self._handoff.release(lock.name, new_lock):
+                    _logger.debug("handed off lock to local waiter:\n%s", str(new_lock))
+                    return True
+                lock = new_lock # the waiter gave up, so release as usual
+
+        # ------------------------------------------------------------
+        # Fair:
+        # ------------------------------------------------------------
+        # If we acquired the lock through the ticket queue, we hand it
+        # directly to the next ticket in the queue (if there is one)
+        # so that no one can cut in line while it is released.
+        # ------------------------------------------------------------
+        is_handed = self.queue.release(lock, **params) if (self.queue and not lock.readers) else None
+        if is_handed is not None:
+            is_released = is_handed
+
+        # ------------------------------------------------------------
+        # Shared:
+        # ------------------------------------------------------------
+        # If we hold a shared lease, we only remove ourself from the
+        # readers of the lock (releasing it if we were the last).
+        # ------------------------------------------------------------
+        elif lock.readers:
+            is_released = self._shared.release(lock, delete, **params)
 
         # ------------------------------------------------------------
         # Case 1:
@@ -148,7 +260,7 @@ class DynamoDBLockClient(object):
         # flag as long as we are still the owner of the lock at the
         # lock version is still what we expect it to be.
         # ------------------------------------------------------------
-        if not delete:
+        elif not delete:
             params['is_locked'] = False
             new_lock = self._update_entry(lock, update=params)
             is_released = bool(new_lock)
@@ -166,25 +278,94 @@ class DynamoDBLockClient(object):
         # Cleanup:
         # ------------------------------------------------------------
         # After releasing the lock, we remove it from our cache only
-        # if we did in fact release the lock.
+        # if we did in fact release the lock (and forget any state we
+        # observed of it before we held it).
         # ------------------------------------------------------------
         if is_released and (lock.name in self.locks):
             del self.locks[lock.name]
+        if is_released and (self.cache is not None):
+            self.cache.invalidate(lock.name)
+        if is_released and self.coalesce:
+            self._handoff.release(lock.name)
+        if is_released and self.queue:
+            self.queue.forget(lock.name)
         return is_released
 
-    def release_all_locks(self, delete=None, **params):
+    def release_all_locks(self, delete=None, timeout=None, **params):
         ''' Release all the currently held locks by this instance of
-        the lock client (cached).
+        the lock client (cached), see `release_locks`.
         
         All the supplied params that are applicable are passed on to the
         underlying operation.
 
         :param delete: True to also delete locks, False to mark them unlocked
+        :param timeout: The seconds to wait for the releases (default no limit)
         :returns: True if all locks were released, False otherwise
         '''
-        locks    = self.locks.values()
-        released = [self.release_lock(lock, delete, **params) for lock in locks]
-        return all(released) # so we don't short circuit any evaluation
+        report = self.release_locks(self.locks.values(), delete, timeout, **params)
+        return not (report.failed or report.pending)
+
+    def release_locks(self, locks, delete=None, timeout=None, **params):
+        ''' Release the supplied locks concurrently, but never
+        more than the `concurrency` of the worker at once, and wait
+        at most the supplied timeout for all of them.
+
+        A release that is still in flight at the deadline is reported
+        as pending. It is not cancelled: it finishes in the background
+        and its lock is held until then. A release that fails with an
+        error is reported as failed instead of aborting the rest.
+
+        :param locks: The locks to release
+        :param delete: True to also delete locks, False to mark them unlocked
+        :param timeout: The seconds to wait for the releases (default no limit)
+        :returns: The DynamoDBLockRelease report of the lock names
+        '''
+        start    = self.policy.get_new_timestamp()
+        locks    = list(locks)
+        deadline = (time.time() + timeout) if (timeout is not None) else None
+        release  = lambda lock: self._release_quietly(lock, delete, params)
+
+        if len(locks) > 1 and self.worker.concurrency > 1:
+            pool = ThreadPool(processes=min(self.worker.concurrency, len(locks)))
+            try:
+                results = [pool.apply_async(release, (lock,)) for lock in locks]
+            finally: pool.close() # the pending releases still run to the end
+
+            released = []
+            for result in results:
+                wait = None if (deadline is None) else max(deadline - time.time(), 0)
+                try:
+                    released.append(result.get(wait))
+                except TimeoutError:
+                    released.append(None)
+        else: released = [release(lock) for lock in locks]
+
+        report = DynamoDBLockRelease(
+            released = [lock.name for lock, result in zip(locks, released) if result],
+            failed   = [lock.name for lock, result in zip(locks, released) if result is False],
+            pending  = [lock.name for lock, result in zip(locks, released) if result is None],
+            duration = self.policy.get_new_timestamp() - start)
+        self.last_release = report
+        if report.failed or report.pending:
+            _logger.warning("failed to release %d and timed out on %d of %d locks in %d ms",
+                len(report.failed), len(report.pending), len(locks), report.duration)
+        else: _logger.debug("released %d locks in %d ms", len(locks), report.duration)
+        return report
+
+    def _release_quietly(self, lock, delete, params):
+        ''' Helper to release a single lock of `release_locks`,
+        making sure that an error on one lock does not abort the rest.
+
+        :param lock: The lock to release
+        :param delete: True to also delete locks, False to mark them unlocked
+        :param params: The updates to apply to the lock
+        :returns: True if the lock was released, False otherwise
+        '''
+        try:
+            return self.release_lock(lock, delete, **dict(params))
+        except Exception:
+            _logger.exception("failed to release lock: %s", lock.name)
+        return False
 
     def acquire_lock(self, name, no_wait=False, **params):
         ''' Attempt to acquire the lock with the paramaters
@@ -197,111 +378,128 @@ class DynamoDBLockClient(object):
         :param no_wait: Try to acquire the lock without waiting
         :returns: The acquired lock on success, or None
         '''
-        if not self.policy.is_name_valid(name):
+        if not self._is_name_acquirable(name):
             return None
 
-        initial_time   = self.policy.get_new_timestamp() # the time we started trying to acquire
-        lock_timeout   = self.policy.acquire_timeout     # how long to wait until we fail
-        refresh_time   = self.policy.retry_period        # how long to wait between database reads
-        waited_time    = 0                               # the total amount of time we have waited
-        watching_lock  = None                            # the watch we are currently trying to get
-        created_lock   = None                            # the watch that we created and is valid
-        tried_one_time = False                           # indicates if we have made one attempt at the lock
+        attempt = self._start_acquire(name, no_wait)
+        if self.coalesce:
+            created_lock = self._acquire_coalesced(attempt, **params)
+        else: created_lock = self._acquire(attempt, **params)
+        self._record_acquire(attempt, created_lock)
+        return created_lock
 
-        while (self.policy.get_new_timestamp() < (initial_time + lock_timeout)
-           or (no_wait and tried_one_time)):             # if the user wants to try_acquire
-            current_lock = self._retrieve_entry(name)
+    def acquire_shared(self, name, no_wait=False, **params):
+        ''' Attempt to acquire a shared lease on the lock, which
+        may be held by any number of readers at once, but never at
+        the same time as an exclusive lease.
 
-            # ------------------------------------------------------------
-            # Case 1:
-            # ------------------------------------------------------------
-            # There is no existing lock in the database, so we can simply
-            # grab the lock if we are able to, otherwise we loop and try
-            # again.
-            # ------------------------------------------------------------
-            if not current_lock:
-                created_lock = self._create_entry(name, **params)
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
 
-            # ------------------------------------------------------------
-            # Case 2:
-            # ------------------------------------------------------------
-            # There is an existing lock in the database, however, it has
-            # already been unlocked and exists because a previous user
-            # chose not to delete it or failed to do so. Regardless, we
-            # can simply overwrite the lock and make use of the existing
-            # data if we so choose.
-            # ------------------------------------------------------------
-            elif not current_lock.is_locked:
-                params['owner'] = self.owner
-                expect = ['is_locked', 'version', 'name']
-                created_lock = self._update_entry(current_lock, expect=expect, update=params)
+        :param name: The name of the lock to acquire
+        :param no_wait: Try to acquire the lock without waiting
+        :returns: The acquired shared lock on success, or None
+        '''
+        if not self._is_name_acquirable(name):
+            return None
 
-            # ------------------------------------------------------------
-            # Case 3:
-            # ------------------------------------------------------------
-            # If we are currently watching a lock and it has locally
-            # become expired (we have waited the specified lease of the
-            # lock) and the version has not changed in the interum, we
-            # are allowed to take control of the lock if we can.
-            # ------------------------------------------------------------
-            elif (watching_lock
-             and (self.is_lock_expired(watching_lock))
-             and (watching_lock.version == current_lock.version)):
-                params['owner'] = self.owner
-                expect = ['version', 'name']
-                created_lock = self._update_entry(current_lock, expect=expect, update=params)
+        attempt = self._start_acquire(name, no_wait)
+        created_lock = self._shared.acquire_shared(attempt, **params)
+        self._record_acquire(attempt, created_lock)
+        return created_lock
 
-            # ------------------------------------------------------------
-            # Case 4:
-            # ------------------------------------------------------------
-            # If we are currently not watching a lock, but someone has
-            # the lock that we want, we start watching it and update our
-            # timeout to match the lease of the lock.
-            # ------------------------------------------------------------
-            elif not watching_lock:
-                lock_timeout += current_lock.duration
-                watching_lock = current_lock
+    def acquire_exclusive(self, name, no_wait=False, prefer=True, **params):
+        ''' Attempt to acquire an exclusive lease on the lock. This
+        is the same as `acquire_lock`, except that while the lock is
+        held by readers we keep any new readers from joining them (if
+        `prefer` is set), so that the readers cannot starve us.
 
-            # ------------------------------------------------------------
-            # Case 5:
-            # ------------------------------------------------------------
-            # If we are currently watching a lock and waiting for it to
-            # expire and someone has gotten a new lease on that lock in
-            # the interum between our delay, then we are forced to watch
-            # the new lock. However, we do not update our delay time as
-            # we might otherwise wait forever.
-            # ------------------------------------------------------------
-            elif (watching_lock
-             and (watching_lock.version != current_lock.version)):
-                watching_lock = current_lock
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
 
-            # ------------------------------------------------------------
-            # Cleanup:
-            # ------------------------------------------------------------
-            # If we were able to create a lock, then we add it to our
-            # cache, update its timestamp locally, and return a copy to
-            # the system so they cannot modify our state. Next, if we
-            # plan on waiting for the lock, we sleep until the next retry
-            # period. Otherwise, if we refused to wait for the lock, we
-            # simply exit if we failed.
-            # ------------------------------------------------------------
-            if created_lock:
-                self.locks[name] = created_lock
-                return created_lock
-            elif not no_wait:
-                _logger.debug("waiting %d secs to acquire lock %s, total wait %d secs", refresh_time, name, waited_time)
-                sleep(refresh_time)
-                waited_time += refresh_time
-            else: tried_one_time = True
+        :param name: The name of the lock to acquire
+        :param no_wait: Try to acquire the lock without waiting
+        :param prefer: True to keep new readers out while we wait
+        :returns: The acquired lock on success, or None
+        '''
+        if not self._is_name_acquirable(name):
+            return None
 
-        # ------------------------------------------------------------
-        # Failure:
-        # ------------------------------------------------------------
-        # If after waiting the supplied buffer time plus the original
-        # lock duration we still were not able to get a lock handle,
-        # we simply fail and let the user know.
-        # ------------------------------------------------------------
-        return None
+        attempt = self._start_acquire(name, no_wait)
+        created_lock = self._shared.acquire_exclusive(attempt, prefer, **params)
+        self._record_acquire(attempt, created_lock)
+        return created_lock
+
+    def acquire_permit(self, name, permits, no_wait=False, **params):
+        ''' Attempt to acquire one of the permits of the named
+        counting semaphore, which may be held by at most `permits`
+        owners at once. Every client of the semaphore must agree on
+        the number of permits, and each client holds at most one.
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param name: The name of the semaphore to acquire a permit of
+        :param permits: The number of permits of the semaphore
+        :param no_wait: Try to acquire the permit without waiting
+        :returns: The acquired permit on success, or None
+        '''
+        if not self._is_name_acquirable(name) or permits < 1:
+            return None
+
+        attempt = self._start_acquire(name, no_wait)
+        created_lock = self._shared.acquire_permit(attempt, permits, **params)
+        self._record_acquire(attempt, created_lock)
+        return created_lock
+
+    def acquire_locks(self, names, no_wait=False, **params):
+        ''' Attempt to acquire all of the named locks at once with a
+        single atomic write, so that we either hold all of them or none
+        of them. While any of them is held by someone else, we wait
+        and retry the whole set without holding any of them, so two
+        callers can never deadlock on the same names in another order.
+
+        The first try creates all of the locks without reading them,
+        assuming that none of them exist, so acquiring free locks costs
+        a single round trip. Otherwise each try reads all of them in one
+        batch and then writes them in one transaction. This requires a
+        backend that supports `transact_entries` and that can write all
+        of the names together (see `can_transact`).
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param names: The names of the locks to acquire
+        :param no_wait: Try to acquire the locks without waiting
+        :returns: The list of the acquired locks on success, or None
+        :raises ValueError: If the names do not fit (or cannot be written) in one transaction
+        '''
+        names = sorted(set(names))
+        if len(names) > TRANSACT_LIMIT:
+            raise ValueError("at most %d locks can be acquired at once" % TRANSACT_LIMIT)
+        if not self.backend.can_transact(names):
+            raise ValueError("the locks cannot be written in one transaction: %s" % ', '.join(names))
+        if (not names) or any((not self._is_name_acquirable(name)) or (name in self.locks) for name in names):
+            return None
+
+        attempt  = self._start_acquire(', '.join(names), no_wait)
+        watching = {} # name -> the held lock we are watching for expiry
+        created_locks = None
+        while self._is_acquiring(attempt) and not created_locks:
+            tries = attempt.tries
+            try:
+                created_locks = self._try_acquire_locks(attempt, names, watching, **params)
+            except DynamoDBLockThrottledError:
+                _logger.debug("throttled trying to acquire locks: %s", attempt.name)
+                attempt.tries = max(attempt.tries, tries + 1) # count it as a try
+
+            if not created_locks and self._is_acquiring(attempt):
+                delay = self._get_acquire_delay(attempt)
+                _logger.debug("waiting %d ms to acquire locks %s", delay, attempt.name)
+                attempt.waited_time += self._wait_for_retry(delay)
+
+        self._record_acquire(attempt, created_locks)
+        return created_locks
 
     def try_acquire_lock(self, name, **params):
         ''' Attempt to acquire the lock without waiting, instead
@@ -315,20 +513,74 @@ class DynamoDBLockClient(object):
         '''
         return self.acquire_lock(name, no_wait=True, **params)
 
-    def does_lock_exist(self, name):
+    def try_acquire_any(self, names, limit=1, **params):
+        ''' Attempt to acquire up to `limit` of the locks in the
+        supplied candidate names without waiting.
+
+        All of the candidates are read in a single batch and those
+        that are currently held are skipped. The free candidates are
+        then tried in a random order so that many clients claiming
+        from the same set of names do not all collide on the first.
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param names: The candidate names of the locks to acquire
+        :param limit: The maximum number of locks to acquire (default 1)
+        :returns: The list of acquired locks (possibly empty)
+        '''
+        names = [name for name in set(names)
+            if self._is_name_acquirable(name) and (name not in self.locks)]
+        current_locks = self._retrieve_entries(names)
+
+        # ------------------------------------------------------------
+        # Case 1:
+        # ------------------------------------------------------------
+        # A single read cannot tell us that a held lock has expired
+        # (we have to watch it for its full lease), so we only try the
+        # candidates that do not exist or that have been unlocked.
+        # ------------------------------------------------------------
+        candidates = [name for name in names
+            if (name not in current_locks) or (not current_locks[name].is_locked)]
+        random.shuffle(candidates)
+
+        # ------------------------------------------------------------
+        # Case 2:
+        # ------------------------------------------------------------
+        # We walk the free candidates making a single try at each of
+        # them with what we read until we have enough locks. Any that
+        # were taken in the meantime simply fail their conditional
+        # write and are skipped.
+        # ------------------------------------------------------------
+        acquired = []
+        for name in candidates:
+            if len(acquired) >= limit: break
+            attempt = self._start_acquire(name, no_wait=True)
+            created_lock = self._acquire_entry(attempt, current_locks.get(name), **dict(params))
+            if created_lock: acquired.append(created_lock)
+        return acquired
+
+    def does_lock_exist(self, name, consistent=True):
         ''' Check if a lock with the given name exists on the
         backend database and is active.
 
         :param name: The name of the lock to check for existance
+        :param consistent: False to allow an eventually consistent (or cached) read
         :returns: True if the lock exists, False otherwise
         '''
-        return bool(self.retrieve_lock(name))
+        return bool(self.retrieve_lock(name, consistent))
 
-    def retrieve_lock(self, name):
+    def retrieve_lock(self, name, consistent=True):
         ''' Retrieve the lock by the supplied name strictly
         to view its data, but not to perform any updates.
 
+        The read is strongly consistent unless `consistent` is False,
+        in which case it costs half as much but may be slightly out of
+        date. Only then, if the client has a cache, a recently observed
+        state of the lock may be returned instead of reading it.
+
         :param name: The lock name to retrieve
+        :param consistent: False to allow an eventually consistent (or cached) read
         :returns: The lock at the supplied name or None
         '''
         if not self.policy.is_name_valid(name):
@@ -344,14 +596,28 @@ class DynamoDBLockClient(object):
         if name in self.locks:
             current_lock = self.locks[name]
 
-        # ------------------------------------------------------------
-        # Case 2:
-        # ------------------------------------------------------------
-        # We are not watching that lock, so we pull down a fresh copy
-        # and return it to the user. However, we do not cache this
-        # lock as we are not watching it.
-        # ------------------------------------------------------------
-        else: current_lock = self._retrieve_entry(name)
+        else:
+            # --------------------------------------------------------
+            # Case 2:
+            # --------------------------------------------------------
+            # We are not watching that lock, but we have observed it
+            # (or observed that it does not exist) recently enough
+            # that the cache still trusts that state, and the caller
+            # did not ask for a strongly consistent read.
+            # --------------------------------------------------------
+            is_cacheable = (self.cache is not None) and not consistent
+            is_cached, current_lock = self.cache.get(name) if is_cacheable else (False, None)
+
+            # --------------------------------------------------------
+            # Case 3:
+            # --------------------------------------------------------
+            # We are not watching that lock, so we pull down a fresh
+            # copy and return it to the user. However, we do not add
+            # this lock to our held locks as we are not watching it.
+            # --------------------------------------------------------
+            if not is_cached:
+                current_lock = self._retrieve_entry(name, consistent)
+                if self.cache is not None: self.cache.put(name, current_lock, self.policy)
 
         # ------------------------------------------------------------
         # Cleanup:
@@ -368,54 +634,451 @@ class DynamoDBLockClient(object):
         return current_lock
 
     # ------------------------------------------------------------
-    # raw dynamo methods
+    # acquire protocol methods
+    # ------------------------------------------------------------
+    # These methods implement the individual steps of the acquire
+    # protocol so that it can be driven by either a blocking or an
+    # asynchronous caller.
     # ------------------------------------------------------------
 
-    def _create_table(self):
-        ''' Create the underlying dynamodb table for writing
-        locks to if it does not exist, otherwise uses the existing
-        table. We use the `describe` method call to verify if the
-        table exists or not.
+    def _is_name_acquirable(self, name):
+        ''' Check if the supplied name may be acquired, which it may
+        if the policy finds it valid and it is not in the namespace of
+        the queue entries of the fair mode.
 
-        :returns: A handle to the underlying dynamodb table
+        :param name: The name of the lock to acquire
+        :returns: True if the name may be acquired, False otherwise
+        '''
+        return self.policy.is_name_valid(name) and not name.startswith(QUEUE_PREFIX)
+
+    def _start_acquire(self, name, no_wait=False):
+        ''' Start a new attempt at acquiring the named lock.
+
+        :param name: The name of the lock to acquire
+        :param no_wait: Try to acquire the lock without waiting
+        :returns: The state of the new acquire attempt
+        '''
+        return DynamoDBLockAttempt(name=name, no_wait=no_wait, policy=self.policy)
+
+    def _is_acquiring(self, attempt):
+        ''' Check if the supplied acquire attempt should keep
+        trying to acquire its lock. Every attempt is allowed to
+        make at least one try.
+
+        :param attempt: The acquire attempt to check
+        :returns: True if we should try again, False otherwise
         '''
+        if not attempt.tries: return True
+        if attempt.no_wait:   return False
+        deadline = attempt.initial_time + attempt.lock_timeout
+        return ((self.policy.get_new_timestamp() < deadline)
+            or (attempt.tries < attempt.final_tries)) # we slept right up to the deadline
+
+    def _get_acquire_delay(self, attempt):
+        ''' Retrieve the number of milliseconds to wait before
+        the next try of the supplied acquire attempt.
+
+        The wait is chosen by the policy backoff. However, if we
+        are watching a held lock, we never wait past the moment its
+        lease runs out (or wait exactly until then if the policy is
+        set to `wait_for_expiry`). We also never wait past the
+        deadline of the attempt; instead we make one final try right
+        at the deadline.
+
+        :param attempt: The acquire attempt to wait for
+        :returns: The number of milliseconds to wait
+        '''
+        now      = self.policy.get_new_timestamp()
+        deadline = attempt.initial_time + attempt.lock_timeout
+        delay    = self.policy.get_retry_delay(attempt.tries, attempt.last_delay)
+        attempt.last_delay = delay
+
+        if attempt.watching_lock:
+            watched = attempt.watching_lock
+            expires = self.policy.get_expiry(watched) + 1 - now # is_lock_expired is exclusive
+            if expires > 0:
+                delay = expires if self.policy.wait_for_expiry else min(delay, expires)
+
+        if now + delay >= deadline:
+            delay = max(long(deadline - now), 0)
+            attempt.final_tries = attempt.tries + 1
+        return delay
+
+    def _acquire(self, attempt, **params):
+        ''' Drive the supplied acquire attempt against the backend
+        until it either acquires the lock or gives up.
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param attempt: The acquire attempt to drive
+        :returns: The acquired lock on success, or None
+        '''
+        if self.queue and not attempt.no_wait:
+            return self.queue.acquire(attempt, **params)
+
+        name = attempt.name
+        if self.watcher and not attempt.no_wait:
+            released, callback = self.watcher.watch_released(name)
+        else: released = None
+
         try:
-            table = Table(self.schema.table_name)
-            _logger.debug("current table description:\n%s", table.describe())
-        except JSONResponseError, ex:
-            _logger.exception("table %s does not exist, creating it", self.schema.table_name)
-            table = Table.create(self.schema.table_name,
-                schema = [ HashKey(self.schema.name, data_type=STRING) ],
-                throughput = {
-                    'read':  self.schema.read_capacity,
-                    'write': self.schema.write_capacity,
-                })
-            _logger.debug("current table description:\n%s", table.describe())
-        return table
-
-    def _retrieve_entry(self, name):
+            while self._is_acquiring(attempt):
+                tries = attempt.tries
+                if released: released.clear()
+                try:
+                    created_lock = self._try_acquire(attempt, **params)
+                    if created_lock:
+                        return created_lock
+                except DynamoDBLockThrottledError:
+                    _logger.debug("throttled trying to acquire lock: %s", name)
+                    attempt.tries = max(attempt.tries, tries + 1) # count it as a try
+
+                # --------------------------------------------------------
+                # Retry:
+                # --------------------------------------------------------
+                # If we plan on waiting for the lock, we sleep until the
+                # next retry period (or until the watcher tells us that the
+                # lock was released). Otherwise, if we refused to wait for
+                # the lock, we simply exit as we failed.
+                # --------------------------------------------------------
+                if self._is_acquiring(attempt):
+                    delay = self._get_acquire_delay(attempt)
+                    _logger.debug("waiting %d ms to acquire lock %s, total wait %d ms", delay, name, attempt.waited_time)
+                    attempt.waited_time += self._wait_for_retry(delay, released)
+        finally:
+            if released: self.watcher.unwatch(name, callback)
+
+        # ------------------------------------------------------------
+        # Failure:
+        # ------------------------------------------------------------
+        # If after waiting the supplied buffer time plus the original
+        # lock duration we still were not able to get a lock handle,
+        # we simply fail and let the user know.
+        # ------------------------------------------------------------
+        return None
+
+    def _acquire_coalesced(self, attempt, **params):
+        ''' Drive the supplied acquire attempt with the other local
+        threads acquiring the same name. Only one of them (the
+        contender) drives its attempt against the backend, the rest
+        wait their turn in order to be handed the lock or to become
+        the next contender. A waiter never waits longer than a direct
+        attempt could (the timeout plus one lease).
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param attempt: The acquire attempt to drive
+        :returns: The acquired lock on success, or None
+        '''
+        name   = attempt.name
+        waiter = self._handoff.join(name, attempt.no_wait)
+        if not waiter:
+            _logger.debug("lock %s is busy locally, not waiting", name)
+            return None
+
+        if not waiter.is_contender:
+            deadline = attempt.initial_time + attempt.lock_timeout + self.policy.lock_duration
+            timeout  = max(deadline - self.policy.get_new_timestamp(), 0) / 1000.0
+            period   = self.policy.lock_duration / 1000.0
+            self._handoff.wait(name, waiter, timeout, period, lambda: name in self.locks)
+            if waiter.lock:
+                return waiter.lock
+            if not waiter.is_contender:
+                return None
+
+        created_lock = self._acquire(attempt, **params)
+        self._handoff.finish(name, waiter, created_lock)
+        return created_lock
+
+    def _wait_for_retry(self, delay, released=None):
+        ''' Wait the supplied number of milliseconds before the
+        next try, or until the supplied event is set by the watcher.
+
+        :param delay: The number of milliseconds to wait at most
+        :param released: The event that is set when the lock is released
+        :returns: The number of milliseconds that we waited
+        '''
+        if released is None:
+            sleep(delay / 1000.0)
+            return delay
+
+        start = self.policy.get_new_timestamp()
+        if released.wait(delay / 1000.0):
+            _logger.debug("woken by the release of the lock we are waiting for")
+        return min(delay, self.policy.get_new_timestamp() - start)
+
+    def _try_acquire(self, attempt, **params):
+        ''' Make a single try at acquiring the lock for the
+        supplied attempt, updating the attempt with what we saw.
+        
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param attempt: The acquire attempt to make a try for
+        :returns: The acquired lock on success, or None
+        '''
+        current_lock = self._retrieve_entry(attempt.name)
+        return self._acquire_entry(attempt, current_lock, **params)
+
+    def _acquire_entry(self, attempt, current_lock, **params):
+        ''' Given the current state of the lock entry for the
+        supplied attempt, make a single try at acquiring it.
+        
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param attempt: The acquire attempt to make a try for
+        :param current_lock: The current lock entry (or None)
+        :returns: The acquired lock on success, or None
+        '''
+        name          = attempt.name
+        created_lock  = None
+        attempt.tries += 1
+
+        # ------------------------------------------------------------
+        # Case 1:
+        # ------------------------------------------------------------
+        # There is no existing lock in the database, so we can simply
+        # grab the lock if we are able to, otherwise we loop and try
+        # again.
+        # ------------------------------------------------------------
+        if not current_lock:
+            created_lock = self._create_entry(name, **params)
+            if not created_lock: self._record_conflict('create')
+
+        # ------------------------------------------------------------
+        # Case 2:
+        # ------------------------------------------------------------
+        # There is an existing lock in the database, however, it has
+        # already been unlocked and exists because a previous user
+        # chose not to delete it or failed to do so. Regardless, we
+        # can simply overwrite the lock and make use of the existing
+        # data if we so choose.
+        # ------------------------------------------------------------
+        elif not current_lock.is_locked:
+            params.update(self._get_takeover_params(**params))
+            expect = ['is_locked', 'version', 'name']
+            created_lock = self._update_entry(current_lock, expect=expect, update=params)
+            if not created_lock: self._record_conflict('unlocked')
+
+        # ------------------------------------------------------------
+        # Case 3:
+        # ------------------------------------------------------------
+        # If we are currently watching a lock and it has locally
+        # become expired (we have waited the specified lease of the
+        # lock) and the version has not changed in the interum, we
+        # are allowed to take control of the lock if we can.
+        # ------------------------------------------------------------
+        elif (attempt.watching_lock
+         and (self.is_lock_expired(attempt.watching_lock))
+         and (attempt.watching_lock.version == current_lock.version)):
+            params.update(self._get_takeover_params(**params))
+            expect = ['version', 'name']
+            created_lock = self._update_entry(current_lock, expect=expect, update=params)
+            if not created_lock: self._record_conflict('expired')
+
+        # ------------------------------------------------------------
+        # Case 4:
+        # ------------------------------------------------------------
+        # If we are currently not watching a lock, but someone has
+        # the lock that we want, we start watching it and update our
+        # timeout to match the lease of the lock.
+        # ------------------------------------------------------------
+        elif not attempt.watching_lock:
+            attempt.lock_timeout += current_lock.duration + self.policy.takeover_margin
+            attempt.watching_lock = current_lock
+
+        # ------------------------------------------------------------
+        # Case 5:
+        # ------------------------------------------------------------
+        # If we are currently watching a lock and waiting for it to
+        # expire and someone has gotten a new lease on that lock in
+        # the interum between our delay, then we are forced to watch
+        # the new lock. However, we do not update our delay time as
+        # we might otherwise wait forever.
+        # ------------------------------------------------------------
+        elif (attempt.watching_lock
+         and (attempt.watching_lock.version != current_lock.version)):
+            attempt.watching_lock = current_lock
+
+        # ------------------------------------------------------------
+        # Cleanup:
+        # ------------------------------------------------------------
+        # If we were able to create a lock, then we add it to our
+        # cache, update its timestamp locally, let the worker know it
+        # has a new lease to renew, and return a copy to the system
+        # so they cannot modify our state.
+        # ------------------------------------------------------------
+        if created_lock:
+            self._hold_lock(created_lock)
+        return created_lock
+
+    def _try_acquire_locks(self, attempt, names, watching, **params):
+        ''' Make a single try at acquiring all of the named locks
+        at once for the supplied attempt.
+
+        :param attempt: The acquire attempt to make a try for
+        :param names: The sorted names of the locks to acquire
+        :param watching: The held locks we are watching by name
+        :returns: The list of the acquired locks on success, or None
+        '''
+        duration = params.get('duration', self.policy.lock_duration)
+        update   = dict(params, owner=self.owner, is_locked=True, duration=duration)
+
+        # ------------------------------------------------------------
+        # Optimistic:
+        # ------------------------------------------------------------
+        # On the first try we assume that none of the locks exist and
+        # create all of them without reading them first. If any of
+        # them does exist, we read them all and carry on as usual.
+        # ------------------------------------------------------------
+        if not attempt.tries:
+            writes = [(name, dict(update, version=self.policy.get_new_version()), None) for name in names]
+            created_locks = self._transact_locks(writes, {})
+            if created_locks:
+                attempt.tries += 1
+                return created_locks
+
+        current_locks = self._retrieve_entries(names)
+        writes, held  = [], []
+        attempt.tries += 1
+
+        for name in names:
+            current_lock = current_locks.get(name)
+            watched_lock = watching.get(name)
+
+            # ------------------------------------------------------------
+            # Case 1:
+            # ------------------------------------------------------------
+            # There is no existing lock, so we create it as long as it
+            # still does not exist.
+            # ------------------------------------------------------------
+            if not current_lock:
+                writes.append((name, dict(update, version=self.policy.get_new_version()), None))
+
+            # ------------------------------------------------------------
+            # Case 2:
+            # ------------------------------------------------------------
+            # There is an unlocked lock, or a lock that we have watched
+            # expire without it changing, so we take it over as long as
+            # its version is still the one we read.
+            # ------------------------------------------------------------
+            elif ((not current_lock.is_locked) or (watched_lock
+              and (self.is_lock_expired(watched_lock))
+              and (watched_lock.version == current_lock.version))):
+                takeover = dict(update, version=self.policy.get_next_version(current_lock))
+                takeover.update(self._get_takeover_params(**params))
+                writes.append((name, takeover, { 'name': name, 'version': current_lock.version }))
+
+            # ------------------------------------------------------------
+            # Case 3:
+            # ------------------------------------------------------------
+            # Someone holds the lock, so we start watching it (or watch
+            # its new lease) and retry the whole set later.
+            # ------------------------------------------------------------
+            else:
+                if (not watched_lock) or (watched_lock.version != current_lock.version):
+                    watching[name] = current_lock
+                held.append(name)
+
+        if held:
+            if not attempt.watching_lock:
+                attempt.lock_timeout += watching[held[0]].duration + self.policy.takeover_margin
+            attempt.watching_lock = watching[held[0]]
+            return None
+        return self._transact_locks(writes, current_locks)
+
+    def _transact_locks(self, writes, current_locks):
+        ''' Write the supplied lock writes in a single transaction
+        and start holding the locks if it succeeds.
+
+        :param writes: The (name, update, expect) writes of the locks
+        :param current_locks: The current locks that are updated by name
+        :returns: The list of the acquired locks on success, or None
+        '''
+        if not self._call_backend('transact', self.backend.transact_entries, writes):
+            self._record_conflict('transact')
+            return None
+
+        timestamp, created_locks = self.policy.get_new_timestamp(), []
+        for name, update, expect in writes:
+            update = dict(update, timestamp=timestamp)
+            if name in current_locks:
+                created_locks.append(current_locks[name]._replace(**update))
+            else: created_locks.append(DynamoDBLock(**dict(update, name=name, payload=update.get('payload'))))
+        self._hold_locks(created_locks)
+        return created_locks
+
+    def _hold_lock(self, lock, deadline=None):
+        ''' Start holding the supplied newly acquired lock.
+
+        :param lock: The lock that we acquired
+        :param deadline: The time to first renew the lock at (default from its lease)
+        '''
+        self.locks[lock.name] = lock
+        if self.cache is not None: self.cache.invalidate(lock.name)
+        if self.worker.is_alive():
+            self.worker.schedule(lock, deadline)
+
+    def _hold_locks(self, locks):
+        ''' Start holding the supplied group of newly acquired locks,
+        which the worker first renews together in the same sweep.
+
+        :param locks: The locks that we acquired together
+        '''
+        deadline = min(self.worker.get_renewal_deadline(lock) for lock in locks)
+        for lock in locks:
+            self._hold_lock(lock, deadline)
+
+    def _get_takeover_params(self, **params):
+        ''' Retrieve the fields that must be written when we take
+        over an existing lock entry so that it is marked as locked
+        by us with our requested lease.
+
+        :returns: The fields to update the existing lock with
+        '''
+        return {
+            'owner':     self.owner,
+            'is_locked': True,
+            'duration':  params.get('duration', self.policy.lock_duration),
+            'readers':   None, # drop any readers of a shared lock we take over
+        }
+
+    # ------------------------------------------------------------
+    # raw entry methods
+    # ------------------------------------------------------------
+
+    def _retrieve_entry(self, name, consistent=True):
         ''' Given the name of a lock, attempt to retrieve the
         lock and update its value in the cache.
 
         :param name: The name of the lock to retrieve
+        :param consistent: False to allow an eventually consistent read
         :returns: The lock if it exists, None otherwise
         '''
-        query  = {
-            self.schema.name: name,
-            'consistent': True,
-        }
+        params = self._call_backend('get', self.backend.retrieve_entry, name, consistent)
+        if not params:
+            return None
 
-        try:
-            record = self.table.get_item(**query)
-            params = self.schema.to_dict(record)
-            params['timestamp'] = self.policy.get_new_timestamp()
-            return DynamoDBLock(**params)
-        except ItemNotFound, ex:
-            _logger.exception("failed to retrieve item: %s", name)
-        return None
+        params['timestamp'] = self.policy.get_new_timestamp()
+        return DynamoDBLock(**params)
+
+    def _retrieve_entries(self, names):
+        ''' Given the names of a number of locks, attempt to
+        retrieve all of them in as few requests as possible.
+
+        :param names: The names of the locks to retrieve
+        :returns: A dict of the locks that exist by their name
+        '''
+        timestamp = self.policy.get_new_timestamp()
+        entries   = self._call_backend('batch_get', self.backend.retrieve_entries, names)
+        return { name : DynamoDBLock(**dict(params, timestamp=timestamp))
+            for name, params in entries.items() }
 
     def _delete_entry(self, lock):
-        ''' Attempt to delete the lock from dynamodb with
+        ''' Attempt to delete the lock from the backend with
         the supplied name.
         
         We only allow a lock to be deleted if we know the
@@ -427,18 +1090,10 @@ class DynamoDBLockClient(object):
         :returns: True if successful, False otherwise
         '''
         expected = { 'name': lock.name, 'version': lock.version }
-        expected = self.schema.to_schema(expected)
-        expected = { '%s__eq' % key : val for key, val in expected.items() }
-        params   = { self.schema.name : lock.name }
-
-        try:
-            return self.table.delete_item(expected=expected, **params)
-        except ConditionalCheckFailedException, ex:
-            _logger.exception("failed to delete item: %s", name)
-        return False
+        return self._call_backend('delete', self.backend.delete_entry, lock.name, expected)
 
     def _create_entry(self, name, **params):
-        ''' Attempt to update the underlying lock on dynamodb
+        ''' Attempt to create the underlying lock on the backend
         with the supplied values.
         
         All the supplied params that are applicable are passed
@@ -446,7 +1101,7 @@ class DynamoDBLockClient(object):
         will simply be overwritten.
 
         :param name: The name of the lock to update
-        :returns: True if successful, False otherwise
+        :returns: The created lock if successful, None otherwise
         '''
         params.update({
             'name':      name,
@@ -463,20 +1118,13 @@ class DynamoDBLockClient(object):
         # We have to make sure that no one beat us in creating an
         # entry at this specified key, otherwise we should fail.
         # ------------------------------------------------------------
-        expects = { self.schema.name: { 'Exists' : "false" } }
-        record  = self.schema.to_schema(params)
-        record  = self.table._encode_keys(record)
-
-        try:
-            self.table._put_item(record, expects=expects)
+        if self._call_backend('put', self.backend.create_entry, params):
             if 'payload' not in params: params['payload'] = None
             return DynamoDBLock(**params)
-        except (JSONResponseError, ConditionalCheckFailedException):
-            _logger.exception("failed to create lock entry for: %s", name)
         return None
 
     def _update_entry(self, lock, expect=None, update=None):
-        ''' Attempt to update the underlying lock on dynamodb
+        ''' Attempt to update the underlying lock on the backend
         with the supplied values.
 
         In order to update an entry, at least the version number
@@ -490,26 +1138,91 @@ class DynamoDBLockClient(object):
         :param lock: The lock to update
         :param expect: A list of fields you expect to not have changed
         :param update: A dictionary of fields to update
-        :returns: True if successful, False otherwise
+        :returns: The updated lock if successful, None otherwise
         '''
-        version = self.policy.get_new_version()
-        name    = { self.schema.name : lock.name }
-
-        updates = { 'version' : version, 'timestamp': self.policy.get_new_timestamp() }
+        updates = {
+            'version':   self.policy.get_next_version(lock),
+            'timestamp': self.policy.get_new_timestamp(),
+        }
         if update: updates.update(update)
-        updated = self.schema.to_schema(updates)
-        updated = self.table._encode_keys(updated)
-        updated = { k : { 'Value': v, 'Action': 'PUT' } for k, v in updated.items() }
 
         expects = expect or ['version', 'owner', 'name']
         expects = { key : getattr(lock, key) for key in expects }
-        expects = self.schema.to_schema(expects)
-        expects = self.table._encode_keys(expects)
-        expects = { k : { 'Value': v } for k, v in expects.items() }
 
-        try:
-            self.table._update_item(name, updated, expects=expects)
+        if self._call_backend('update', self.backend.update_entry, lock.name, updates, expects):
             return lock._replace(**updates)
-        except ConditionalCheckFailedException:
-            _logger.exception("failed to create lock entry for: %s", name)
         return None
+
+    # ------------------------------------------------------------
+    # metrics methods
+    # ------------------------------------------------------------
+
+    def _call_backend(self, operation, method, *args):
+        ''' Call the supplied backend method, recording its
+        latency under the supplied operation name.
+
+        If the client has a limiter, the call first waits its turn.
+        Every call made to renew or release a lock we hold is made
+        with high priority, while every call made to acquire a lock
+        (even the writes of a takeover) is made with normal priority,
+        so that under pressure we keep the locks we already hold.
+
+        A throttled call is retried with backoff up to the number of
+        `throttle_retries` of the policy.
+
+        :param operation: The name of the operation for the metrics
+        :param method: The backend method to call
+        :returns: The result of the backend method
+        :raises DynamoDBLockThrottledError: If the table kept throttling us
+        '''
+        priority = getattr(self._local, 'priority', 'normal')
+        tries    = 0
+        while True:
+            if self.limiter: self.limiter.acquire(priority)
+            start = time.time()
+            try:
+                try:
+                    result = method(*args)
+                finally: # only the call itself, never the backoff
+                    self.metrics.observe('dynamolock_backend_latency_ms',
+                        (time.time() - start) * 1000, operation=operation)
+            except DynamoDBLockThrottledError:
+                tries += 1
+                self.metrics.increment('dynamolock_throttles_total', operation=operation)
+                if self.limiter: self.limiter.on_throttle()
+                if tries > self.policy.throttle_retries: raise
+            else:
+                if self.limiter: self.limiter.on_success()
+                return result
+            sleep(self.policy.get_throttle_delay(tries) / 1000.0)
+
+    def _set_priority(self, priority):
+        ''' Set the limiter priority of the backend calls that the
+        current thread makes from now on.
+
+        :param priority: The new priority, 'high' or 'normal'
+        :returns: The previous priority of the thread
+        '''
+        previous = getattr(self._local, 'priority', 'normal')
+        self._local.priority = priority
+        return previous
+
+    def _record_acquire(self, attempt, created_lock):
+        ''' Record how long the supplied acquire attempt waited
+        and how many tries it made.
+
+        :param attempt: The finished acquire attempt
+        :param created_lock: The acquired lock, or None on failure
+        '''
+        result = 'acquired' if created_lock else 'failed'
+        waited = self.policy.get_new_timestamp() - attempt.initial_time
+        self.metrics.observe('dynamolock_acquire_wait_ms', waited, result=result)
+        self.metrics.observe('dynamolock_acquire_tries', attempt.tries, result=result)
+
+    def _record_conflict(self, case):
+        ''' Record that a conditional write of the acquire
+        protocol lost its race with another client.
+
+        :param case: The case of the acquire protocol that lost
+        '''
+        self.metrics.increment('dynamolock_acquire_conflicts_total', case=case)
@@ -0,0 +1,239 @@
+'''
+The codecs convert the lock payloads to and from the value that is
+stored in the lock table. They can be installed on the schema to keep
+large payloads small (and cheap to read and write)::
+
+    from dynamolock import DynamoDBLockSchema
+    from dynamolock import DynamoDBLockCompressedCodec
+
+    schema = DynamoDBLockSchema(codec=DynamoDBLockCompressedCodec(compression='zlib'))
+
+The payloads that are read back are decoded lazily, only when the
+`payload` of the lock is first accessed, so clients that only watch a
+lock never pay to decode it.
+
+The `msgpack` and `zstandard` packages are only required if their
+respective codecs are used.
+'''
+import json
+import zlib
+from threading import Lock
+
+from boto.dynamodb.types import Binary
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# utilities
+#--------------------------------------------------------------------------------
+
+def _get_bytes(value):
+    ''' Given an encoded value, retrieve its raw bytes.
+
+    :param value: The encoded value (string or binary)
+    :returns: The raw bytes of the value
+    '''
+    value = getattr(value, 'value', value) # unwrap Binary
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockCodec(object):
+    ''' The default codec which stores the payload as is, so it
+    must be a value the underlying table can store directly.
+    '''
+
+    def encode(self, value):
+        ''' Encode the supplied payload to its stored value.
+
+        :param value: The payload to encode
+        :returns: The encoded payload
+        '''
+        return value
+
+    def decode(self, value):
+        ''' Decode the supplied stored value to its payload.
+
+        :param value: The encoded payload
+        :returns: The decoded payload
+        '''
+        return value
+
+    def lazy(self, value):
+        ''' Wrap the supplied stored value so that it is only
+        decoded when it is first accessed.
+
+        :param value: The encoded payload
+        :returns: The lazily decoded payload
+        '''
+        if value is None: return None
+        return DynamoDBLockPayload(self, value)
+
+
+class DynamoDBLockJSONCodec(DynamoDBLockCodec):
+    ''' The codec which stores the payload as a JSON string.
+    '''
+
+    def encode(self, value):
+        ''' Encode the supplied payload to its stored value.
+
+        :param value: The payload to encode
+        :returns: The encoded payload
+        '''
+        return json.dumps(value, separators=(',', ':'))
+
+    def decode(self, value):
+        ''' Decode the supplied stored value to its payload.
+
+        :param value: The encoded payload
+        :returns: The decoded payload
+        '''
+        return json.loads(_get_bytes(value))
+
+
+class DynamoDBLockMsgpackCodec(DynamoDBLockCodec):
+    ''' The codec which stores the payload as msgpack binary. This
+    requires the `msgpack` package to be installed.
+    '''
+
+    def __init__(self):
+        ''' Initialize a new instance of the DynamoDBLockMsgpackCodec class
+        '''
+        if msgpack is None:
+            raise ImportError("the msgpack package is required for the msgpack codec")
+
+    def encode(self, value):
+        ''' Encode the supplied payload to its stored value.
+
+        :param value: The payload to encode
+        :returns: The encoded payload
+        '''
+        return Binary(msgpack.packb(value, use_bin_type=True))
+
+    def decode(self, value):
+        ''' Decode the supplied stored value to its payload.
+
+        :param value: The encoded payload
+        :returns: The decoded payload
+        '''
+        return msgpack.unpackb(_get_bytes(value), raw=False)
+
+
+class DynamoDBLockCompressedCodec(DynamoDBLockCodec):
+    ''' The codec which compresses the output of another codec and
+    stores it as binary. Payloads smaller than the threshold are
+    stored uncompressed as they would not get any smaller. The first
+    byte of the stored value records how it was compressed so that
+    the compression can be changed without breaking existing locks.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockCompressedCodec class
+
+        :param codec: The codec to compress the output of (default json)
+        :param compression: The compression to use, 'zlib' or 'zstd' (default 'zlib')
+        :param level: The compression level to use (default 6 for zlib, 3 for zstd)
+        :param threshold: The size in bytes below which to not compress (default 128)
+        '''
+        self.codec       = kwargs.get('codec', None) or DynamoDBLockJSONCodec()
+        self.compression = kwargs.get('compression', 'zlib')
+        self.threshold   = kwargs.get('threshold', 128)
+
+        if self.compression == 'zstd':
+            if zstandard is None:
+                raise ImportError("the zstandard package is required for zstd compression")
+            self.level = kwargs.get('level', 3)
+        elif self.compression == 'zlib':
+            self.level = kwargs.get('level', 6)
+        else: raise ValueError("unknown compression: %s" % self.compression)
+
+    def encode(self, value):
+        ''' Encode the supplied payload to its stored value.
+
+        :param value: The payload to encode
+        :returns: The encoded payload
+        '''
+        value = _get_bytes(self.codec.encode(value))
+        if len(value) < self.threshold:
+            return Binary('r' + value)
+        if self.compression == 'zstd':
+            return Binary('s' + zstandard.ZstdCompressor(level=self.level).compress(value))
+        return Binary('z' + zlib.compress(value, self.level))
+
+    def decode(self, value):
+        ''' Decode the supplied stored value to its payload.
+
+        :param value: The encoded payload
+        :returns: The decoded payload
+        '''
+        value = _get_bytes(value)
+        marker, value = value[:1], value[1:]
+        if   marker == 'z': value = zlib.decompress(value)
+        elif marker == 's': value = zstandard.ZstdDecompressor().decompress(value)
+        return self.codec.decode(value)
+
+
+class DynamoDBLockPayload(object):
+    ''' A stored payload that is decoded by its codec the first
+    time its value is needed and then cached.
+    '''
+
+    __slots__ = ('codec', 'raw', '_value', '_mutex')
+    _missing  = object()
+
+    def __init__(self, codec, raw):
+        ''' Initialize a new instance of the DynamoDBLockPayload class
+
+        :param codec: The codec to decode the payload with
+        :param raw: The encoded payload
+        '''
+        self.codec  = codec
+        self.raw    = raw
+        self._value = self._missing
+        self._mutex = Lock()
+
+    @property
+    def value(self):
+        ''' The decoded value of the payload.
+        '''
+        if self._value is self._missing:
+            with self._mutex:
+                if self._value is self._missing:
+                    self._value = self.codec.decode(self.raw)
+        return self._value
+
+    # ------------------------------------------------------------
+    # magic methods
+    # ------------------------------------------------------------
+
+    def __eq__(self, other):
+        if isinstance(other, DynamoDBLockPayload):
+            return self.raw == other.raw
+        return self.value == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __str__(self):
+        return "<payload %s>" % self.codec.__class__.__name__
+
+    __repr__ = __str__
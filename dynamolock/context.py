@@ -35,7 +35,7 @@ class DynamoDBLockContext(object):
         the specified lock.  When the lock has been acquired,
         this will return.
         '''
-        self.lock = self.client.acquire_lock(name)
+        self.lock = self.client.acquire_lock(self.name)
         return self
 
     def __exit__(self, ex_type, value, traceback):
@@ -0,0 +1,212 @@
+'''
+The handoff coalesces the threads of a single process that are waiting
+on the same lock name. Only one of them (the contender) runs the acquire
+protocol against the backend at a time, the rest wait in a local FIFO
+queue. When the contender gives up, the next waiter takes its place,
+and when the lock is released it can be handed directly to the next
+waiter without ever being released to the backend::
+
+    client = DynamoDBLockClient(coalesce=True, handoff=True)
+
+This removes the thundering herd of reads and conditional writes that
+many threads contending for the same hash key would otherwise cause.
+'''
+import time
+from threading import Lock, Event
+from collections import deque
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockWaiter(object):
+    ''' The state of a single thread waiting on a lock name. It
+    is woken either when it is handed the lock or when it becomes
+    the contender for the lock.
+    '''
+
+    __slots__ = ('event', 'lock', 'is_contender')
+
+    def __init__(self, is_contender=False):
+        ''' Initialize a new instance of the DynamoDBLockWaiter class
+
+        :param is_contender: True if this waiter may contend for the lock
+        '''
+        self.event        = Event()
+        self.lock         = None
+        self.is_contender = is_contender
+
+
+class DynamoDBLockQueue(object):
+    ''' The local state of a single lock name: whether the lock
+    is held by this process, who is contending for it, and who is
+    waiting behind them.
+    '''
+
+    __slots__ = ('is_held', 'contender', 'waiters')
+
+    def __init__(self):
+        ''' Initialize a new instance of the DynamoDBLockQueue class
+        '''
+        self.is_held   = False
+        self.contender = None
+        self.waiters   = deque()
+
+    def is_idle(self):
+        ''' Check if nothing is happening with the lock locally.
+
+        :returns: True if the queue can be discarded, False otherwise
+        '''
+        return not (self.is_held or self.contender or self.waiters)
+
+
+class DynamoDBLockHandoff(object):
+    ''' The per name queues of the waiters on the locks of a
+    single client. All of the methods are thread safe.
+    '''
+
+    def __init__(self):
+        ''' Initialize a new instance of the DynamoDBLockHandoff class
+        '''
+        self.queues = {}
+        self._mutex = Lock()
+
+    def join(self, name, no_wait=False):
+        ''' Join the queue of waiters for the supplied name. If
+        the lock is neither held nor contended locally, the new
+        waiter immediately becomes the contender.
+
+        :param name: The name of the lock to wait for
+        :param no_wait: True to not join if we would have to wait
+        :returns: The new waiter, or None if we would have to wait
+        '''
+        with self._mutex:
+            queue = self.queues.setdefault(name, DynamoDBLockQueue())
+            if not queue.is_held and not queue.contender:
+                queue.contender = DynamoDBLockWaiter(is_contender=True)
+                return queue.contender
+            if no_wait:
+                return None
+
+            waiter = DynamoDBLockWaiter()
+            queue.waiters.append(waiter)
+            return waiter
+
+    def wait(self, name, waiter, timeout, period, is_held):
+        ''' Wait until the supplied waiter is either handed the
+        lock or becomes the contender. Every period we check that
+        the lock really is still held (it may have been lost without
+        being released) so that the queue can never stall.
+
+        :param name: The name of the lock to wait for
+        :param waiter: The waiter to wait with
+        :param timeout: The seconds to wait at most
+        :param period: The seconds between checks that the lock is held
+        :param is_held: A callable that checks if the lock is still held
+        :returns: True if the waiter was woken, False if it timed out
+        '''
+        deadline = time.time() + timeout
+        while not waiter.event.wait(max(min(deadline - time.time(), period), 0)):
+            with self._mutex:
+                queue = self.queues.get(name)
+                if waiter.event.is_set():
+                    break # we were woken as we timed out
+
+                if queue.is_held and not is_held():
+                    _logger.debug("local holder of lock %s lost it, promoting next waiter", name)
+                    queue.is_held = False
+                    self._promote(queue)
+                    if waiter.event.is_set(): break
+
+                if time.time() >= deadline:
+                    queue.waiters.remove(waiter)
+                    self._discard(name, queue)
+                    return False
+        return True
+
+    def finish(self, name, waiter, lock):
+        ''' Record the result of the contender for the supplied
+        name. If it failed to get the lock, the next waiter becomes
+        the contender and tries on its own deadline.
+
+        :param name: The name of the contended lock
+        :param waiter: The contender that finished
+        :param lock: The acquired lock, or None on failure
+        '''
+        with self._mutex:
+            queue = self.queues[name]
+            if queue.contender is waiter:
+                queue.contender = None
+            queue.is_held = bool(lock)
+            if not lock: self._promote(queue)
+            self._discard(name, queue)
+
+    def release(self, name, lock=None):
+        ''' Release the supplied name locally. If a lock is supplied
+        and there is a waiter, the lock is handed to it directly,
+        otherwise the next waiter (if any) becomes the contender.
+
+        :param name: The name of the lock that was released
+        :param lock: The lock to hand to the next waiter (or None)
+        :returns: True if the lock was handed off, False otherwise
+        '''
+        with self._mutex:
+            queue = self.queues.get(name)
+            if queue is None:
+                return False
+
+            if lock and queue.waiters:
+                waiter = queue.waiters.popleft()
+                waiter.lock = lock
+                waiter.event.set()
+                return True
+
+            queue.is_held = False
+            self._promote(queue)
+            self._discard(name, queue)
+            return False
+
+    def has_waiters(self, name):
+        ''' Check if any thread is waiting on the supplied name.
+
+        :param name: The name of the lock to check
+        :returns: True if there are waiters, False otherwise
+        '''
+        queue = self.queues.get(name)
+        return bool(queue and queue.waiters)
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _promote(self, queue):
+        ''' Promote the next waiter to be the contender if no one
+        holds or is contending for the lock. Must be called while
+        holding the mutex.
+
+        :param queue: The queue to promote the next waiter of
+        '''
+        if queue.is_held or queue.contender or not queue.waiters:
+            return
+
+        waiter = queue.waiters.popleft()
+        waiter.is_contender = True
+        queue.contender = waiter
+        waiter.event.set()
+
+    def _discard(self, name, queue):
+        ''' Discard the supplied queue if it is no longer in use.
+        Must be called while holding the mutex.
+
+        :param name: The name of the lock of the queue
+        :param queue: The queue to discard
+        '''
+        if queue.is_idle() and self.queues.get(name) is queue:
+            del self.queues[name]
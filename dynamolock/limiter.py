@@ -0,0 +1,147 @@
+'''
+The limiter paces the requests that a client makes to the lock table
+so that a burst of waiters polling for a lock cannot use up the
+capacity that the heartbeat needs to keep the locks we already hold::
+
+    from dynamolock import DynamoDBLockClient, DynamoDBLockLimiter
+
+    limiter = DynamoDBLockLimiter(rate=50, max_rate=500)
+    client  = DynamoDBLockClient(limiter=limiter)
+
+It is a token bucket whose rate adapts to the throttling signals of the
+table: it grows slowly while requests succeed and is cut in half when
+the table throttles us (additive increase, multiplicative decrease).
+A share of the bucket is reserved for the high priority requests (the
+heartbeat renewals and releases), which are also always served before
+any waiting normal priority request.
+'''
+import time
+from threading import Condition
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# exceptions
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockThrottledError(Exception):
+    ''' Raised by a backend when the lock table refused a request
+    because of a lack of capacity (or failed it with a retryable
+    server error), so that it is unknown if the request happened.
+    '''
+    pass
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockLimiter(object):
+    ''' An adaptive token bucket that may be shared by every
+    client (and thread) using the same lock table.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockLimiter class
+
+        :param rate: The initial requests per second (default 10)
+        :param min_rate: The lowest requests per second to back off to (default 1)
+        :param max_rate: The highest requests per second to grow to (default 1000)
+        :param burst: The most requests that may be made at once (default the rate)
+        :param increase: The requests per second to grow by each second (default 1)
+        :param decrease: The fraction to cut the rate to on a throttle (default 0.5)
+        :param reserve: The fraction of a second of requests kept for high priority (default 0.2)
+        :param cooldown: The least seconds between two rate cuts (default 1)
+        '''
+        self.rate     = float(kwargs.get('rate', 10))
+        self.min_rate = float(kwargs.get('min_rate', 1))
+        self.max_rate = float(kwargs.get('max_rate', 1000))
+        self.burst    = max(float(kwargs.get('burst', self.rate)), 1.0)
+        self.increase = kwargs.get('increase', 1.0)
+        self.decrease = kwargs.get('decrease', 0.5)
+        self.reserve  = kwargs.get('reserve', 0.2)
+        self.cooldown = kwargs.get('cooldown', 1.0)
+        self.tokens   = self.burst
+        self._updated = time.time()
+        self._decreased = 0
+        self._priority  = 0 # high priority requests waiting
+        self._condition = Condition()
+
+    def acquire(self, priority='normal', timeout=None):
+        ''' Wait until a request of the supplied priority may be
+        made. A normal priority request must leave the reserved share
+        of the bucket and must wait for all high priority requests.
+
+        :param priority: The priority of the request, 'high' or 'normal'
+        :param timeout: The seconds to wait at most (default forever)
+        :returns: True if the request may be made, False if we timed out
+        '''
+        is_high  = (priority == 'high')
+        deadline = (time.time() + timeout) if timeout is not None else None
+
+        with self._condition:
+            if is_high: self._priority += 1
+            try:
+                while True:
+                    self._refill()
+                    needed = 1.0 if is_high else self._get_reserve() + 1.0
+                    if self.tokens >= needed and (is_high or not self._priority):
+                        self.tokens -= 1.0
+                        return True
+
+                    delay = max(needed - self.tokens, 0.0) / self.rate or 0.001
+                    if deadline is not None:
+                        if time.time() >= deadline: return False
+                        delay = min(delay, deadline - time.time())
+                    self._condition.wait(delay)
+            finally:
+                if is_high:
+                    self._priority -= 1
+                    self._condition.notify_all()
+
+    def on_success(self):
+        ''' Record that a request succeeded, growing the rate so
+        that it increases by roughly `increase` every second.
+        '''
+        with self._condition:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        ''' Record that a request was throttled, cutting the rate
+        (at most once per cooldown so that a single burst of throttles
+        does not collapse the rate).
+        '''
+        with self._condition:
+            now = time.time()
+            if now - self._decreased < self.cooldown:
+                return
+            self._decreased = now
+            self.rate   = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            _logger.debug("throttled, reducing request rate to %.1f/s", self.rate)
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _get_reserve(self):
+        ''' Retrieve the number of tokens kept for high priority
+        requests, which shrinks with the rate so that a throttled
+        client can still make normal requests. Must be called while
+        holding the condition.
+
+        :returns: The number of reserved tokens
+        '''
+        return min(self.reserve * min(self.burst, self.rate), self.burst - 1.0)
+
+    def _refill(self):
+        ''' Add the tokens earned since the last refill. Must be
+        called while holding the condition.
+        '''
+        now = time.time()
+        self.tokens   = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
@@ -5,11 +5,59 @@ so that the rest of the system will be thread safe. Thus, the instances
 of lock that are returned from the client have no impact on the function
 of the client.
 '''
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+
+from .codec import DynamoDBLockPayload
 
 #--------------------------------------------------------------------------------
 # classes
 #--------------------------------------------------------------------------------
 
-DynamoDBLock = namedtuple('DynamoDBLock',
-    ['name', 'version', 'owner', 'duration', 'timestamp', 'is_locked', 'payload'])
+class DynamoDBLock(namedtuple('DynamoDBLock',
+    ['name', 'version', 'owner', 'duration', 'timestamp', 'is_locked', 'payload', 'readers'])):
+    ''' The state of a single lock. Payloads that were read from
+    the table are only decoded when `payload` is first accessed. The
+    readers are only set on shared locks (see `DynamoDBLockShared`).
+    '''
+    __slots__ = ()
+
+    @property
+    def payload(self):
+        ''' The (decoded) payload of the lock.
+        '''
+        payload = tuple.__getitem__(self, 6)
+        return payload.value if isinstance(payload, DynamoDBLockPayload) else payload
+
+    def _asdict(self):
+        ''' Return a new OrderedDict which maps field names
+        to their (decoded) values.
+        '''
+        return OrderedDict(zip(self._fields, self[:6] + (self.payload,) + self[7:]))
+
+DynamoDBLock.__new__.__defaults__ = (None,) # readers
+
+
+class DynamoDBLockAttempt(object):
+    ''' The mutable state of a single attempt at acquiring a lock.
+    This is used by the client to drive the acquire protocol one
+    try at a time and is never shared between attempts.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockAttempt class
+
+        :param name: The name of the lock being acquired
+        :param no_wait: True to only make a single try, False otherwise
+        :param policy: The policy to time the attempt with
+        '''
+        policy = kwargs.get('policy')
+
+        self.name          = kwargs.get('name')
+        self.no_wait       = kwargs.get('no_wait', False)
+        self.initial_time  = policy.get_new_timestamp() # the time we started trying to acquire
+        self.lock_timeout  = policy.acquire_timeout     # how long to wait until we fail
+        self.last_delay    = None                       # how long we waited before the last database read
+        self.waited_time   = 0                          # the total amount of time we have waited
+        self.watching_lock = None                       # the lock we are currently trying to get
+        self.tries         = 0                          # the number of tries we have made at the lock
+        self.final_tries   = 0                          # the tries we may make even after the deadline
@@ -0,0 +1,152 @@
+'''
+The manager hosts many logical lock owners in a single process on top
+of one storage backend (and so one connection pool) and one heartbeat
+worker. This keeps the number of threads and idle wakeups constant no
+matter how many owners (say one per tenant) a service creates::
+
+    from dynamolock import DynamoDBLockManager
+
+    manager = DynamoDBLockManager(region='us-west-2')
+    manager.startup()
+
+    tenant = manager.get_client('tenant-1')
+    lock   = tenant.acquire_lock('reports')
+    ...
+    manager.shutdown()
+
+Each owner is a regular `DynamoDBLockClient` with its own policy and
+set of held locks; the manager only shares the expensive parts. As the
+shared worker keeps all the renewals on one clock, every policy must
+use the clock of the manager policy.
+'''
+from threading import Lock
+
+from .policy  import DynamoDBLockPolicy
+from .schema  import DynamoDBLockSchema
+from .worker  import DynamoDBLockWorker
+from .client  import DynamoDBLockClient
+from .backend import DynamoDBLockTableBackend
+from .metrics import DynamoDBLockMetrics
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockManager(object):
+    ''' The manager of many lock clients that all share the same
+    backend and heartbeat worker.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockManager class
+
+        :param policy: The default timing policy of the hosted clients
+        :param schema: The schema of the database table to work with
+        :param table: The current handle to the dynamodb table client
+        :param backend: The storage backend of the locks (default the dynamodb table)
+        :param region: The region of the default dynamodb table backend
+        :param verify: How to verify the default dynamodb table (see the backend)
+        :param concurrency: The maximum number of renewals in flight (default 8)
+        :param period: The longest time in seconds between renewals (default None)
+        :param metrics: The metrics registry of all the clients (default a new registry)
+        :param limiter: The rate limiter shared by all the clients (default None)
+        '''
+        self.policy  = kwargs.get('policy', DynamoDBLockPolicy())
+        self.schema  = kwargs.get('schema', DynamoDBLockSchema())
+        self.backend = kwargs.get('backend', None) or DynamoDBLockTableBackend(
+            schema=self.schema, table=kwargs.get('table', None),
+            region=kwargs.get('region', None), verify=kwargs.get('verify', True))
+        self.metrics = kwargs.get('metrics', None) or DynamoDBLockMetrics()
+        self.limiter = kwargs.get('limiter', None)
+        self.worker  = DynamoDBLockWorker(client=None, policy=self.policy, metrics=self.metrics,
+            concurrency=kwargs.get('concurrency', 8), period=kwargs.get('period', None))
+        self.clients = {}
+        self._mutex  = Lock()
+
+    # ------------------------------------------------------------
+    # worker methods
+    # ------------------------------------------------------------
+
+    def startup(self):
+        ''' Start the shared heartbeat thread of all the clients.
+        '''
+        self.worker.start()
+
+    def shutdown(self, timeout=None):
+        ''' Stop the shared heartbeat thread and release all of the
+        locks held by all of the hosted clients.
+
+        :param timeout: The seconds to wait for the worker (default the retry period)
+        '''
+        if timeout is None:
+            timeout = self.policy.retry_period / 1000.0
+        self.worker.stop(timeout=timeout)
+        for client in list(self.clients.values()):
+            client.shutdown()
+
+    # ------------------------------------------------------------
+    # client methods
+    # ------------------------------------------------------------
+
+    def get_client(self, owner=None, policy=None):
+        ''' Retrieve the client for the supplied owner, creating it
+        on the shared backend and worker if it does not exist yet.
+
+        :param owner: The owner of the client (default a new owner)
+        :param policy: The timing policy of a new client (default the manager policy)
+        :returns: The client for the supplied owner
+        :raises ValueError: If the policy uses a different clock than the manager
+        '''
+        with self._mutex:
+            client = self.clients.get(owner) if owner is not None else None
+            if client is None:
+                policy = policy or self.policy
+                if policy.clock != self.policy.clock: # the shared worker keeps one clock
+                    raise ValueError("the client clock must match the manager clock")
+                client = DynamoDBLockClient(
+                    owner   = owner if owner is not None else policy.get_new_owner(),
+                    policy  = policy,
+                    schema  = self.schema,
+                    backend = self.backend,
+                    worker  = self.worker,
+                    metrics = self.metrics,
+                    limiter = self.limiter)
+                self.clients[client.owner] = client
+                self.worker.register(client)
+                _logger.debug("added lock client for owner: %s", client.owner)
+            return client
+
+    def remove_client(self, owner):
+        ''' Remove the client of the supplied owner from the manager
+        and release all of the locks that it currently holds.
+
+        :param owner: The owner of the client to remove
+        :returns: True if all the locks were released, False otherwise
+        '''
+        with self._mutex:
+            client = self.clients.pop(owner, None)
+        if client is None:
+            return True
+
+        self.worker.unregister(client)
+        _logger.debug("removed lock client for owner: %s", owner)
+        is_released = client.release_all_locks()
+        self.metrics.remove_gauge('dynamolock_held_locks', owner=owner)
+        return is_released
+
+    # ------------------------------------------------------------
+    # magic methods
+    # ------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __contains__(self, owner):
+        return owner in self.clients
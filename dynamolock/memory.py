@@ -0,0 +1,362 @@
+'''
+An in-memory stand-in for the boto dynamodb `Table` that implements
+exactly the subset of the table interface (and the conditional write
+semantics) that the lock client relies on. It can be supplied to the
+client with the `table` parameter so that the full lock protocol can
+be run in process for testing and benchmarking::
+
+    from dynamolock import DynamoDBLockClient
+    from dynamolock import DynamoDBLockMemoryTable
+
+    table  = DynamoDBLockMemoryTable()
+    client = DynamoDBLockClient(table=table)
+
+It also implements the subset of the `TransactWriteItems` operation
+(which the boto table lacks) that the lock backend builds its atomic
+multi-lock writes on. A single table may be shared between many clients
+(and threads) to simulate a number of hosts contending for the same
+locks. Every change
+to the table is also published to its subscribers in the same form as
+a dynamodb stream, see `DynamoDBLockLocalFeed`.
+'''
+from copy import deepcopy
+from threading import Lock
+
+from boto.exception import JSONResponseError
+from boto.dynamodb2.types import Dynamizer
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException, ItemNotFound
+
+from .schema import DynamoDBLockSchema
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockMemoryTable(object):
+    ''' A thread safe in-memory table that mimics the boto dynamodb
+    `Table` operations used by the lock client. All values are run
+    through the same encoding as the real table so that the client
+    sees the same types (`Decimal` numbers, etc) that dynamodb would
+    return.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockMemoryTable class
+
+        :param schema: The schema of the database table to mimic
+        :param table_name: The name of the table (default the schema table name)
+        '''
+        self.schema      = kwargs.get('schema', DynamoDBLockSchema())
+        self.table_name  = kwargs.get('table_name', self.schema.table_name)
+        self.items       = {}
+        self.subscribers = []
+        self._dynamizer  = Dynamizer()
+        self._mutex      = Lock()
+
+    # ------------------------------------------------------------
+    # table methods
+    # ------------------------------------------------------------
+
+    def describe(self):
+        ''' Retrieve a description of the current table in the
+        same form as the dynamodb `DescribeTable` operation.
+
+        :returns: The description of the current table
+        '''
+        with self._mutex:
+            count = len(self.items)
+
+        return {
+            'Table': {
+                'TableName':   self.table_name,
+                'TableStatus': 'ACTIVE',
+                'ItemCount':   count,
+                'KeySchema':   [{ 'AttributeName': self.schema.name, 'KeyType': 'HASH' }],
+                'ProvisionedThroughput': {
+                    'ReadCapacityUnits':  self.schema.read_capacity,
+                    'WriteCapacityUnits': self.schema.write_capacity,
+                },
+            }
+        }
+
+    def subscribe(self, callback):
+        ''' Subscribe to every change of the items in the table. The
+        callback is called as `callback(event, key, item)` with the
+        event (`insert`, `modify`, or `remove`), the hash key, and a
+        copy of the new decoded item (None when removed).
+
+        :param callback: The callback to call on every change
+        '''
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        ''' Stop calling the supplied callback on every change.
+
+        :param callback: The callback to stop calling
+        '''
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _encode_keys(self, keys):
+        ''' Given a flat dictionary of values, convert it into
+        the nested dictionary dynamodb expects.
+
+        :param keys: The values to encode
+        :returns: The encoded values
+        '''
+        return { key : self._dynamizer.encode(value) for key, value in keys.items() }
+
+    def _decode_keys(self, keys):
+        ''' Given a nested dictionary of dynamodb values, convert
+        it into a flat dictionary of values.
+
+        :param keys: The values to decode
+        :returns: The decoded values
+        '''
+        return { key : self._dynamizer.decode(value) for key, value in keys.items() }
+
+    def get_item(self, consistent=False, attributes=None, **kwargs):
+        ''' Retrieve the item with the supplied hash key. As there
+        is only a single copy of the data, every read is consistent.
+
+        :param consistent: Ignored, all reads are consistent
+        :param attributes: The attributes to retrieve (default all)
+        :returns: A copy of the item at the supplied key
+        :raises ItemNotFound: If there is no item at the key
+        '''
+        key = self._get_key(kwargs)
+        with self._mutex:
+            item = self.items.get(key)
+            if item is None:
+                raise ItemNotFound("Item %s couldn't be found." % kwargs)
+            item = deepcopy(item)
+
+        if attributes is not None:
+            item = { k : v for k, v in item.items() if k in attributes }
+        return item
+
+    def batch_get(self, keys, consistent=False, attributes=None):
+        ''' Retrieve all of the items with the supplied hash keys
+        that exist. As there is only a single copy of the data, every
+        read is consistent.
+
+        :param keys: The list of key dicts of the items to retrieve
+        :param consistent: Ignored, all reads are consistent
+        :param attributes: The attributes to retrieve (default all)
+        :returns: A list of copies of the items that exist
+        '''
+        items = []
+        for key in keys:
+            try:
+                items.append(self.get_item(attributes=attributes, **key))
+            except ItemNotFound: pass
+        return items
+
+    def _put_item(self, item_data, expects=None):
+        ''' Write the supplied encoded item if all of the supplied
+        expectations hold against the current item.
+
+        :param item_data: The encoded item to write
+        :param expects: The expectations of the current item
+        :returns: True if the item was written
+        :raises ConditionalCheckFailedException: If an expectation fails
+        '''
+        item = self._decode_keys(item_data)
+        key  = self._get_key(item)
+        with self._mutex:
+            current = self.items.get(key)
+            self._check_expects(current, expects)
+            self.items[key] = item
+        self._publish('insert' if current is None else 'modify', key, item)
+        return True
+
+    def _update_item(self, key, item_data, expects=None):
+        ''' Apply the supplied encoded attribute updates to the item
+        at the supplied key if all of the supplied expectations hold.
+        As with dynamodb, the item is created if it does not exist.
+
+        :param key: The key of the item to update
+        :param item_data: The encoded attribute updates to apply
+        :param expects: The expectations of the current item
+        :returns: True if the item was updated
+        :raises ConditionalCheckFailedException: If an expectation fails
+        '''
+        key = self._get_key(key)
+        with self._mutex:
+            current = self.items.get(key)
+            self._check_expects(current, expects)
+
+            item = dict(current or { self.schema.name: key })
+            for name, update in item_data.items():
+                action = update.get('Action', 'PUT')
+                if   action == 'PUT':    item[name] = self._dynamizer.decode(update['Value'])
+                elif action == 'DELETE': item.pop(name, None)
+                elif action == 'ADD':    item[name] = item.get(name, 0) + self._dynamizer.decode(update['Value'])
+            self.items[key] = item
+        self._publish('insert' if current is None else 'modify', key, item)
+        return True
+
+    def delete_item(self, expected=None, conditional_operator=None, **kwargs):
+        ''' Delete the item at the supplied key if all of the
+        supplied filter style expectations hold (`name__eq`).
+
+        :param expected: The filter style expectations of the current item
+        :param conditional_operator: Ignored, expectations are always AND
+        :returns: True if the item was deleted, False otherwise
+        '''
+        expects = {}
+        for field, value in (expected or {}).items():
+            name, operator = field.rsplit('__', 1)
+            expects[name] = {
+                'ComparisonOperator': operator.upper(),
+                'AttributeValueList': [self._dynamizer.encode(value)],
+            }
+
+        key = self._get_key(kwargs)
+        with self._mutex:
+            try:
+                self._check_expects(self.items.get(key), expects)
+            except ConditionalCheckFailedException:
+                return False
+            current = self.items.pop(key, None)
+        if current is not None:
+            self._publish('remove', key, None)
+        return True
+
+    def transact_write_items(self, items):
+        ''' Apply all of the supplied `Put` and `Update` transaction
+        items atomically if all of their condition expressions hold,
+        as with the dynamodb `TransactWriteItems` operation. Only the
+        expressions that the lock backend writes are supported: `SET`
+        updates and `AND` joined `attribute_exists`,
+        `attribute_not_exists`, and equality conditions.
+
+        :param items: The encoded transaction items to write
+        :returns: An empty response on success
+        :raises JSONResponseError: If any condition fails (`TransactionCanceledException`)
+        '''
+        with self._mutex:
+            reasons, changes = [], []
+            for item in items:
+                action  = item.get('Put') or item.get('Update')
+                names   = action.get('ExpressionAttributeNames', {})
+                values  = action.get('ExpressionAttributeValues', {})
+                key     = self._get_key(self._decode_keys(action.get('Key') or action['Item']))
+                current = self.items.get(key)
+                is_valid = self._check_condition(current, action.get('ConditionExpression'), names, values)
+                reasons.append({ 'Code': 'None' if is_valid else 'ConditionalCheckFailed' })
+
+                if 'Put' in item: updated = self._decode_keys(action['Item'])
+                else:
+                    updated = dict(current or { self.schema.name: key })
+                    for assignment in action['UpdateExpression'][len('SET '):].split(', '):
+                        field, value = assignment.split(' = ')
+                        updated[names.get(field, field)] = self._dynamizer.decode(values[value])
+                changes.append(('insert' if current is None else 'modify', key, updated))
+
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise JSONResponseError(400, "Bad Request", {
+                    '__type': 'com.amazonaws.dynamodb.v20120810#TransactionCanceledException',
+                    'message': 'Transaction cancelled, please refer cancellation reasons for specific reasons',
+                    'CancellationReasons': reasons,
+                })
+            for event, key, updated in changes:
+                self.items[key] = updated
+
+        for event, key, updated in changes:
+            self._publish(event, key, updated)
+        return {}
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _check_condition(self, item, condition, names, values):
+        ''' Check that the supplied condition expression holds
+        against the supplied item. Must be called while holding the
+        table mutex.
+
+        :param item: The current decoded item (or None)
+        :param condition: The `AND` joined condition expression (or None)
+        :param names: The expression attribute names
+        :param values: The encoded expression attribute values
+        :returns: True if the condition holds, False otherwise
+        '''
+        item = item or {}
+        for term in (condition.split(' AND ') if condition else []):
+            term = term.strip()
+            if term.startswith('attribute_not_exists('):
+                is_valid = names.get(term[21:-1], term[21:-1]) not in item
+            elif term.startswith('attribute_exists('):
+                is_valid = names.get(term[17:-1], term[17:-1]) in item
+            else:
+                field, value = term.split(' = ')
+                is_valid = item.get(names.get(field, field)) == self._dynamizer.decode(values[value])
+            if not is_valid: return False
+        return True
+
+    def _publish(self, event, key, item):
+        ''' Publish a change of the table to all of the subscribers.
+        This is called after the change is made (outside of the table
+        mutex) so that the subscribers may read the table.
+
+        :param event: The kind of change, `insert`, `modify`, or `remove`
+        :param key: The hash key of the changed item
+        :param item: The new decoded item (None when removed)
+        '''
+        for callback in list(self.subscribers):
+            try:
+                callback(event, key, deepcopy(item))
+            except Exception:
+                _logger.exception("failed publishing change of item: %s", key)
+
+    def _get_key(self, item):
+        ''' Retrieve the hash key value of the supplied item.
+
+        :param item: The decoded item to get the key of
+        :returns: The hash key of the item
+        '''
+        return item[self.schema.name]
+
+    def _check_expects(self, item, expects):
+        ''' Check that the supplied expectations (in the legacy
+        dynamodb `Expected` format) all hold against the supplied
+        item. Must be called while holding the table mutex.
+
+        :param item: The current decoded item (or None)
+        :param expects: The expectations of the current item
+        :raises ConditionalCheckFailedException: If an expectation fails
+        '''
+        item = item or {}
+        for name, expect in (expects or {}).items():
+            current = item.get(name)
+            if 'ComparisonOperator' in expect:
+                operator = expect['ComparisonOperator']
+                values   = [self._dynamizer.decode(v) for v in expect.get('AttributeValueList', [])]
+            elif str(expect.get('Exists', 'true')).lower() == 'false':
+                operator, values = 'NULL', []
+            else: operator, values = 'EQ', [self._dynamizer.decode(expect['Value'])]
+
+            if   operator == 'NULL':     is_valid = current is None
+            elif operator == 'NOT_NULL': is_valid = current is not None
+            elif current is None:        is_valid = (operator == 'NE')
+            elif operator == 'EQ':       is_valid = current == values[0]
+            elif operator == 'NE':       is_valid = current != values[0]
+            elif operator == 'LT':       is_valid = current <  values[0]
+            elif operator == 'LE':       is_valid = current <= values[0]
+            elif operator == 'GT':       is_valid = current >  values[0]
+            elif operator == 'GE':       is_valid = current >= values[0]
+            else: raise ValueError("unsupported comparison operator: %s" % operator)
+
+            if not is_valid:
+                raise ConditionalCheckFailedException(400, "Bad Request", {
+                    '__type': 'com.amazonaws.dynamodb.v20120810#ConditionalCheckFailedException',
+                    'message': 'The conditional request failed',
+                })
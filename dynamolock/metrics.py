@@ -0,0 +1,250 @@
+'''
+The metrics registry records what the lock client and its worker are
+doing on their hot paths: the latency of every backend call, how long
+and how many tries each acquire takes, how often a conditional write
+loses a race, and how long and how late the heartbeat renewals are::
+
+    client = DynamoDBLockClient()
+    ...
+    print client.metrics.snapshot()
+    print client.metrics.to_prometheus()
+
+A registry may be shared by any number of clients (and is shared by all
+of the clients of a `DynamoDBLockManager`). The recorded series are:
+
+* `dynamolock_backend_latency_ms{operation}` - histogram of backend calls
+* `dynamolock_acquire_wait_ms{result}` - histogram of acquire wait times
+* `dynamolock_acquire_tries{result}` - histogram of tries per acquire
+* `dynamolock_acquire_conflicts_total{case}` - lost conditional writes
+* `dynamolock_sweep_duration_ms` - histogram of heartbeat sweep times
+* `dynamolock_renewal_lag_ms` - histogram of renewals behind schedule
+* `dynamolock_renewals_total{result}` - renewals by success or failure
+* `dynamolock_held_locks{owner}` - the number of currently held locks
+'''
+import bisect
+from threading import Lock
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+COUNT_BUCKETS   = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+#--------------------------------------------------------------------------------
+# utilities
+#--------------------------------------------------------------------------------
+
+def _get_series(name, labels):
+    ''' Retrieve the prometheus name of the supplied series.
+
+    :param name: The name of the metric
+    :param labels: The sorted (label, value) pairs of the series
+    :returns: The name of the series
+    '''
+    if not labels: return name
+    return '%s{%s}' % (name, ','.join('%s="%s"' % (key,
+        str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels))
+
+def _get_labels(labels):
+    ''' Retrieve the hashable form of the supplied labels.
+
+    :param labels: The dict of labels
+    :returns: The sorted (label, value) pairs
+    '''
+    return tuple(sorted(labels.items()))
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockHistogram(object):
+    ''' A histogram of observed values with fixed upper bucket
+    bounds in the same form as a prometheus histogram.
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        ''' Initialize a new instance of the DynamoDBLockHistogram class
+
+        :param buckets: The sorted upper bounds of the buckets
+        '''
+        self.buckets = tuple(buckets)
+        self.counts  = [0] * (len(self.buckets) + 1) # last is +Inf
+        self.count   = 0
+        self.sum     = 0.0
+
+    def observe(self, value):
+        ''' Record a single observed value.
+
+        :param value: The value to record
+        '''
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum   += value
+
+    def get_quantile(self, quantile):
+        ''' Estimate the supplied quantile of the observed values
+        by interpolating within the bucket that it falls in.
+
+        :param quantile: The quantile to estimate (0.0 to 1.0)
+        :returns: The estimated value, or None without observations
+        '''
+        if not self.count: return None
+
+        rank, seen = quantile * self.count, 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / float(count)
+            seen += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        ''' Retrieve a copy of the current state of the histogram.
+
+        :returns: A dict of the count, sum, and cumulative buckets
+        '''
+        buckets, total = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return { 'count': self.count, 'sum': self.sum, 'buckets': buckets }
+
+
+class DynamoDBLockMetrics(object):
+    ''' A thread safe registry of counters, gauges, and histograms
+    each keyed by their name and labels.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockMetrics class
+
+        :param latency_buckets: The buckets of millisecond histograms
+        :param count_buckets: The buckets of count histograms
+        '''
+        self.latency_buckets = kwargs.get('latency_buckets', LATENCY_BUCKETS)
+        self.count_buckets   = kwargs.get('count_buckets', COUNT_BUCKETS)
+        self.counters   = {} # (name, labels) -> value
+        self.gauges     = {} # (name, labels) -> callable
+        self.histograms = {} # (name, labels) -> histogram
+        self._mutex     = Lock()
+
+    def increment(self, name, value=1, **labels):
+        ''' Increment the named counter by the supplied value.
+
+        :param name: The name of the counter
+        :param value: The amount to increment by (default 1)
+        '''
+        key = (name, _get_labels(labels))
+        with self._mutex:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, getter, **labels):
+        ''' Register a gauge whose value is read from the supplied
+        callable whenever the metrics are collected.
+
+        :param name: The name of the gauge
+        :param getter: The callable that returns the current value
+        '''
+        with self._mutex:
+            self.gauges[(name, _get_labels(labels))] = getter
+
+    def remove_gauge(self, name, **labels):
+        ''' Remove a previously registered gauge, so that it is no
+        longer collected (and its callable is no longer referenced).
+
+        :param name: The name of the gauge
+        '''
+        with self._mutex:
+            self.gauges.pop((name, _get_labels(labels)), None)
+
+    def observe(self, name, value, **labels):
+        ''' Record a value in the named histogram. Histograms whose
+        name ends in `_ms` use the latency buckets, the rest use the
+        count buckets.
+
+        :param name: The name of the histogram
+        :param value: The value to record
+        '''
+        key = (name, _get_labels(labels))
+        with self._mutex:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                buckets   = self.latency_buckets if name.endswith('_ms') else self.count_buckets
+                histogram = self.histograms[key] = DynamoDBLockHistogram(buckets)
+            histogram.observe(value)
+
+    def get_histogram(self, name, **labels):
+        ''' Retrieve the named histogram if it has any observations.
+
+        :param name: The name of the histogram
+        :returns: The histogram, or None if there is none
+        '''
+        return self.histograms.get((name, _get_labels(labels)))
+
+    def get_counter(self, name, **labels):
+        ''' Retrieve the current value of the named counter.
+
+        :param name: The name of the counter
+        :returns: The value of the counter
+        '''
+        return self.counters.get((name, _get_labels(labels)), 0)
+
+    def snapshot(self):
+        ''' Retrieve a copy of all of the current metrics keyed by
+        their prometheus series names.
+
+        :returns: A dict of the counters, gauges, and histograms
+        '''
+        with self._mutex:
+            counters   = dict(self.counters)
+            gauges     = dict(self.gauges)
+            histograms = { key : value.snapshot() for key, value in self.histograms.items() }
+
+        return {
+            'counters':   { _get_series(*key) : value for key, value in counters.items() },
+            'gauges':     { _get_series(*key) : getter() for key, getter in gauges.items() },
+            'histograms': { _get_series(*key) : value for key, value in histograms.items() },
+        }
+
+    def to_prometheus(self):
+        ''' Render all of the current metrics in the prometheus
+        text exposition format.
+
+        :returns: The rendered metrics
+        '''
+        with self._mutex:
+            counters   = sorted(self.counters.items())
+            gauges     = sorted(self.gauges.items())
+            histograms = sorted((key, value.snapshot()) for key, value in self.histograms.items())
+
+        lines, types = [], set()
+        def add_type(name, kind):
+            if name not in types:
+                types.add(name)
+                lines.append('# TYPE %s %s' % (name, kind))
+
+        for (name, labels), value in counters:
+            add_type(name, 'counter')
+            lines.append('%s %s' % (_get_series(name, labels), value))
+
+        for (name, labels), getter in gauges:
+            add_type(name, 'gauge')
+            lines.append('%s %s' % (_get_series(name, labels), getter()))
+
+        for (name, labels), value in histograms:
+            add_type(name, 'histogram')
+            for bound, count in value['buckets']:
+                lines.append('%s %d' % (_get_series(name + '_bucket', labels + (('le', bound),)), count))
+            lines.append('%s %s' % (_get_series(name + '_sum', labels), value['sum']))
+            lines.append('%s %d' % (_get_series(name + '_count', labels), value['count']))
+
+        return '\n'.join(lines) + '\n'
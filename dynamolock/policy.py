@@ -4,6 +4,16 @@ import socket
 import json
 from datetime import timedelta
 
+from .backoff import DynamoDBLockBackoff, DynamoDBLockExponentialBackoff
+
+try:
+    from time import monotonic
+except ImportError:
+    try:
+        from monotonic import monotonic # the backport for python 2
+    except ImportError:
+        monotonic = None
+
 #--------------------------------------------------------------------------------
 # logging
 #--------------------------------------------------------------------------------
@@ -36,6 +46,15 @@ class DynamoDBLockPolicy(object):
 
             def get_new_version(self):
                 return time.time()
+
+    All of the lock timestamps are taken on the local clock of this
+    process and are never stored, so the `clock` may be a monotonic
+    clock that does not jump with NTP adjustments. A held lock is only
+    trusted until `lease_margin` before the end of its lease, and a
+    watched lock is only taken over `takeover_margin` after the end of
+    its lease, which leaves room for clock drift and process pauses.
+    With these, short leases can be used safely to replace a crashed
+    holder within a second or two, see `fast_failover`.
     '''
 
     def __init__(self, **kwargs):
@@ -44,16 +63,54 @@ class DynamoDBLockPolicy(object):
         :param acquire_timeout: The amount of time to wait trying to get a lock
         :param retry_period: The time to wait between retries to the server
         :param lock_duration: The default amount of time needed to hold the lock
-        :param delete_lock: True to delete locks on release, false otherwise
+        :param delete_lock: True to delete locks on release, false otherwise (default True, False for counters)
+        :param backoff: The backoff strategy between retries (default constant retry_period)
+        :param wait_for_expiry: True to not read a held lock until its lease ends (default False)
+        :param versioning: 'uuid' for random versions or 'counter' for numeric versions (default 'uuid')
+        :param throttle_retries: The times to retry a throttled request (default 3)
+        :param throttle_backoff: The backoff strategy between throttled retries (default exponential 50 ms)
+        :param clock: 'wall', 'monotonic', or a callable returning seconds (default 'wall')
+        :param lease_margin: The time before the end of its lease that a holder stops trusting a lock (default 0)
+        :param takeover_margin: The time after the end of a lease that a waiter may take over a lock (default 0)
         '''
         acquire_timeout  = kwargs.get('acquire_timeout', timedelta(seconds=10))
         retry_period     = kwargs.get('retry_period', timedelta(seconds=10))
         lock_duration    = kwargs.get('lock_duration', timedelta(minutes=1))
-        self.delete_lock = kwargs.get('delete_lock', True)
+        self.versioning  = kwargs.get('versioning', 'uuid')
+        self.delete_lock = kwargs.get('delete_lock', self.versioning != 'counter')
+        self.backoff     = kwargs.get('backoff', None) or DynamoDBLockBackoff(base=retry_period)
+        self.wait_for_expiry = kwargs.get('wait_for_expiry', False)
+        self.throttle_retries = kwargs.get('throttle_retries', 3)
+        self.throttle_backoff = kwargs.get('throttle_backoff', None) or DynamoDBLockExponentialBackoff(
+            base=timedelta(milliseconds=50), cap=timedelta(seconds=2))
+        self.clock = self._get_clock(kwargs.get('clock', 'wall'))
+        self.lease_margin    = long(kwargs.get('lease_margin', timedelta(0)).total_seconds() * 1000)
+        self.takeover_margin = long(kwargs.get('takeover_margin', timedelta(0)).total_seconds() * 1000)
 
         self.acquire_timeout = long(acquire_timeout.total_seconds() * 1000)
-        self.retry_period    = long(retry_period.total_seconds())
+        self.retry_period    = long(retry_period.total_seconds() * 1000)
         self.lock_duration   = long(lock_duration.total_seconds() * 1000)
+        if self.lease_margin >= self.lock_duration:
+            raise ValueError("the lease margin must be shorter than the lock duration")
+        if self.delete_lock and self.versioning == 'counter':
+            raise ValueError("counter versions cannot be used with delete_lock")
+
+    @classmethod
+    def fast_failover(cls, **kwargs):
+        ''' Create a policy for fast failover: a monotonic clock, a
+        one second lease with explicit safety margins, and a short
+        retry period, so that the lock of a crashed holder is taken
+        over about `lock_duration + takeover_margin` after its last
+        renewal. Any of the parameters may be overridden.
+
+        :returns: A new policy tuned for fast failover
+        '''
+        kwargs.setdefault('clock', 'monotonic')
+        kwargs.setdefault('lock_duration', timedelta(seconds=1))
+        kwargs.setdefault('lease_margin', timedelta(milliseconds=200))
+        kwargs.setdefault('takeover_margin', timedelta(milliseconds=200))
+        kwargs.setdefault('retry_period', timedelta(milliseconds=100))
+        return cls(**kwargs)
 
     def is_name_valid(self, name):
         ''' Helper method to check if the supplied name is valid
@@ -80,21 +137,100 @@ class DynamoDBLockPolicy(object):
 
         :returns: A new version number
         '''
+        if self.versioning == 'counter':
+            return 1L
         return str(uuid.uuid4())
 
+    def get_next_version(self, lock):
+        ''' Helper method to retrieve the version number that
+        should replace the version of the supplied lock.
+
+        With `counter` versioning this is the current version plus
+        one. As every write is conditioned on the current version,
+        the versions of a lock form a monotonically increasing
+        fencing token that downstream stores can use to reject stale
+        writers with a single integer compare. A deleted lock would
+        start counting again, so counter locks are never deleted.
+
+        :param lock: The lock whose version is being replaced
+        :returns: A new version number
+        '''
+        if self.versioning == 'counter':
+            return long(lock.version) + 1
+        return self.get_new_version()
+
+    def get_retry_delay(self, tries, last_delay=None):
+        ''' Helper method to retrieve the amount of time to wait
+        before the next retry of an acquire attempt, as decided by
+        the installed backoff strategy.
+
+        :param tries: The number of tries made so far
+        :param last_delay: The previous delay in milliseconds (or None)
+        :returns: The time to wait in milliseconds
+        '''
+        return self.backoff.get_delay(tries, last_delay)
+
+    def get_throttle_delay(self, tries):
+        ''' Helper method to retrieve the amount of time to wait
+        before retrying a request that the table throttled.
+
+        :param tries: The number of throttled tries made so far
+        :returns: The time to wait in milliseconds
+        '''
+        return self.throttle_backoff.get_delay(tries)
+
     def get_new_timestamp(self):
-        ''' Helper method to retrieve the current time since
-        the epoch in milliseconds.
+        ''' Helper method to retrieve the current time of the
+        installed clock in milliseconds (since the epoch for the wall
+        clock, since an arbitrary point for a monotonic clock).
 
         :returns: The current time in milliseconds
         '''
-        return long(time.time() * 1000)
+        return long(self.clock() * 1000)
+
+    def get_lease_end(self, lock):
+        ''' Helper method to retrieve the time at which the holder
+        of the supplied lock must stop trusting it.
+
+        :param lock: The held lock to get the lease end of
+        :returns: The end of the trusted lease in milliseconds
+        '''
+        return long(lock.timestamp + lock.duration) - self.lease_margin
+
+    def get_expiry(self, lock):
+        ''' Helper method to retrieve the time after which a waiter
+        that watched the supplied lock not change may take it over.
+
+        :param lock: The watched lock to get the expiry of
+        :returns: The expiry of the lock in milliseconds
+        '''
+        return long(lock.timestamp + lock.duration) + self.takeover_margin
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _get_clock(clock):
+        ''' Retrieve the clock function for the supplied clock.
+
+        :param clock: 'wall', 'monotonic', or a callable returning seconds
+        :returns: The function returning the current time in seconds
+        :raises ImportError: If a monotonic clock is not available
+        '''
+        if callable(clock): return clock
+        if clock == 'wall': return time.time
+        if clock == 'monotonic':
+            if monotonic is None:
+                raise ImportError("the monotonic package is required for the monotonic clock")
+            return monotonic
+        raise ValueError("unknown clock: %s" % clock)
 
     # ------------------------------------------------------------
     # magic methods
     # ------------------------------------------------------------
 
     def __str__(self):
-        return json.dumps(self.__dict__)
+        return json.dumps(self.__dict__, default=str)
 
     __repr__ = __str__
@@ -1,5 +1,7 @@
 import json
 
+from .codec import DynamoDBLockCodec, DynamoDBLockPayload
+
 #--------------------------------------------------------------------------------
 # logging
 #--------------------------------------------------------------------------------
@@ -31,9 +33,11 @@ class DynamoDBLockSchema(object):
         :param owner: The database schema name for this field
         :param version: The database schema name for this field
         :param payload: The database schema name for this field
+        :param readers: The database schema name for this field
         :param table_name: The name of the database locks table
         :param read_capacity: The expected read capacity for the table
         :param write_capacity: The expected write capacity for the table
+        :param codec: The codec to store the payloads with (default as is)
         '''
         self.name           = kwargs.get('name',       'N')
         self.range_key      = kwargs.get('range_key',  'R')
@@ -42,9 +46,11 @@ class DynamoDBLockSchema(object):
         self.owner          = kwargs.get('owner',      'O')
         self.version        = kwargs.get('version',    'V')
         self.payload        = kwargs.get('payload',    'P')
+        self.readers        = kwargs.get('readers',    'S')
         self.table_name     = kwargs.get('table_name', 'Locks')
         self.read_capacity  = kwargs.get('read_capacity', 1)
         self.write_capacity = kwargs.get('write_capacity', 1)
+        self.codec          = kwargs.get('codec', None) or DynamoDBLockCodec()
 
     # ------------------------------------------------------------
     # schema operations
@@ -68,7 +74,8 @@ class DynamoDBLockSchema(object):
         if 'is_locked' in params: schema[self.is_locked] = params['is_locked']
         if 'owner'     in params: schema[self.owner]     = params['owner']
         if 'version'   in params: schema[self.version]   = params['version']
-        if 'payload'   in params: schema[self.payload]   = params['payload']
+        if 'payload'   in params: schema[self.payload]   = self.encode_payload(params['payload'])
+        if 'readers'   in params: schema[self.readers]   = json.dumps(params['readers'] or {}, sort_keys=True)
         return schema
 
     def to_dict(self, schema):
@@ -85,10 +92,25 @@ class DynamoDBLockSchema(object):
             'is_locked' : schema.get(self.is_locked, None),
             'owner'     : schema.get(self.owner,     None),
             'version'   : schema.get(self.version,   None),
-            'payload'   : schema.get(self.payload,   None),
+            'payload'   : self.codec.lazy(schema.get(self.payload, None)),
+            'readers'   : json.loads(schema.get(self.readers, None) or '{}') or None,
         }
 
+    def encode_payload(self, payload):
+        ''' Given a payload, convert it to the value that is
+        stored in the table. A payload that was read from the table
+        and never decoded is stored again as is.
+
+        :param payload: The payload to encode
+        :returns: The encoded payload
+        '''
+        if isinstance(payload, DynamoDBLockPayload):
+            return payload.raw
+        if payload is None:
+            return None
+        return self.codec.encode(payload)
+
     def __str__(self):
-        return json.dumps(self.__dict__)
+        return json.dumps(self.__dict__, default=str)
 
     __repr__ = __str__
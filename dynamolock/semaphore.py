@@ -0,0 +1,93 @@
+'''
+The semaphore bounds how many owners may hold a named resource at once,
+say at most eight concurrent jobs against a downstream service::
+
+    from dynamolock import DynamoDBLockClient, DynamoDBLockSemaphore
+
+    client    = DynamoDBLockClient()
+    client.startup()
+    semaphore = DynamoDBLockSemaphore(client=client, name='search', permits=8)
+    with semaphore:
+        pass # at most eight owners are in here at once
+
+The holders of the permits are kept in the `readers` field of a single
+lock entry owned by `__semaphore__` (see `DynamoDBLockShared`), so taking
+a permit costs one read and one conditional write on the version of the
+entry no matter how many permits there are. A held permit is renewed by
+the heartbeat worker like any other lock, and a holder whose permit has
+not been renewed for its whole lease (judged by our own clock) is
+dropped by the next client that takes a permit.
+'''
+from .shared import PERMIT_OWNER, WRITER_PREFIX
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockSemaphore(object):
+    ''' A distributed counting semaphore of a single lock client,
+    which may also be used in a `with` statement.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockSemaphore class
+
+        :param client: The client to acquire the permits with
+        :param name: The name of the semaphore
+        :param permits: The number of permits of the semaphore (default 1)
+        '''
+        self.client  = kwargs.get('client')
+        self.name    = kwargs.get('name')
+        self.permits = kwargs.get('permits', 1)
+        self.lock    = None
+
+    def acquire(self, no_wait=False, **params):
+        ''' Attempt to acquire one of the permits of the semaphore.
+
+        :param no_wait: Try to acquire a permit without waiting
+        :returns: The acquired permit on success, or None
+        '''
+        return self.client.acquire_permit(self.name, self.permits, no_wait, **params)
+
+    def release(self, lock, delete=None, **params):
+        ''' Release the supplied permit of the semaphore.
+
+        :param lock: The permit to release
+        :param delete: True to delete the entry when the last holder leaves
+        :returns: True if the permit was released, False otherwise
+        '''
+        return self.client.release_lock(lock, delete, **params)
+
+    def retrieve_holders(self):
+        ''' Retrieve the owners that currently hold (or held until
+        they died) a permit of the semaphore.
+
+        :returns: The list of the owners holding a permit
+        '''
+        current_lock = self.client._retrieve_entry(self.name)
+        if not (current_lock and current_lock.is_locked and current_lock.owner == PERMIT_OWNER):
+            return []
+        return [holder for holder in (current_lock.readers or {})
+            if not holder.startswith(WRITER_PREFIX)]
+
+    def __enter__(self):
+        ''' On enter of the context manager, this will acquire a
+        permit of the semaphore. When the permit has been acquired,
+        this will return.
+        '''
+        self.lock = self.acquire()
+        return self
+
+    def __exit__(self, ex_type, value, traceback):
+        ''' On exit of the context manager, this will release the
+        currently held permit.
+        '''
+        if self.lock: self.release(self.lock)
+        self.lock = None
@@ -0,0 +1,492 @@
+'''
+The sharded backend spreads the lock entries over a number of shards
+by a consistent hash of their names, so that the lock throughput is not
+bounded by a single table (or a few hot partitions of it). The shards
+may be separate tables, or salted key spaces within a single table,
+and the lock client is used exactly as before::
+
+    from dynamolock import DynamoDBLockClient
+    from dynamolock import DynamoDBLockShardedBackend
+
+    backend = DynamoDBLockShardedBackend(tables=['locks-0', 'locks-1', 'locks-2'])
+    backend = DynamoDBLockShardedBackend(key_spaces=16)
+    client  = DynamoDBLockClient(backend=backend)
+
+The number of shards can be grown by appending shards and supplying
+the previous number of shards. As the hash is consistent, only the
+names that now belong to a new shard move. While `previous` is set, an
+entry of a moved name that still lives in its old shard is used in
+place, and a moved name is only created in its new shard after a
+permanent forwarding marker has been written in its old shard. This
+keeps every name in exactly one place, even while some clients are
+still running with the old shards (they simply see a moved name as
+held by someone else)::
+
+    backend = DynamoDBLockShardedBackend(tables=['locks-0', ..., 'locks-5'], previous=3)
+
+The locks of `acquire_locks` are written in one transaction even when
+they fall in different shards, as long as the shards are key spaces of
+one backend or dynamodb tables on one connection. Other shards (say
+separate in-memory tables) cannot be written together, which
+`can_transact` reports up front.
+
+The forwarding marker is never removed, so once a name has been seen
+fenced off in its old shard it is remembered (up to `moved_size` names)
+and its old shard is no longer read at all.
+
+Once every client runs with the new shards and every lock that was held
+in its old shard has been released, `previous` can be dropped.
+'''
+import bisect
+import hashlib
+from copy import copy
+from threading import Lock
+from collections import OrderedDict
+
+from .backend import DynamoDBLockBackend, DynamoDBLockTableBackend
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+MOVED_OWNER    = '__moved__'
+MOVED_DURATION = 10 * 365 * 24 * 60 * 60 * 1000 # ten years in milliseconds
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockHashRing(object):
+    ''' A consistent hash ring of a number of shards, each with
+    a number of virtual nodes so that the names spread evenly.
+    '''
+
+    def __init__(self, count, replicas=64):
+        ''' Initialize a new instance of the DynamoDBLockHashRing class
+
+        :param count: The number of shards on the ring
+        :param replicas: The number of virtual nodes per shard (default 64)
+        '''
+        nodes = sorted((self.get_hash('shard-%d:%d' % (shard, replica)), shard)
+            for shard in range(count) for replica in range(replicas))
+        self.count  = count
+        self.hashes = [node[0] for node in nodes]
+        self.shards = [node[1] for node in nodes]
+
+    @staticmethod
+    def get_hash(key):
+        ''' Retrieve the position of the supplied key on the ring.
+
+        :param key: The key to hash
+        :returns: The position of the key
+        '''
+        if isinstance(key, unicode): key = key.encode('utf-8')
+        return long(hashlib.md5(key).hexdigest()[:16], 16)
+
+    def get_shard(self, name):
+        ''' Retrieve the shard that owns the supplied name.
+
+        :param name: The name to find the shard of
+        :returns: The index of the shard that owns the name
+        '''
+        index = bisect.bisect(self.hashes, self.get_hash(name))
+        return self.shards[index % len(self.shards)]
+
+
+class DynamoDBLockPrefixBackend(DynamoDBLockBackend):
+    ''' A backend that stores its entries in another backend with
+    a prefix on their names, so that many key spaces can share one
+    table.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockPrefixBackend class
+
+        :param backend: The backend to store the entries in
+        :param prefix: The prefix to add to the names of the entries
+        '''
+        self.backend = kwargs.get('backend')
+        self.prefix  = kwargs.get('prefix', '')
+        super(DynamoDBLockPrefixBackend, self).__init__(schema=self.backend.schema)
+
+    def create_entry(self, record):
+        ''' Create a new lock entry under our prefix as long as
+        there is not already an entry with the same name.
+
+        :param record: The fields of the entry to create
+        :returns: True if successful, False otherwise
+        '''
+        return self.backend.create_entry(dict(record, name=self.prefix + record['name']))
+
+    def retrieve_entry(self, name, consistent=True):
+        ''' Retrieve the current lock entry with the supplied name
+        from under our prefix.
+
+        :param name: The name of the entry to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        return self._strip(self.backend.retrieve_entry(self.prefix + name, consistent))
+
+    def retrieve_entries(self, names, consistent=True):
+        ''' Retrieve the current lock entries with the supplied
+        names from under our prefix.
+
+        :param names: The names of the entries to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: A dict of the fields of the entries that exist by name
+        '''
+        entries = self.backend.retrieve_entries([self.prefix + name for name in names], consistent)
+        entries = [self._strip(entry) for entry in entries.values()]
+        return { entry['name'] : entry for entry in entries }
+
+    def update_entry(self, name, update, expect):
+        ''' Update the fields of the lock entry with the supplied
+        name under our prefix, as long as all the expected fields are
+        unchanged.
+
+        :param name: The name of the entry to update
+        :param update: The fields of the entry to update
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        expect = dict(expect, name=self.prefix + name) if 'name' in expect else expect
+        return self.backend.update_entry(self.prefix + name, update, expect)
+
+    def delete_entry(self, name, expect):
+        ''' Delete the lock entry with the supplied name under our
+        prefix, as long as all the expected fields are unchanged.
+
+        :param name: The name of the entry to delete
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        expect = dict(expect, name=self.prefix + name) if 'name' in expect else expect
+        return self.backend.delete_entry(self.prefix + name, expect)
+
+    def transact_entries(self, writes):
+        ''' Apply all of the supplied writes under our prefix
+        atomically, see `DynamoDBLockBackend.transact_entries`.
+
+        :param writes: The (name, update, expect) writes to apply
+        :returns: True if every write was applied, False otherwise
+        '''
+        return self.backend.transact_entries([self._prefix(*write) for write in writes])
+
+    def _prefix(self, name, update, expect):
+        ''' Add our prefix to the name of the supplied write.
+
+        :param name: The name of the entry to write
+        :param update: The fields of the entry to write
+        :param expect: The fields we expect to not have changed (None to create)
+        :returns: The (name, update, expect) write with our prefix
+        '''
+        if expect is not None and 'name' in expect:
+            expect = dict(expect, name=self.prefix + name)
+        return self.prefix + name, update, expect
+
+    def _strip(self, entry):
+        ''' Remove our prefix from the name of the supplied entry.
+
+        :param entry: The entry to strip (or None)
+        :returns: The stripped entry (or None)
+        '''
+        if entry:
+            entry = dict(entry, name=entry['name'][len(self.prefix):])
+        return entry
+
+
+class DynamoDBLockShardedBackend(DynamoDBLockBackend):
+    ''' The backend that maps each lock name to one of a number
+    of shard backends by a consistent hash of the name.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockShardedBackend class
+
+        Exactly one of `shards`, `tables`, or `key_spaces` should be
+        supplied to choose the shards.
+
+        :param schema: The schema of the database table to work with
+        :param shards: The list of backends to shard over
+        :param tables: The list of table names to shard over
+        :param key_spaces: The number of key spaces of one table to shard over
+        :param backend: The backend of the key spaces (default the dynamodb table)
+        :param region: The region of the default dynamodb table backends
+        :param verify: How to verify the default dynamodb tables (see the backend)
+        :param previous: The number of shards before they were grown (default None)
+        :param moved_size: The maximum number of moved names to remember (default 65536)
+        '''
+        super(DynamoDBLockShardedBackend, self).__init__(**kwargs)
+        self.shards   = kwargs.get('shards', None) or self._create_shards(**kwargs)
+        self.ring     = DynamoDBLockHashRing(len(self.shards))
+        self.previous = kwargs.get('previous', None)
+        self.previous_ring = DynamoDBLockHashRing(self.previous) if self.previous else None
+        self.moved_size = kwargs.get('moved_size', 65536)
+        self._moved   = OrderedDict() # names fenced off in their previous shard
+        self._mutex   = Lock()
+
+    def get_shard(self, name):
+        ''' Retrieve the shard backend that owns the supplied name.
+
+        :param name: The name to find the shard of
+        :returns: The backend that owns the name
+        '''
+        return self.shards[self.ring.get_shard(name)]
+
+    def get_previous_shard(self, name):
+        ''' Retrieve the shard backend that owned the supplied name
+        before the shards were grown, if the name has since moved.
+
+        :param name: The name to find the previous shard of
+        :returns: The backend that owned the name, or None if it did not move
+        '''
+        if not self.previous_ring: return None
+        shard = self.previous_ring.get_shard(name)
+        return self.shards[shard] if shard != self.ring.get_shard(name) else None
+
+    def create_entry(self, record):
+        ''' Create a new lock entry as long as there is not already
+        an entry with the same name. A moved name is first fenced off
+        in its previous shard.
+
+        :param record: The fields of the entry to create
+        :returns: True if successful, False otherwise
+        '''
+        name = record['name']
+        previous = self.get_previous_shard(name)
+        if previous and not self._create_marker(previous, name):
+            return False
+        return self.get_shard(name).create_entry(record)
+
+    def retrieve_entry(self, name, consistent=True):
+        ''' Retrieve the current lock entry with the supplied name
+        from wherever it currently lives.
+
+        :param name: The name of the entry to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        return self._locate(name, consistent)[1]
+
+    def retrieve_entries(self, names, consistent=True):
+        ''' Retrieve the current lock entries with the supplied
+        names using one batch per shard. The moved names are read one
+        at a time as they may live in either shard, unless they are
+        known to be fenced off in their previous shard.
+
+        :param names: The names of the entries to retrieve
+        :param consistent: True to require a strongly consistent read
+        :returns: A dict of the fields of the entries that exist by name
+        '''
+        batches, entries = {}, {}
+        for name in names:
+            if self.get_previous_shard(name) and not self._is_moved(name):
+                entry = self.retrieve_entry(name, consistent)
+                if entry: entries[name] = entry
+            else: batches.setdefault(self.ring.get_shard(name), []).append(name)
+
+        for shard, batch in batches.items():
+            entries.update(self.shards[shard].retrieve_entries(batch, consistent))
+        return entries
+
+    def update_entry(self, name, update, expect):
+        ''' Update the fields of the lock entry with the supplied
+        name wherever it lives, as long as all the expected fields
+        are unchanged.
+
+        :param name: The name of the entry to update
+        :param update: The fields of the entry to update
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        return self._locate(name, fetch=False)[0].update_entry(name, update, expect)
+
+    def delete_entry(self, name, expect):
+        ''' Delete the lock entry with the supplied name wherever it
+        lives, as long as all the expected fields are unchanged.
+
+        :param name: The name of the entry to delete
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        return self._locate(name, fetch=False)[0].delete_entry(name, expect)
+
+    def transact_entries(self, writes):
+        ''' Apply all of the supplied writes atomically, in one
+        transaction of the backend of their shards (see
+        `can_transact`). A moved name is created in its new shard after
+        it has been fenced off in its previous shard, and is updated
+        wherever it lives.
+
+        :param writes: The (name, update, expect) writes to apply
+        :returns: True if every write was applied, False otherwise
+        :raises ValueError: If the writes span shards that cannot be written together
+        '''
+        targets = []
+        for name, update, expect in writes:
+            previous = self.get_previous_shard(name)
+            if not previous:
+                shard = self.get_shard(name)
+            elif expect is not None:
+                shard = self._locate(name, fetch=False)[0]
+            elif self._create_marker(previous, name):
+                shard = self.get_shard(name)
+            else: return False
+            targets.append(self._get_target(shard, (name, update, expect)))
+
+        backends = set(target[0] for target in targets)
+        if len(backends) == 1:
+            return backends.pop().transact_entries([target[1] for target in targets])
+        if not self._can_join(backends):
+            raise ValueError("the writes span shards that cannot be written in one transaction")
+        return targets[0][0].transact_tables(targets)
+
+    def can_transact(self, names):
+        ''' Check if the entries with the supplied names can be
+        written together, wherever they may live: every shard that
+        they may live in must be a key space of the same backend, or
+        a dynamodb table on the same connection.
+
+        :param names: The names of the entries to write together
+        :returns: True if they can be written in one transaction, False otherwise
+        '''
+        shards = set(self.get_shard(name) for name in names)
+        shards.update(filter(None, [self.get_previous_shard(name) for name in names]))
+        return self._can_join(set(self._get_target(shard, None)[0] for shard in shards))
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _create_shards(self, **kwargs):
+        ''' Create the shard backends from the supplied tables or
+        key spaces.
+
+        :returns: The list of shard backends
+        '''
+        region, verify = kwargs.get('region', None), kwargs.get('verify', True)
+        if kwargs.get('tables'):
+            shards = []
+            for table_name in kwargs['tables']:
+                schema = copy(self.schema)
+                schema.table_name = table_name
+                shards.append(DynamoDBLockTableBackend(schema=schema, region=region, verify=verify))
+            return shards
+
+        if kwargs.get('key_spaces'):
+            backend = kwargs.get('backend', None) or DynamoDBLockTableBackend(
+                schema=self.schema, region=region, verify=verify)
+            return [DynamoDBLockPrefixBackend(backend=backend, prefix='%d#' % index)
+                for index in range(kwargs['key_spaces'])]
+
+        raise ValueError("one of shards, tables, or key_spaces is required")
+
+    @staticmethod
+    def _get_target(shard, write):
+        ''' Retrieve the backend that actually stores the entries of
+        the supplied shard, along with the supplied write as that
+        backend sees it.
+
+        :param shard: The shard backend to write to
+        :param write: The (name, update, expect) write to the shard
+        :returns: The (backend, write) of the underlying backend
+        '''
+        if isinstance(shard, DynamoDBLockPrefixBackend):
+            return shard.backend, (shard._prefix(*write) if write else None)
+        return shard, write
+
+    @staticmethod
+    def _can_join(backends):
+        ''' Check if the supplied underlying backends can all be
+        written in one transaction.
+
+        :param backends: The set of underlying backends
+        :returns: True if they can be written together, False otherwise
+        '''
+        if len(backends) <= 1: return True
+        first = next(iter(backends))
+        return (isinstance(first, DynamoDBLockTableBackend)
+            and all(first.can_transact_with(backend) for backend in backends))
+
+    def _locate(self, name, consistent=True, fetch=True):
+        ''' Find the shard that the named entry currently lives in.
+        A moved name lives in its previous shard for as long as there
+        is a real entry there, otherwise in its new shard. The previous
+        shard of a name that we have seen fenced off is not read again.
+
+        :param name: The name of the entry to find
+        :param consistent: True to require a strongly consistent read
+        :param fetch: False to skip reading the entry from its new shard
+        :returns: The (shard, entry) of the name, the entry may be None
+        '''
+        shard, previous = self.get_shard(name), self.get_previous_shard(name)
+        if previous and not self._is_moved(name):
+            entry = previous.retrieve_entry(name, consistent)
+            if entry and entry['owner'] != MOVED_OWNER:
+                return previous, entry
+            if entry: self._add_moved(name)
+        return shard, (shard.retrieve_entry(name, consistent) if fetch else None)
+
+    def _is_moved(self, name):
+        ''' Check if the supplied name is known to be fenced off
+        in its previous shard.
+
+        :param name: The name to check
+        :returns: True if the name is known to have moved, False otherwise
+        '''
+        with self._mutex:
+            if name not in self._moved:
+                return False
+            self._moved[name] = self._moved.pop(name) # most recently used
+            return True
+
+    def _add_moved(self, name):
+        ''' Remember that the supplied name is fenced off in its
+        previous shard, which it is for good.
+
+        :param name: The name that has moved
+        '''
+        with self._mutex:
+            self._moved.pop(name, None)
+            self._moved[name] = True
+            while len(self._moved) > self.moved_size:
+                self._moved.popitem(last=False)
+
+    def _create_marker(self, shard, name):
+        ''' Make sure that the supplied moved name is marked as
+        moved in its previous shard. The marker looks like a lock held
+        forever so that clients still running with the old shards
+        never acquire the name there.
+
+        :param shard: The previous shard of the name
+        :param name: The name of the moved entry
+        :returns: True if the name is marked as moved, False otherwise
+        '''
+        if self._is_moved(name):
+            return True
+
+        marker = {
+            'name':      name,
+            'owner':     MOVED_OWNER,
+            'version':   0,
+            'duration':  MOVED_DURATION,
+            'is_locked': True,
+        }
+        if shard.create_entry(marker):
+            _logger.debug("marked lock %s as moved from its previous shard", name)
+            self._add_moved(name)
+            return True
+
+        entry = shard.retrieve_entry(name)
+        if not entry or entry['owner'] != MOVED_OWNER:
+            return False
+        self._add_moved(name)
+        return True
@@ -0,0 +1,439 @@
+'''
+The shared leases let any number of readers hold a lock at once, while a
+writer still holds it alone::
+
+    client = DynamoDBLockClient()
+    lock   = client.acquire_shared('snapshot')     # many readers at once
+    ...
+    client.release_lock(lock)
+    lock   = client.acquire_exclusive('snapshot')  # waits for the readers
+    ...
+    client.release_lock(lock)
+
+A shared lock entry is owned by `__shared__` and stores its bounded set
+of readers in the `readers` field, each with its own version and lease.
+As with the lock itself, the lease of a reader is judged by our own
+clock: a reader whose version has not changed for its whole lease is
+dead and is dropped by the next client to rewrite the entry. Every
+reader renewal bumps the version of the entry, so a writer watching the
+entry only sees it expire once every reader has stopped renewing.
+
+A counting semaphore (see `DynamoDBLockSemaphore`) is the same entry
+owned by `__semaphore__`, whose holders are capped by the number of
+permits instead of `max_readers` and which writers do not wait on.
+
+A writer that uses `acquire_exclusive` adds a writer intent to the entry
+while it waits (prefixed with `*`), and no new reader joins the entry
+while a live intent is present, so a steady stream of readers cannot
+starve the writer. A plain `acquire_lock` is also exclusive, but it does
+not post an intent.
+'''
+import uuid
+from time import sleep
+from threading import Lock
+from datetime import timedelta
+
+from .lock    import DynamoDBLock
+from .backoff import DynamoDBLockExponentialBackoff
+from .limiter import DynamoDBLockThrottledError
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+SHARED_OWNER  = '__shared__'
+PERMIT_OWNER  = '__semaphore__'
+WRITER_PREFIX = '*'
+WRITE_RETRIES = 5   # the times to retry a lost read-modify-write of the readers
+WRITE_BACKOFF = DynamoDBLockExponentialBackoff( # the jittered wait between those retries
+    base=timedelta(milliseconds=5), cap=timedelta(milliseconds=100))
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockShared(object):
+    ''' The shared (read) and exclusive (write) lease protocol of
+    a single lock client.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockShared class
+
+        :param client: The lock client to run the protocol for
+        :param max_readers: The most readers that may share a lock (default 64)
+        '''
+        self.client      = kwargs.get('client')
+        self.max_readers = kwargs.get('max_readers', 64)
+        self.seen        = {} # name -> { reader -> (version, first seen timestamp) }
+        self.intents     = {} # name -> timestamp we last posted our writer intent
+        self._mutex      = Lock() # guards seen and intents across renewals, releases and acquires
+
+    def acquire_shared(self, attempt, **params):
+        ''' Drive the supplied acquire attempt for a shared lease
+        until it either joins the readers of the lock or gives up.
+
+        :param attempt: The acquire attempt to drive
+        :returns: The acquired shared lock on success, or None
+        '''
+        return self._drive(attempt, self._try_shared, **params)
+
+    def acquire_permit(self, attempt, permits, **params):
+        ''' Drive the supplied acquire attempt for one of the
+        permits of a counting semaphore until it either joins the
+        holders of the semaphore or gives up.
+
+        :param attempt: The acquire attempt to drive
+        :param permits: The number of permits of the semaphore
+        :returns: The acquired permit on success, or None
+        '''
+        return self._drive(attempt, self._try_shared, shared_owner=PERMIT_OWNER, limit=permits, **params)
+
+    def acquire_exclusive(self, attempt, prefer=True, **params):
+        ''' Drive the supplied acquire attempt for an exclusive lease
+        until it either acquires the lock or gives up. If the lock is
+        shared and `prefer` is set, a writer intent is posted so that
+        no new readers join while we wait.
+
+        :param attempt: The acquire attempt to drive
+        :param prefer: True to keep new readers out while we wait
+        :returns: The acquired lock on success, or None
+        '''
+        created_lock = None
+        try:
+            created_lock = self._drive(attempt, self._try_exclusive, prefer=prefer, **params)
+        finally:
+            with self._mutex:
+                has_intent = self.intents.pop(attempt.name, None)
+            if has_intent and not created_lock:
+                try:
+                    self._update_readers(attempt.name, lambda readers: readers.pop(self._get_intent(), None))
+                except DynamoDBLockThrottledError: # the intent simply expires after a lease
+                    _logger.debug("failed to withdraw writer intent on lock %s", attempt.name)
+        return created_lock
+
+    def touch(self, lock):
+        ''' Renew our lease as a reader of the supplied shared lock,
+        dropping any reader we have seen die along the way.
+
+        :param lock: The shared lock to renew
+        :returns: The renewed lock on success, None if we lost it
+        :raises DynamoDBLockThrottledError: If other readers kept changing the lock
+        '''
+        owner, version = self.client.owner, uuid.uuid4().hex
+        def renew(readers):
+            if readers.get(owner, [None])[0] != lock.readers[owner][0]:
+                return False
+            readers[owner] = [version, lock.duration]
+
+        current_lock = self._update_readers(lock.name, renew)
+        if not current_lock: return None
+        return self._get_view(current_lock, lock.duration, lock.payload)
+
+    def release(self, lock, delete=None, **params):
+        ''' Leave the readers of the supplied shared lock. The last
+        reader to leave releases (or deletes) the entry, unless a
+        writer is waiting, in which case it is left unlocked with the
+        intent of the writer.
+
+        :param lock: The shared lock to release
+        :param delete: True to delete the entry when the last reader leaves
+        :returns: True if the lock was released, False otherwise
+        '''
+        owner, client = self.client.owner, self.client
+        for tries in range(1, WRITE_RETRIES + 1):
+            if tries > 1: self._wait_to_retry(tries - 1)
+            current_lock = client._retrieve_entry(lock.name)
+            if not self._is_reader(current_lock, owner, lock.readers[owner][0]):
+                return False
+
+            readers = self._prune(current_lock)
+            readers.pop(owner, None)
+            if any(not reader.startswith(WRITER_PREFIX) for reader in readers):
+                update = dict(params, readers=readers)
+                is_released = bool(self._update_entry(current_lock, update))
+            elif delete and not readers:
+                is_released = client._delete_entry(current_lock)
+            else:
+                update = dict(params, readers=readers, is_locked=False)
+                is_released = bool(self._update_entry(current_lock, update))
+            if is_released:
+                with self._mutex:
+                    self.seen.pop(lock.name, None)
+                return True
+        return False
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _drive(self, attempt, method, **params):
+        ''' Drive the supplied acquire attempt by making a try with
+        the supplied method until it succeeds or gives up.
+
+        :param attempt: The acquire attempt to drive
+        :param method: The method that makes a single try
+        :returns: The acquired lock on success, or None
+        '''
+        client = self.client
+        while client._is_acquiring(attempt):
+            tries = attempt.tries
+            try:
+                created_lock = method(attempt, **params)
+                if created_lock:
+                    return created_lock
+            except DynamoDBLockThrottledError:
+                _logger.debug("throttled trying to acquire lock: %s", attempt.name)
+                attempt.tries = max(attempt.tries, tries + 1) # count it as a try
+
+            if client._is_acquiring(attempt):
+                delay = client._get_acquire_delay(attempt)
+                _logger.debug("waiting %d ms to acquire lock %s", delay, attempt.name)
+                attempt.waited_time += client._wait_for_retry(delay)
+        return None
+
+    def _try_shared(self, attempt, shared_owner=SHARED_OWNER, limit=None, **params):
+        ''' Make a single try at joining the readers of the lock
+        for the supplied attempt, which costs one read and at most
+        one write.
+
+        :param attempt: The acquire attempt to make a try for
+        :param shared_owner: The owner of the shared entry (readers or permits)
+        :param limit: The most readers of the entry (default max_readers)
+        :returns: The acquired shared lock on success, or None
+        '''
+        limit         = limit if limit is not None else self.max_readers
+        is_permit     = shared_owner == PERMIT_OWNER
+        client, name  = self.client, attempt.name
+        current_lock  = client._retrieve_entry(name)
+        duration      = params.get('duration', client.policy.lock_duration)
+        version       = uuid.uuid4().hex
+        created_lock  = None
+        attempt.tries += 1
+
+        update = dict(params, owner=shared_owner, is_locked=True, duration=duration)
+        update['readers'] = { client.owner: [version, duration] }
+
+        # ------------------------------------------------------------
+        # Case 1:
+        # ------------------------------------------------------------
+        # There is no existing lock, so we create it as a shared lock
+        # with ourself as the only reader.
+        # ------------------------------------------------------------
+        if not current_lock:
+            update.update(name=name, version=client.policy.get_new_version())
+            if client._call_backend('put', client.backend.create_entry, update):
+                update.update(timestamp=client.policy.get_new_timestamp(), payload=update.get('payload'))
+                created_lock = current_lock = DynamoDBLock(**update)
+
+        # ------------------------------------------------------------
+        # Case 2:
+        # ------------------------------------------------------------
+        # There is an unlocked entry, which we can take over as a new
+        # shared lock unless a writer is waiting for it.
+        # ------------------------------------------------------------
+        elif not current_lock.is_locked:
+            if is_permit or not self._has_intent(self._prune(current_lock)):
+                created_lock = current_lock = self._update_entry(current_lock, update, ['is_locked', 'version', 'name'])
+
+        # ------------------------------------------------------------
+        # Case 3:
+        # ------------------------------------------------------------
+        # There is a shared lock, which we can join unless a writer is
+        # waiting for it or it already has as many readers as allowed.
+        # If it is full, we watch it so that we wait at least a lease
+        # for its dead readers to be dropped.
+        # ------------------------------------------------------------
+        elif current_lock.owner == shared_owner:
+            readers = self._prune(current_lock)
+            count   = sum(1 for reader in readers if not reader.startswith(WRITER_PREFIX))
+            if (is_permit or not self._has_intent(readers)) and count < limit:
+                readers[client.owner] = [version, duration]
+                update = dict(params, readers=readers, duration=max(duration, long(current_lock.duration)))
+                created_lock = current_lock = self._update_entry(current_lock, update)
+            elif not attempt.watching_lock:
+                attempt.lock_timeout += current_lock.duration + client.policy.takeover_margin
+                attempt.watching_lock = current_lock
+
+        # ------------------------------------------------------------
+        # Case 4:
+        # ------------------------------------------------------------
+        # There is an exclusive lock (or a shared lock of the other
+        # kind), so we watch it and take it over as our kind of shared
+        # lock only once its lease has run out.
+        # ------------------------------------------------------------
+        elif (attempt.watching_lock
+         and (client.is_lock_expired(attempt.watching_lock))
+         and (attempt.watching_lock.version == current_lock.version)):
+            created_lock = current_lock = self._update_entry(current_lock, update, ['version', 'name'])
+
+        elif (not attempt.watching_lock) or (attempt.watching_lock.version != current_lock.version):
+            if not attempt.watching_lock: attempt.lock_timeout += current_lock.duration + client.policy.takeover_margin
+            attempt.watching_lock = current_lock
+
+        if created_lock:
+            created_lock = self._get_view(current_lock, duration, params.get('payload'))
+            client._hold_lock(created_lock)
+        return created_lock
+
+    def _try_exclusive(self, attempt, prefer=True, **params):
+        ''' Make a single try at acquiring the lock for the supplied
+        attempt with the normal protocol, posting our writer intent
+        if the lock is held by readers.
+
+        :param attempt: The acquire attempt to make a try for
+        :param prefer: True to keep new readers out while we wait
+        :returns: The acquired lock on success, or None
+        '''
+        client, name = self.client, attempt.name
+        current_lock = client._retrieve_entry(name)
+        created_lock = client._acquire_entry(attempt, current_lock, **params)
+        if created_lock or not (prefer and current_lock and current_lock.readers):
+            return created_lock
+
+        # ------------------------------------------------------------
+        # Intent:
+        # ------------------------------------------------------------
+        # The lock is held by readers, so we post (or renew every half
+        # lease) our intent to keep any new readers out. Our own write
+        # must not look like a renewal of the lock that we are watching
+        # for expiry, so we keep watching from when we first saw it.
+        # ------------------------------------------------------------
+        intent   = self._get_intent()
+        now      = client.policy.get_new_timestamp()
+        duration = client.policy.lock_duration
+        with self._mutex:
+            posted = self.intents.get(name, 0)
+        if intent in current_lock.readers and now - posted < duration // 2:
+            return None
+
+        readers = self._prune(current_lock)
+        readers[intent] = [uuid.uuid4().hex, duration]
+        updated_lock = self._update_entry(current_lock, { 'readers': readers })
+        if updated_lock:
+            _logger.debug("posted writer intent on lock %s", name)
+            with self._mutex:
+                self.intents[name] = now
+            watching = attempt.watching_lock
+            if watching and watching.version == current_lock.version:
+                attempt.watching_lock = updated_lock._replace(timestamp=watching.timestamp)
+        return None
+
+    def _update_readers(self, name, method):
+        ''' Apply the supplied change to the readers of the named
+        shared lock, retrying after a jittered wait if another reader
+        changes it first. Losing every race says nothing about our own
+        lease, so it is reported like a throttled request, which the
+        worker keeps the lease for and retries before it runs out.
+
+        :param name: The name of the shared lock to change
+        :param method: Changes the readers in place, returns False to abort
+        :returns: The updated lock entry, or None if it was not changed
+        :raises DynamoDBLockThrottledError: If other readers won every race
+        '''
+        for tries in range(1, WRITE_RETRIES + 1):
+            if tries > 1: self._wait_to_retry(tries - 1)
+            current_lock = self.client._retrieve_entry(name)
+            if not current_lock or not current_lock.readers:
+                return None
+
+            readers = self._prune(current_lock)
+            if method(readers) is False:
+                return None
+            updated_lock = self._update_entry(current_lock, { 'readers': readers })
+            if updated_lock: return updated_lock
+        raise DynamoDBLockThrottledError("lost every race to update the readers of lock: %s" % name)
+
+    def _wait_to_retry(self, tries):
+        ''' Wait a jittered while before retrying a read-modify-write
+        of the readers that another reader won.
+
+        :param tries: The number of lost races so far
+        '''
+        sleep(WRITE_BACKOFF.get_delay(tries) / 1000.0)
+
+    def _update_entry(self, current_lock, update, expect=None):
+        ''' Update the supplied shared lock entry, which is only
+        conditioned on its version as every reader may change it.
+
+        :param current_lock: The current lock entry
+        :param update: The fields to update
+        :param expect: The fields we expect to not have changed
+        :returns: The updated lock entry on success, None otherwise
+        '''
+        return self.client._update_entry(current_lock, expect=expect or ['version', 'name'], update=update)
+
+    def _prune(self, current_lock):
+        ''' Retrieve a copy of the readers of the supplied lock
+        without those that we have seen stop renewing for their whole
+        lease, and record what we have seen of the rest.
+
+        :param current_lock: The current lock entry
+        :returns: The readers of the lock that may still be alive
+        '''
+        policy  = self.client.policy
+        now     = policy.get_new_timestamp()
+        readers = {}
+        with self._mutex:
+            seen = self.seen.setdefault(current_lock.name, {})
+            for reader, (version, duration) in (current_lock.readers or {}).items():
+                first = seen.get(reader)
+                if not first or first[0] != version:
+                    seen[reader] = first = (version, now)
+                if now - first[1] <= duration + policy.takeover_margin:
+                    readers[reader] = [version, duration]
+                else: _logger.debug("dropping dead reader %s of lock %s", reader, current_lock.name)
+
+            for reader in set(seen) - set(readers):
+                del seen[reader]
+        return readers
+
+    def _get_view(self, current_lock, duration, payload=None):
+        ''' Retrieve our own view of the supplied shared lock entry,
+        which is owned by us (so that it is renewed and released like
+        any other lock) and carries our reader version.
+
+        :param current_lock: The current shared lock entry
+        :param duration: The duration of our lease
+        :param payload: The payload that we supplied
+        :returns: Our view of the shared lock
+        '''
+        return current_lock._replace(owner=self.client.owner, duration=duration,
+            payload=payload if payload is not None else current_lock.payload)
+
+    def _get_intent(self):
+        ''' Retrieve the key of our writer intent in the readers.
+
+        :returns: The key of our writer intent
+        '''
+        return WRITER_PREFIX + self.client.owner
+
+    @staticmethod
+    def _has_intent(readers):
+        ''' Check if there is a live writer intent in the supplied
+        readers.
+
+        :param readers: The live readers of a lock
+        :returns: True if a writer is waiting, False otherwise
+        '''
+        return any(reader.startswith(WRITER_PREFIX) for reader in readers)
+
+    @staticmethod
+    def _is_reader(current_lock, owner, version):
+        ''' Check if the supplied owner is still a reader of the
+        supplied lock entry with the supplied reader version.
+
+        :param current_lock: The current lock entry (or None)
+        :param owner: The owner to check for
+        :param version: The reader version we expect
+        :returns: True if we are still a reader, False otherwise
+        '''
+        return bool(current_lock and current_lock.is_locked and current_lock.readers
+            and current_lock.readers.get(owner, [None])[0] == version)
@@ -0,0 +1,292 @@
+'''
+A lock backend that stores the lock entries in a local SQLite
+database. This allows processes on a single host to use the same lock
+API without making a network round trip for every operation::
+
+    from dynamolock import DynamoDBLockClient
+    from dynamolock import DynamoDBLockSQLiteBackend
+
+    backend = DynamoDBLockSQLiteBackend(path='/var/run/locks.db')
+    client  = DynamoDBLockClient(backend=backend)
+
+The database is opened in WAL mode so that readers never block the
+writer, and every write is a single compare-and-swap statement whose
+`WHERE` clause carries the expected values of the entry (or a number of
+them in one immediate transaction for `transact_entries`).
+'''
+import json
+import sqlite3
+from threading import local
+
+from boto.dynamodb.types import Binary
+
+from .backend import DynamoDBLockBackend
+from .limiter import DynamoDBLockThrottledError
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockSQLiteBackend(DynamoDBLockBackend):
+    ''' The backend that stores the lock entries in a SQLite
+    database. Each thread uses its own connection to the database
+    so that a single backend can be shared between threads.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockSQLiteBackend class
+
+        :param schema: The schema of the database table to work with
+        :param path: The path to the SQLite database file
+        :param timeout: The seconds to wait on a busy database (default 5)
+        '''
+        super(DynamoDBLockSQLiteBackend, self).__init__(**kwargs)
+        self.path    = kwargs.get('path')
+        self.timeout = kwargs.get('timeout', 5.0)
+        self.fields  = ['name', 'owner', 'version', 'duration', 'is_locked', 'payload', 'readers']
+        self.batch_size = 500 # below the default SQLite bound parameter limit
+        self._local  = local()
+        self._create_table()
+
+    def create_entry(self, record):
+        ''' Create a new lock entry as long as there is not already
+        an entry with the same name.
+
+        :param record: The fields of the entry to create
+        :returns: True if successful, False otherwise
+        '''
+        record  = self._encode(record)
+        columns = ', '.join(self._quote(key) for key in record)
+        values  = ', '.join('?' for key in record)
+        query   = 'INSERT INTO %s (%s) VALUES (%s)' % (self._table(), columns, values)
+
+        try:
+            self._execute(query, list(record.values()))
+            return True
+        except sqlite3.IntegrityError:
+            _logger.debug("failed to create lock entry for: %s", record[self.schema.name])
+        return False
+
+    def retrieve_entry(self, name, consistent=True):
+        ''' Retrieve the current lock entry with the supplied name.
+        Every read of the local database is consistent.
+
+        :param name: The name of the entry to retrieve
+        :param consistent: Ignored, all reads are consistent
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        columns = [getattr(self.schema, field) for field in self.fields]
+        query   = 'SELECT %s FROM %s WHERE %s = ?' % (
+            ', '.join(self._quote(column) for column in columns),
+            self._table(), self._quote(self.schema.name))
+
+        record = self._execute(query, [name]).fetchone()
+        if record is None:
+            return None
+
+        record = dict(zip(columns, record))
+        record[self.schema.payload] = self._decode_payload(record[self.schema.payload])
+        return self.schema.to_dict(record)
+
+    def retrieve_entries(self, names, consistent=True):
+        ''' Retrieve the current lock entries with the supplied
+        names using as few queries as possible.
+
+        :param names: The names of the entries to retrieve
+        :param consistent: Ignored, all reads are consistent
+        :returns: A dict of the fields of the entries that exist by name
+        '''
+        names   = list(names)
+        columns = [getattr(self.schema, field) for field in self.fields]
+        entries = {}
+
+        for index in range(0, len(names), self.batch_size):
+            batch = names[index:index + self.batch_size]
+            query = 'SELECT %s FROM %s WHERE %s IN (%s)' % (
+                ', '.join(self._quote(column) for column in columns),
+                self._table(), self._quote(self.schema.name), ', '.join('?' for name in batch))
+
+            for record in self._execute(query, batch).fetchall():
+                record = dict(zip(columns, record))
+                record[self.schema.payload] = self._decode_payload(record[self.schema.payload])
+                record = self.schema.to_dict(record)
+                entries[record['name']] = record
+        return entries
+
+    def update_entry(self, name, update, expect):
+        ''' Update the fields of the lock entry with the supplied
+        name as long as all the expected fields are unchanged.
+
+        :param name: The name of the entry to update
+        :param update: The fields of the entry to update
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        update = self._encode(update)
+        where, params = self._get_where(name, expect)
+        query  = 'UPDATE %s SET %s WHERE %s' % (self._table(),
+            ', '.join('%s = ?' % self._quote(key) for key in update), where)
+
+        cursor = self._execute(query, list(update.values()) + params)
+        if cursor.rowcount != 1:
+            _logger.debug("failed to update lock entry for: %s", name)
+        return cursor.rowcount == 1
+
+    def delete_entry(self, name, expect):
+        ''' Delete the lock entry with the supplied name as long
+        as all the expected fields are unchanged.
+
+        :param name: The name of the entry to delete
+        :param expect: The fields we expect to not have changed
+        :returns: True if successful, False otherwise
+        '''
+        where, params = self._get_where(name, expect)
+        query  = 'DELETE FROM %s WHERE %s' % (self._table(), where)
+
+        cursor = self._execute(query, params)
+        if cursor.rowcount != 1:
+            _logger.debug("failed to delete lock entry for: %s", name)
+        return cursor.rowcount == 1
+
+    def transact_entries(self, writes):
+        ''' Apply all of the supplied writes atomically in a single
+        immediate transaction, which is only committed once every write
+        has been applied, and is rolled back if any of them fails its
+        expectations or raises.
+
+        :param writes: The (name, update, expect) writes to apply
+        :returns: True if every write was applied, False otherwise
+        '''
+        self._execute('BEGIN IMMEDIATE')
+        is_written = False
+        try:
+            for name, update, expect in writes:
+                if expect is None:
+                    is_written = self.create_entry(dict(update, name=name))
+                else: is_written = self.update_entry(name, update, expect)
+                if not is_written: break
+        except:
+            self._execute('ROLLBACK')
+            raise
+        self._execute('COMMIT' if is_written else 'ROLLBACK')
+        return is_written
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _create_table(self):
+        ''' Create the underlying locks table if it does not
+        already exist, and add the readers column to a table that
+        was created before it existed.
+        '''
+        query = '''CREATE TABLE IF NOT EXISTS %s (
+            %s TEXT PRIMARY KEY NOT NULL,
+            %s TEXT, %s, %s INTEGER, %s INTEGER, %s TEXT, %s TEXT)''' % ((self._table(),) +
+            tuple(self._quote(getattr(self.schema, field)) for field in self.fields))
+        self._execute(query)
+
+        columns = [row[1] for row in self._execute('PRAGMA table_info(%s)' % self._table())]
+        if self.schema.readers not in columns:
+            self._execute('ALTER TABLE %s ADD COLUMN %s TEXT' % (self._table(), self._quote(self.schema.readers)))
+
+    def _get_connection(self):
+        ''' Retrieve the database connection for the current
+        thread, creating it if needed.
+
+        :returns: The database connection for the current thread
+        '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _execute(self, query, params=()):
+        ''' Execute the supplied query as a single autocommit
+        statement on the connection for the current thread.
+
+        :param query: The query to execute
+        :param params: The parameters to bind to the query
+        :returns: The cursor of the executed query
+        :raises DynamoDBLockThrottledError: If the database stayed busy
+        '''
+        try:
+            return self._get_connection().execute(query, params)
+        except sqlite3.OperationalError, ex:
+            if 'locked' in str(ex) or 'busy' in str(ex):
+                raise DynamoDBLockThrottledError(str(ex))
+            raise
+
+    def _get_where(self, name, expect):
+        ''' Build the where clause that matches the named entry
+        only if all the expected fields are unchanged.
+
+        :param name: The name of the entry to match
+        :param expect: The fields we expect to not have changed
+        :returns: The (clause, params) of the where clause
+        '''
+        expect  = self._encode(expect)
+        expect[self.schema.name] = name
+        clauses = ['%s IS ?' % self._quote(key) for key in expect]
+        return ' AND '.join(clauses), list(expect.values())
+
+    def _encode(self, record):
+        ''' Convert the supplied fields to the column values
+        that are stored in the database.
+
+        :param record: The fields to convert
+        :returns: The converted column values
+        '''
+        record = self.schema.to_schema(record)
+        if self.schema.is_locked in record:
+            record[self.schema.is_locked] = int(bool(record[self.schema.is_locked]))
+        if self.schema.payload in record:
+            record[self.schema.payload] = self._encode_payload(record[self.schema.payload])
+        return record
+
+    def _encode_payload(self, payload):
+        ''' Encode the supplied payload (as converted by the schema
+        codec) to store in the database. Binary payloads are stored as
+        blobs and everything else as JSON.
+
+        :param payload: The payload to encode
+        :returns: The encoded payload
+        '''
+        if payload is None: return None
+        if isinstance(payload, Binary): return sqlite3.Binary(payload.value)
+        return json.dumps(payload)
+
+    def _decode_payload(self, payload):
+        ''' Decode the supplied payload from the database.
+
+        :param payload: The payload to decode
+        :returns: The decoded payload
+        '''
+        if payload is None: return None
+        if isinstance(payload, buffer): return Binary(str(payload))
+        return json.loads(payload)
+
+    def _table(self):
+        ''' Retrieve the quoted name of the locks table.
+
+        :returns: The quoted name of the locks table
+        '''
+        return self._quote(self.schema.table_name)
+
+    def _quote(self, name):
+        ''' Quote the supplied identifier for use in a query.
+
+        :param name: The identifier to quote
+        :returns: The quoted identifier
+        '''
+        return '"%s"' % name.replace('"', '""')
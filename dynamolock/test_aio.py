@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+import unittest
+from functools import partial
+from datetime import timedelta
+from dynamolock import test_support
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.backoff import DynamoDBLockBackoff
+from dynamolock.test_support import ThrottlingMemoryTable
+from dynamolock.watcher import DynamoDBLockWatcher, DynamoDBLockLocalFeed
+
+import trollius as asyncio
+from trollius import From, Return
+from dynamolock.aio import AsyncDynamoDBLockClient, AsyncDynamoDBLockContext
+
+create_client = partial(test_support.create_client, client_class=AsyncDynamoDBLockClient,
+    acquire_timeout  = timedelta(milliseconds=100),
+    retry_period     = timedelta(milliseconds=10),
+    throttle_retries = 0,
+    throttle_backoff = DynamoDBLockBackoff(base=timedelta(milliseconds=1)))
+
+class AsyncDynamoDBLockClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_acquire_and_release(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, loop=self.loop)
+        waiter = create_client(table, loop=self.loop)
+
+        @asyncio.coroutine
+        def work():
+            context = AsyncDynamoDBLockContext(client=holder, name='my.lock')
+            yield From(context.__aenter__())
+            try:
+                taken  = yield From(waiter.acquire_lock('my.lock', no_wait=True))
+                exists = yield From(waiter.does_lock_exist('my.lock'))
+            finally: yield From(context.__aexit__(None, None, None))
+            lock = yield From(waiter.try_acquire_lock('my.lock'))
+            raise Return((context.lock, taken, exists, lock))
+
+        held, taken, exists, lock = self.loop.run_until_complete(work())
+        self.assertEqual(holder.owner, held.owner)
+        self.assertIsNone(taken)
+        self.assertTrue(exists)
+        self.assertEqual(waiter.owner, lock.owner)
+        self.assertEqual(1, waiter.client.metrics.get_histogram(
+            'dynamolock_acquire_tries', result='acquired').count)
+
+    def test_throttled_acquire(self):
+        table  = ThrottlingMemoryTable()
+        client = create_client(table, loop=self.loop)
+        table.throttles = 1
+        self.assertIsNone(self.loop.run_until_complete(client.acquire_lock('my.lock', no_wait=True)))
+
+        table.throttles = 1
+        lock = self.loop.run_until_complete(client.acquire_lock('my.lock'))
+        self.assertEqual(client.owner, lock.owner)
+        self.assertEqual(2, client.client.metrics.get_counter('dynamolock_throttles_total', operation='get'))
+
+    def test_heartbeat_renews_leases(self):
+        table  = ThrottlingMemoryTable()
+        holder = create_client(table, loop=self.loop, lock_duration=timedelta(milliseconds=300))
+        waiter = create_client(table, loop=self.loop, lock_duration=timedelta(milliseconds=300))
+
+        @asyncio.coroutine
+        def work():
+            holder.startup()
+            lock = yield From(holder.acquire_lock('my.lock'))
+            table.throttles = 1 # the first renewal is throttled but kept
+            yield From(asyncio.sleep(0.5, loop=self.loop))
+            taken = yield From(waiter.try_acquire_lock('my.lock'))
+            renewed = holder.locks.get('my.lock')
+            yield From(holder.shutdown())
+            raise Return((lock, renewed, taken))
+
+        lock, renewed, taken = self.loop.run_until_complete(work())
+        self.assertIsNone(taken)
+        self.assertNotEqual(lock.version, renewed.version)
+        self.assertEqual({}, holder.locks)
+        self.assertEqual(1, holder.client.metrics.get_counter('dynamolock_throttles_total', operation='update'))
+
+    def test_heartbeat_renews_on_own_executor(self):
+        clock  = [1000.0]
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, loop=self.loop, clock=lambda: clock[0])
+
+        @asyncio.coroutine
+        def work():
+            holder.startup()
+            locks = []
+            for name in ('my.lock', 'other.lock'):
+                locks.append((yield From(holder.acquire_lock(name))))
+            clock[0] += 2 # both leases are due at once
+            holder._wakeup.set()
+            yield From(asyncio.sleep(0.1, loop=self.loop))
+            renewed = [holder.locks.get(lock.name) for lock in locks]
+            pool    = holder.worker._pool
+            yield From(holder.shutdown())
+            raise Return((locks, renewed, pool))
+
+        locks, renewed, pool = self.loop.run_until_complete(work())
+        self.assertEqual([l.name for l in locks], [l.name for l in renewed])
+        self.assertNotEqual(locks[0].version, renewed[0].version)
+        self.assertNotEqual(locks[1].version, renewed[1].version)
+        self.assertIsNone(pool)
+
+    def test_reject_blocking_waits(self):
+        table   = DynamoDBLockMemoryTable()
+        watcher = DynamoDBLockWatcher(feed=DynamoDBLockLocalFeed(table=table))
+        for option in ({'fair': True}, {'coalesce': True}, {'watcher': watcher}):
+            self.assertRaises(ValueError, create_client, table, loop=self.loop, **option)
+
+    def test_queue_entries_not_acquirable(self):
+        client = create_client(DynamoDBLockMemoryTable(), loop=self.loop)
+        lock   = self.loop.run_until_complete(client.try_acquire_lock('__queue__/my.lock#1'))
+        self.assertIsNone(lock)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+import os
+import json
+import unittest
+from mock import patch
+from boto.exception import JSONResponseError
+from boto.dynamodb2.table import Table
+from boto.dynamodb2.layer1 import DynamoDBConnection
+from dynamolock.backend import DynamoDBLockTableBackend
+from dynamolock.limiter import DynamoDBLockThrottledError
+
+class DynamoDBLockTableBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'access-key',
+            'AWS_SECRET_ACCESS_KEY': 'secret-key',
+        })
+        self.environ.start()
+        DynamoDBLockTableBackend.clear_cache()
+
+    def tearDown(self):
+        DynamoDBLockTableBackend.clear_cache()
+        self.environ.stop()
+
+    def test_shared_table_handle(self):
+        with patch.object(Table, 'describe', return_value={}) as describe:
+            backend = DynamoDBLockTableBackend()
+            other   = DynamoDBLockTableBackend()
+            region  = DynamoDBLockTableBackend(region='us-west-2', verify=False)
+
+        self.assertEqual(1, describe.call_count)
+        self.assertIs(backend.table, other.table)
+        self.assertIsNot(backend.table, region.table)
+        self.assertIs(backend.table.connection, other.table.connection)
+
+    def test_lazy_verification(self):
+        with patch.object(Table, 'describe', return_value={}) as describe:
+            with patch.object(Table, 'get_item', return_value={}):
+                backend = DynamoDBLockTableBackend(verify='lazy')
+                self.assertEqual(0, describe.call_count)
+                backend.retrieve_entry('my.lock')
+                backend.retrieve_entry('my.lock')
+                self.assertEqual(1, describe.call_count)
+
+    def test_missing_table(self):
+        error = JSONResponseError(400, 'Bad Request', {})
+        with patch.object(Table, 'describe', side_effect=error):
+            self.assertRaises(JSONResponseError, DynamoDBLockTableBackend)
+
+        described = [error, {'Table': {'TableStatus': 'ACTIVE'}}]
+        with patch.object(Table, 'describe', side_effect=described):
+            with patch.object(Table, 'create', return_value=Table('Locks')) as create:
+                backend = DynamoDBLockTableBackend(create=True)
+                self.assertEqual(1, create.call_count)
+                self.assertIs(backend.table, DynamoDBLockTableBackend(verify=False).table)
+
+    def test_transact_entries(self):
+        backend = DynamoDBLockTableBackend(verify=False)
+        writes  = [
+            ('lock.1', { 'owner': 'owner', 'version': 'v1', 'is_locked': True }, None),
+            ('lock.2', { 'owner': 'owner', 'version': 'v2' }, { 'name': 'lock.2', 'version': 'v0' }),
+        ]
+        with patch.object(DynamoDBConnection, 'make_request', return_value={}) as request:
+            self.assertTrue(backend.transact_entries(writes))
+        action, body = request.call_args[0]
+        items = json.loads(body)['TransactItems']
+        self.assertEqual('TransactWriteItems', action)
+        self.assertEqual({ 'S': 'lock.1' }, items[0]['Put']['Item']['N'])
+        self.assertEqual('attribute_not_exists(#n)', items[0]['Put']['ConditionExpression'])
+        self.assertEqual('SET #u0 = :u0, #u1 = :u1', items[1]['Update']['UpdateExpression'])
+        self.assertEqual('attribute_exists(#n) AND #e0 = :e0 AND #e1 = :e1', items[1]['Update']['ConditionExpression'])
+
+        def cancelled(*reasons):
+            return JSONResponseError(400, 'Bad Request', {
+                '__type': 'com.amazonaws.dynamodb.v20120810#TransactionCanceledException',
+                'CancellationReasons': [{ 'Code': reason } for reason in reasons] })
+        with patch.object(DynamoDBConnection, 'make_request', side_effect=cancelled('None', 'ConditionalCheckFailed')):
+            self.assertFalse(backend.transact_entries(writes))
+        with patch.object(DynamoDBConnection, 'make_request', side_effect=cancelled('ThrottlingError', 'None')):
+            self.assertRaises(DynamoDBLockThrottledError, backend.transact_entries, writes)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
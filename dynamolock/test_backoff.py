@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import unittest
+from datetime import timedelta
+from dynamolock.backoff import DynamoDBLockBackoff
+from dynamolock.backoff import DynamoDBLockExponentialBackoff
+from dynamolock.backoff import DynamoDBLockJitterBackoff
+from dynamolock.policy import DynamoDBLockPolicy
+
+class DynamoDBLockBackoffTest(unittest.TestCase):
+
+    def test_sub_second_retry_period(self):
+        policy = DynamoDBLockPolicy(retry_period=timedelta(milliseconds=250))
+        self.assertEqual(250, policy.retry_period)
+        self.assertEqual(250, policy.get_retry_delay(1))
+        self.assertEqual(250, policy.get_retry_delay(10, 250))
+
+    def test_constant_backoff(self):
+        backoff = DynamoDBLockBackoff(base=timedelta(milliseconds=50))
+        self.assertEqual([50, 50, 50], [backoff.get_delay(tries) for tries in range(1, 4)])
+
+    def test_exponential_backoff(self):
+        backoff = DynamoDBLockExponentialBackoff(base=timedelta(milliseconds=10),
+            cap=timedelta(milliseconds=60), jitter=False)
+        self.assertEqual([10, 20, 40, 60, 60], [backoff.get_delay(tries) for tries in range(1, 6)])
+
+        backoff = DynamoDBLockExponentialBackoff(base=timedelta(milliseconds=10),
+            cap=timedelta(milliseconds=60))
+        for tries in range(1, 100):
+            self.assertTrue(0 <= backoff.get_delay(tries) <= 60)
+
+    def test_jitter_backoff(self):
+        backoff = DynamoDBLockJitterBackoff(base=timedelta(milliseconds=10),
+            cap=timedelta(milliseconds=500))
+        delay = None
+        for tries in range(1, 100):
+            delay = backoff.get_delay(tries, delay)
+            self.assertTrue(10 <= delay <= 500)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import json
+import time
+import unittest
+from mock import patch
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.backend import DynamoDBLockTableBackend
+from dynamolock.benchmark import DynamoDBLockBenchmark
+from dynamolock.benchmark.contention import get_percentile, get_fairness
+
+class DynamoDBLockBenchmarkTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = range(1, 1001)
+        self.assertEqual(500, get_percentile(values, 50))
+        self.assertEqual(990, get_percentile(values, 99))
+        self.assertEqual(999, get_percentile(values, 99.9))
+        self.assertIsNone(get_percentile([], 50))
+
+    def test_fairness(self):
+        self.assertEqual(1.0, get_fairness([5, 5, 5, 5]))
+        self.assertEqual(0.25, get_fairness([20, 0, 0, 0]))
+        self.assertIsNone(get_fairness([0, 0]))
+
+    def test_benchmark_run(self):
+        benchmark = DynamoDBLockBenchmark(threads=4, names=2, duration=0.2, held_locks=50)
+        results   = json.loads(json.dumps(benchmark.run()))
+
+        self.assertEqual(4, results['options']['threads'])
+        self.assertTrue(results['contention']['acquires'] > 0)
+        self.assertTrue(results['contention']['latency_p50_ms'] <= results['contention']['latency_p99_ms'])
+        self.assertEqual(50, results['sweep']['held_locks'])
+        self.assertEqual(0, results['sweep']['failures'])
+
+    def test_failed_acquires(self):
+        def acquire_lock(client, name, **params):
+            client._record_conflict('transact')
+            time.sleep(0.005)
+            return None
+
+        benchmark = DynamoDBLockBenchmark(threads=2, duration=0.1)
+        backend   = DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable())
+        with patch.object(DynamoDBLockClient, 'acquire_lock', autospec=True, side_effect=acquire_lock):
+            result = benchmark._run_contenders(backend)
+        results = benchmark._summarize([result])
+
+        self.assertEqual([], result['latencies'])
+        self.assertTrue(result['failed'])
+        self.assertEqual(len(result['failed']), result['conflicts'])
+        self.assertEqual(0, results['acquires'])
+        self.assertEqual(len(result['failed']), results['failures'])
+        self.assertIsNone(results['latency_p50_ms'])
+        self.assertTrue(results['failed_p50_ms'] >= 5)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import time
+import unittest
+from datetime import timedelta
+from dynamolock.lock import DynamoDBLock
+from dynamolock.cache import DynamoDBLockCache
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.test_support import CountingMemoryTable
+
+def create_lock(name, duration=1000):
+    return DynamoDBLock(name=name, version='1', owner='owner', duration=duration,
+        timestamp=long(time.time() * 1000), is_locked=True, payload=None)
+
+class DynamoDBLockCacheTest(unittest.TestCase):
+
+    def test_cache_lru(self):
+        cache = DynamoDBLockCache(size=2)
+        cache.put('a', create_lock('a'))
+        cache.put('b', None)
+        self.assertEqual((True, None), cache.get('b'))
+        self.assertTrue(cache.get('a')[0])
+        cache.put('c', None) # evicts b
+        self.assertEqual((False, None), cache.get('b'))
+        self.assertEqual((3, 1), (cache.hits + cache.misses, cache.misses))
+        self.assertEqual(2, len(cache))
+
+    def test_cache_ttl(self):
+        cache = DynamoDBLockCache(ttl=timedelta(seconds=10), absent_ttl=timedelta(milliseconds=10))
+        cache.put('absent', None)
+        cache.put('held', create_lock('held', duration=10))
+        time.sleep(0.02)
+        self.assertFalse(cache.get('absent')[0])
+        self.assertFalse(cache.get('held')[0]) # never past the lease
+
+        cache.clear()
+        self.assertEqual((0, 0, 0), (len(cache), cache.hits, cache.misses))
+
+    def test_client_read_through(self):
+        table  = CountingMemoryTable()
+        cache  = DynamoDBLockCache(ttl=timedelta(seconds=10))
+        client = DynamoDBLockClient(table=table, cache=cache)
+        other  = DynamoDBLockClient(table=table)
+
+        for _ in range(5):
+            self.assertFalse(client.does_lock_exist('my.lock', consistent=False))
+        self.assertEqual([False], table.reads)
+        self.assertEqual((4, 1), (cache.hits, cache.misses))
+
+        lock = client.acquire_lock('my.lock', no_wait=True)
+        self.assertNotIn('my.lock', cache)
+        self.assertTrue(client.release_lock(lock))
+
+        other.acquire_lock('my.lock', no_wait=True)
+        self.assertTrue(client.does_lock_exist('my.lock'))
+        self.assertTrue(client.does_lock_exist('my.lock'))
+        self.assertTrue(client.does_lock_exist('my.lock', consistent=False))
+        self.assertEqual([False, True, True, True, True], table.reads) # consistent reads bypass the cache
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread
+from functools import partial
+from datetime import timedelta
+from dynamolock import test_support
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+
+create_client = partial(test_support.create_client, acquire_timeout=timedelta(0),
+    retry_period=timedelta(0), lock_duration=timedelta(minutes=1))
+
+class SlowTable(DynamoDBLockMemoryTable):
+
+    def delete_item(self, *args, **kwargs):
+        time.sleep(0.1)
+        return DynamoDBLockMemoryTable.delete_item(self, *args, **kwargs)
+
+class DynamoDBLockClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table  = DynamoDBLockMemoryTable()
+        self.client = create_client(self.table)
+        self.other  = create_client(self.table)
+
+    def test_acquire_and_release(self):
+        lock = self.client.acquire_lock('my.lock')
+        self.assertIsNotNone(lock)
+        self.assertTrue(self.client.is_lock_valid(lock))
+        self.assertIsNone(self.other.try_acquire_lock('my.lock'))
+        self.assertTrue(self.other.does_lock_exist('my.lock'))
+
+        self.assertTrue(self.client.release_lock(lock))
+        self.assertEqual({}, self.table.items)
+        self.assertFalse(self.other.does_lock_exist('my.lock'))
+        self.assertIsNotNone(self.other.try_acquire_lock('my.lock'))
+
+    def test_touch_lock(self):
+        lock = self.client.acquire_lock('my.lock')
+        new_lock = self.client.touch_lock(lock)
+        self.assertIsNotNone(new_lock)
+        self.assertNotEqual(lock.version, new_lock.version)
+        self.assertIsNone(self.client.touch_lock(lock))
+        self.assertEqual(new_lock, self.client.locks['my.lock'])
+
+    def test_release_without_delete(self):
+        lock = self.client.acquire_lock('my.lock')
+        self.assertTrue(self.client.release_lock(lock, delete=False))
+        self.assertIn('my.lock', self.table.items)
+        self.assertIsNone(self.client.retrieve_lock('my.lock'))
+
+        other_lock = self.other.try_acquire_lock('my.lock')
+        self.assertIsNotNone(other_lock)
+        self.assertTrue(other_lock.is_locked)
+        self.assertIsNotNone(self.other.touch_lock(other_lock))
+
+    def test_expired_lock_takeover(self):
+        client = create_client(self.table, lock_duration=timedelta(milliseconds=20))
+        other  = create_client(self.table, acquire_timeout=timedelta(seconds=1),
+            retry_period=timedelta(milliseconds=10))
+        lock   = client.acquire_lock('my.lock')
+        other_lock = other.acquire_lock('my.lock')
+
+        self.assertIsNotNone(other_lock)
+        self.assertEqual(other.owner, other_lock.owner)
+        self.assertIsNone(client.touch_lock(lock))
+
+    def test_wait_for_expiry(self):
+        client = create_client(self.table, lock_duration=timedelta(milliseconds=100))
+        other  = create_client(self.table, acquire_timeout=timedelta(seconds=1),
+            retry_period=timedelta(milliseconds=5), wait_for_expiry=True)
+        reads  = []
+        retrieve_entry = other.backend.retrieve_entry
+        other.backend.retrieve_entry = lambda *a, **kw: reads.append(a) or retrieve_entry(*a, **kw)
+
+        lock = client.acquire_lock('my.lock')
+        other_lock = other.acquire_lock('my.lock')
+        self.assertIsNotNone(other_lock)
+        self.assertTrue(len(reads) <= 3)
+
+    def test_acquire_deadline(self):
+        client = create_client(self.table, lock_duration=timedelta(milliseconds=50))
+        other  = create_client(self.table, acquire_timeout=timedelta(milliseconds=30),
+            retry_period=timedelta(seconds=10))
+        lock   = client.acquire_lock('my.lock')
+        start  = time.time()
+        self.assertIsNotNone(other.acquire_lock('my.lock'))
+        self.assertTrue(time.time() - start < 1)
+
+    def test_counter_versions(self):
+        client = create_client(self.table, versioning='counter', delete_lock=False)
+        lock   = client.acquire_lock('my.lock')
+        self.assertEqual(1, lock.version)
+        lock   = client.touch_lock(client.touch_lock(lock))
+        self.assertEqual(3, lock.version)
+        self.assertTrue(client.release_lock(lock, delete=True)) # never deleted
+
+        other  = create_client(self.table, versioning='counter', delete_lock=False)
+        lock   = other.try_acquire_lock('my.lock')
+        self.assertEqual(5, lock.version)
+
+        self.assertFalse(DynamoDBLockPolicy(versioning='counter').delete_lock)
+        self.assertRaises(ValueError, DynamoDBLockPolicy, versioning='counter', delete_lock=True)
+
+    def test_try_acquire_any(self):
+        names = ['partition.%d' % index for index in range(10)]
+        held  = self.other.try_acquire_any(names, limit=8)
+        self.assertEqual(8, len(held))
+        self.assertTrue(self.other.release_lock(held[0], delete=False))
+
+        free  = set(names) - set(lock.name for lock in held[1:])
+        locks = self.client.try_acquire_any(names, limit=5)
+        self.assertEqual(3, len(locks))
+        self.assertEqual(free, set(lock.name for lock in locks))
+        self.assertEqual([], self.client.try_acquire_any(names))
+
+    def test_release_all_locks(self):
+        table  = SlowTable()
+        client = create_client(table)
+        locks  = [client.acquire_lock('lock.%d' % index) for index in range(16)]
+        start  = time.time()
+        self.assertTrue(client.release_all_locks())
+        self.assertTrue(time.time() - start < 1) # eight at a time, not one
+        self.assertEqual(sorted(lock.name for lock in locks), sorted(client.last_release.released))
+        self.assertEqual(([], []), (client.last_release.failed, client.last_release.pending))
+        self.assertEqual({}, client.locks)
+
+    def test_release_locks_deadline(self):
+        table  = SlowTable()
+        client = create_client(table)
+        locks  = [client.acquire_lock('lock.%d' % index) for index in range(16)]
+        self.assertTrue(client.release_lock(locks[0]))
+        report = client.release_locks(locks[:2])
+        self.assertEqual((['lock.1'], ['lock.0'], []), report[:3])
+
+        report = client.release_locks(locks[2:], timeout=0.05)
+        self.assertEqual(([], [], 14), (report.released, report.failed, len(report.pending)))
+        self.assertFalse(client.release_all_locks(timeout=0))
+        time.sleep(0.5)
+        self.assertEqual({}, client.locks)
+
+    def test_acquire_locks(self):
+        names = ['lock.%d' % index for index in range(5)]
+        held  = self.other.acquire_lock('lock.3')
+        self.assertIsNone(self.client.acquire_locks(names, no_wait=True))
+        self.assertEqual(['lock.3'], self.table.items.keys()) # none of the free locks were taken
+        self.assertTrue(self.other.release_lock(held, delete=False))
+
+        locks = self.client.acquire_locks(reversed(names), payload='job-1')
+        self.assertEqual(names, [lock.name for lock in locks])
+        self.assertEqual(set(names), set(self.client.locks))
+        self.assertTrue(all(self.client.is_lock_valid(lock) for lock in locks))
+        self.assertEqual('job-1', self.other.retrieve_lock('lock.3').payload)
+        self.assertIsNone(self.other.try_acquire_lock('lock.0'))
+        self.assertIsNone(self.client.acquire_locks(names[:1], no_wait=True))
+        self.assertTrue(self.client.release_all_locks())
+
+    def test_acquire_locks_waits_for_set(self):
+        client = create_client(self.table, acquire_timeout=timedelta(seconds=2),
+            retry_period=timedelta(milliseconds=5))
+        other  = create_client(self.table, acquire_timeout=timedelta(seconds=2),
+            retry_period=timedelta(milliseconds=5))
+        counts = []
+
+        def worker(client, names):
+            for _ in range(20):
+                locks = client.acquire_locks(names)
+                counts.append(len(locks))
+                client.release_all_locks()
+
+        threads = [Thread(target=worker, args=(client, ['a', 'b'])), Thread(target=worker, args=(other, ['b', 'a']))]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join(10)
+        self.assertEqual([2] * 40, counts)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from dynamolock import codec
+from dynamolock.codec import DynamoDBLockCodec, DynamoDBLockJSONCodec
+from dynamolock.codec import DynamoDBLockMsgpackCodec, DynamoDBLockCompressedCodec
+from dynamolock.codec import DynamoDBLockPayload
+from dynamolock.schema import DynamoDBLockSchema
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.sqlite import DynamoDBLockSQLiteBackend
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+
+class CountingCodec(DynamoDBLockJSONCodec):
+
+    def __init__(self):
+        self.decoded = 0
+
+    def decode(self, value):
+        self.decoded += 1
+        return super(CountingCodec, self).decode(value)
+
+class DynamoDBLockCodecTest(unittest.TestCase):
+
+    payload = { 'hosts': ['host-%d.company.org' % index for index in range(100)], 'count': 100 }
+
+    def test_codec_round_trip(self):
+        codecs = [
+            DynamoDBLockCodec(),
+            DynamoDBLockJSONCodec(),
+            DynamoDBLockCompressedCodec(),
+            DynamoDBLockCompressedCodec(threshold=10 ** 6),
+        ]
+        if codec.msgpack:
+            codecs.append(DynamoDBLockMsgpackCodec())
+        if codec.msgpack and codec.zstandard:
+            codecs.append(DynamoDBLockCompressedCodec(compression='zstd', codec=DynamoDBLockMsgpackCodec()))
+        for instance in codecs:
+            self.assertEqual(self.payload, instance.decode(instance.encode(self.payload)))
+
+    def test_compressed_codec_size(self):
+        encoded = DynamoDBLockCompressedCodec().encode(self.payload)
+        self.assertTrue(len(encoded.value) < len(DynamoDBLockJSONCodec().encode(self.payload)) / 4)
+
+    def test_lazy_payload(self):
+        codec  = CountingCodec()
+        schema = DynamoDBLockSchema(codec=codec)
+        policy = DynamoDBLockPolicy(acquire_timeout=timedelta(seconds=0))
+        table  = DynamoDBLockMemoryTable(schema=schema)
+        client = DynamoDBLockClient(table=table, schema=schema, policy=policy)
+        other  = DynamoDBLockClient(table=table, schema=schema, policy=policy)
+
+        client.acquire_lock('my.lock', payload=self.payload)
+        self.assertIsNone(other.try_acquire_lock('my.lock'))
+        lock = other.retrieve_lock('my.lock')
+        self.assertEqual(0, codec.decoded)
+        self.assertEqual(self.payload, lock.payload)
+        self.assertEqual(self.payload, lock.payload)
+        self.assertEqual(1, codec.decoded)
+        self.assertEqual(self.payload, lock._asdict()['payload'])
+
+    def test_sqlite_binary_payload(self):
+        directory = tempfile.mkdtemp()
+        try:
+            schema  = DynamoDBLockSchema(codec=DynamoDBLockCompressedCodec())
+            backend = DynamoDBLockSQLiteBackend(path=os.path.join(directory, 'locks.db'), schema=schema)
+            client  = DynamoDBLockClient(backend=backend, schema=schema)
+            client.acquire_lock('my.lock', payload=self.payload)
+            self.assertEqual(self.payload, client.retrieve_lock('my.lock').payload)
+            self.assertEqual(self.payload, backend.retrieve_entry('my.lock')['payload'])
+        finally: shutil.rmtree(directory)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread, Lock
+from functools import partial
+from datetime import timedelta
+from dynamolock import test_support
+from dynamolock.test_support import CountingMemoryTable
+from dynamolock.handoff import DynamoDBLockHandoff
+
+create_client = partial(test_support.create_client, coalesce=True,
+    retry_period=timedelta(milliseconds=10), lock_duration=timedelta(seconds=1))
+
+def run_waiters(client, count):
+    order, mutex = [], Lock()
+
+    def waiter(index):
+        time.sleep(0.005 * index) # join the queue in order
+        lock = client.acquire_lock('my.lock')
+        with mutex: order.append((index, lock.version if lock else None))
+        time.sleep(0.01)
+        client.release_lock(lock)
+
+    threads = [Thread(target=waiter, args=(index,)) for index in range(count)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join(5)
+    return order
+
+class DynamoDBLockHandoffTest(unittest.TestCase):
+
+    def test_handoff_queue(self):
+        handoff = DynamoDBLockHandoff()
+        first   = handoff.join('lock')
+        second  = handoff.join('lock')
+        self.assertTrue(first.is_contender)
+        self.assertFalse(second.is_contender)
+        self.assertIsNone(handoff.join('lock', no_wait=True))
+
+        handoff.finish('lock', first, None) # the contender gave up
+        self.assertTrue(second.is_contender)
+        self.assertTrue(second.event.is_set())
+
+        handoff.finish('lock', second, 'lock')
+        third = handoff.join('lock')
+        self.assertTrue(handoff.release('lock', 'new lock'))
+        self.assertEqual('new lock', third.lock)
+        self.assertFalse(handoff.release('lock'))
+        self.assertEqual({}, handoff.queues)
+
+    def test_waiter_timeout(self):
+        handoff = DynamoDBLockHandoff()
+        handoff.finish('lock', handoff.join('lock'), 'lock')
+        waiter  = handoff.join('lock')
+        self.assertFalse(handoff.wait('lock', waiter, 0.02, 0.01, lambda: True))
+        self.assertFalse(handoff.has_waiters('lock'))
+
+    def test_lost_lock_promotes_waiter(self):
+        handoff = DynamoDBLockHandoff()
+        handoff.finish('lock', handoff.join('lock'), 'lock')
+        waiter  = handoff.join('lock')
+        self.assertTrue(handoff.wait('lock', waiter, 1, 0.01, lambda: False))
+        self.assertTrue(waiter.is_contender)
+
+    def test_coalesced_acquire(self):
+        table  = CountingMemoryTable()
+        client = create_client(table)
+        order  = run_waiters(client, 8)
+
+        self.assertEqual(range(8), [index for index, version in order])
+        self.assertTrue(all(version for index, version in order))
+        self.assertEqual(8, len(table.reads)) # one read per contender
+        self.assertEqual({}, table.items)
+
+    def test_direct_handoff(self):
+        table  = CountingMemoryTable()
+        client = create_client(table, handoff=True)
+        order  = run_waiters(client, 8)
+
+        self.assertEqual(range(8), [index for index, version in order])
+        self.assertEqual(8, len(set(version for index, version in order)))
+        self.assertEqual(1, len(table.reads)) # only the first contender
+        self.assertEqual({}, table.items)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread, Event
+from datetime import timedelta
+from dynamolock.lock import DynamoDBLock
+from dynamolock.backoff import DynamoDBLockBackoff
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.worker import DynamoDBLockWorker
+from dynamolock.limiter import DynamoDBLockLimiter, DynamoDBLockThrottledError
+from dynamolock.test_support import ThrottlingMemoryTable, create_client
+
+class OrderedMemoryTable(DynamoDBLockMemoryTable):
+
+    def __init__(self, **kwargs):
+        super(OrderedMemoryTable, self).__init__(**kwargs)
+        self.on_get  = {}
+        self.updates = []
+
+    def get_item(self, **kwargs):
+        item = super(OrderedMemoryTable, self).get_item(**kwargs)
+        self.on_get.pop(self._get_key(kwargs), lambda: None)()
+        return item
+
+    def _update_item(self, key, *args, **kwargs):
+        result = super(OrderedMemoryTable, self)._update_item(key, *args, **kwargs)
+        self.updates.append(self._get_key(key))
+        return result
+
+class ThrottledLockClient(object):
+
+    def __init__(self):
+        self.locks = {}
+
+    def touch_lock(self, lock):
+        raise DynamoDBLockThrottledError("throttled")
+
+class DynamoDBLockLimiterTest(unittest.TestCase):
+
+    def test_limiter_aimd(self):
+        limiter = DynamoDBLockLimiter(rate=100, min_rate=10, cooldown=10)
+        limiter.on_throttle()
+        self.assertEqual(50, limiter.rate)
+        limiter.on_throttle() # within the cooldown
+        self.assertEqual(50, limiter.rate)
+        limiter.on_success()
+        self.assertAlmostEqual(50.02, limiter.rate)
+
+    def test_limiter_reserve(self):
+        limiter = DynamoDBLockLimiter(rate=10, burst=10, reserve=0.5)
+        acquired = [limiter.acquire('normal', timeout=0) for _ in range(10)]
+        self.assertEqual(5, sum(acquired)) # half is kept for high priority
+        acquired = [limiter.acquire('high', timeout=0) for _ in range(10)]
+        self.assertEqual(5, sum(acquired))
+
+    def test_limiter_pacing(self):
+        limiter = DynamoDBLockLimiter(rate=200, burst=1, reserve=0)
+        start = time.time()
+        for _ in range(11): limiter.acquire()
+        self.assertTrue(time.time() - start >= 0.045)
+
+    def test_throttled_retries(self):
+        table  = ThrottlingMemoryTable()
+        client = create_client(table, acquire_timeout=timedelta(0), retry_period=timedelta(0),
+            throttle_backoff=DynamoDBLockBackoff(base=timedelta(milliseconds=1)),
+            limiter=DynamoDBLockLimiter(rate=1000, min_rate=100, reserve=0, cooldown=0))
+        table.throttles = 2
+        self.assertIsNotNone(client.acquire_lock('my.lock', no_wait=True))
+        self.assertEqual(2, client.metrics.get_counter('dynamolock_throttles_total', operation='get'))
+        self.assertAlmostEqual(250, client.limiter.rate, places=1)
+
+        table.throttles = 10
+        self.assertRaises(DynamoDBLockThrottledError, client.retrieve_lock, 'other.lock')
+        self.assertIsNone(client.acquire_lock('other.lock', no_wait=True))
+
+    def test_takeover_shed_before_renewal(self):
+        table   = OrderedMemoryTable()
+        limiter = DynamoDBLockLimiter(rate=10, burst=10, reserve=0.5, cooldown=0)
+        holder  = create_client(table, limiter=limiter)
+        waiter  = create_client(table, limiter=limiter)
+        lock    = holder.acquire_lock('held')
+        self.assertTrue(holder.release_lock(holder.acquire_lock('free'), delete=False))
+
+        throttled = Event()
+        def throttle(): # right after the takeover has read the unlocked entry
+            limiter.on_throttle()
+            throttled.set()
+        table.on_get['free'] = throttle
+        thread = Thread(target=waiter.acquire_lock, args=('free',), kwargs={ 'no_wait': True })
+        thread.start()
+        throttled.wait(1)
+        time.sleep(0.05) # the takeover is now waiting to write
+        self.assertTrue(holder.touch_lock(lock))
+        thread.join(5)
+        self.assertEqual(['held', 'free'], table.updates[-2:])
+
+    def test_throttle_backoff_not_timed(self):
+        table  = ThrottlingMemoryTable()
+        policy = DynamoDBLockPolicy(throttle_backoff=DynamoDBLockBackoff(base=timedelta(milliseconds=50)))
+        client = DynamoDBLockClient(table=table, policy=policy)
+        table.throttles = 2
+        start = time.time()
+        self.assertIsNone(client.retrieve_lock('my.lock'))
+        self.assertTrue(time.time() - start >= 0.1)
+
+        latency = client.metrics.get_histogram('dynamolock_backend_latency_ms', operation='get')
+        self.assertEqual(3, latency.count)
+        self.assertTrue(latency.sum < 50)
+
+    def test_worker_keeps_throttled_lock(self):
+        client = ThrottledLockClient()
+        lock   = DynamoDBLock(name='lock', version='1', owner='owner', duration=1000,
+            timestamp=long(time.time() * 1000), is_locked=True, payload=None)
+        client.locks['lock'] = lock
+        worker = DynamoDBLockWorker(client=client)
+        sweep  = worker.sweep()
+
+        self.assertEqual(0, sweep.failures)
+        self.assertIn('lock', client.locks)
+        deadline = worker._deadlines[('owner', 'lock')]
+        self.assertTrue(lock.timestamp < deadline < lock.timestamp + lock.duration)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import time
+import unittest
+import threading
+from datetime import timedelta
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.manager import DynamoDBLockManager
+
+class DynamoDBLockManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table   = DynamoDBLockMemoryTable()
+        self.policy  = DynamoDBLockPolicy(
+            acquire_timeout = timedelta(seconds=0),
+            retry_period    = timedelta(seconds=0),
+            lock_duration   = timedelta(milliseconds=60))
+        self.manager = DynamoDBLockManager(table=self.table, policy=self.policy)
+
+    def test_clients_share_backend_and_worker(self):
+        first  = self.manager.get_client('first')
+        second = self.manager.get_client('second')
+        self.assertIs(first, self.manager.get_client('first'))
+        self.assertIs(first.backend, second.backend)
+        self.assertIs(first.worker, second.worker)
+        self.assertEqual(2, len(self.manager))
+        self.assertIn('second', self.manager)
+
+        lock = first.acquire_lock('my.lock')
+        self.assertIsNotNone(lock)
+        self.assertIsNone(second.try_acquire_lock('my.lock'))
+
+    def test_shared_worker_renews_all_owners(self):
+        threads = threading.active_count()
+        clients = [self.manager.get_client('owner.%d' % index) for index in range(10)]
+        self.manager.startup()
+        self.assertEqual(threads + 1, threading.active_count())
+        locks   = [client.acquire_lock('lock.%d' % index) for index, client in enumerate(clients)]
+
+        time.sleep(0.15) # a few leases
+        for client, lock in zip(clients, locks):
+            held = client.locks[lock.name]
+            self.assertNotEqual(lock.version, held.version)
+            self.assertTrue(client.is_lock_valid(held))
+
+        self.manager.shutdown(timeout=1)
+        self.assertFalse(self.manager.worker.is_alive())
+        self.assertEqual({}, self.table.items)
+
+    def test_clients_with_mixed_policies(self):
+        margins = DynamoDBLockPolicy(
+            lock_duration = timedelta(milliseconds=60),
+            lease_margin  = timedelta(milliseconds=30))
+        first   = self.manager.get_client('first')
+        second  = self.manager.get_client('second', policy=margins)
+        self.manager.worker.jitter = 0
+        for client, interval in [(first, 20), (second, 10)]: # a third of the trusted lease
+            lock = client.acquire_lock('lock.' + client.owner)
+            self.assertEqual(lock.timestamp + interval, self.manager.worker.get_renewal_deadline(lock))
+
+        monotonic = DynamoDBLockPolicy(clock=lambda: 1.0)
+        self.assertRaises(ValueError, self.manager.get_client, 'third', policy=monotonic)
+        self.assertNotIn('third', self.manager)
+        client = DynamoDBLockClient(table=self.table, policy=monotonic, worker=self.manager.worker)
+        self.assertRaises(ValueError, self.manager.worker.register, client)
+
+    def test_remove_client(self):
+        client = self.manager.get_client('owner')
+        client.acquire_lock('my.lock')
+        self.assertTrue(self.manager.remove_client('owner'))
+        self.assertNotIn('owner', self.manager)
+        self.assertEqual({}, self.table.items)
+        self.assertEqual({}, self.manager.metrics.gauges)
+        self.assertTrue(self.manager.remove_client('missing'))
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
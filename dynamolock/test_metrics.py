@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+import unittest
+from datetime import timedelta
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.metrics import DynamoDBLockMetrics, DynamoDBLockHistogram
+
+class DynamoDBLockMetricsTest(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = DynamoDBLockHistogram(buckets=(10, 20, 30))
+        for value in range(1, 31):
+            histogram.observe(value)
+        histogram.observe(100)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(31, snapshot['count'])
+        self.assertEqual([(10, 10), (20, 20), (30, 30), ('+Inf', 31)], snapshot['buckets'])
+        self.assertAlmostEqual(15.5, histogram.get_quantile(0.5))
+        self.assertEqual(30, histogram.get_quantile(1.0))
+        self.assertIsNone(DynamoDBLockHistogram().get_quantile(0.5))
+
+    def test_prometheus_format(self):
+        metrics = DynamoDBLockMetrics(count_buckets=(1, 2))
+        metrics.increment('requests_total', operation='get')
+        metrics.increment('requests_total', 2, operation='get')
+        metrics.gauge('held', lambda: 7)
+        metrics.observe('tries', 2, result='ok')
+
+        self.assertEqual(3, metrics.get_counter('requests_total', operation='get'))
+        self.assertEqual('\n'.join([
+            '# TYPE requests_total counter',
+            'requests_total{operation="get"} 3',
+            '# TYPE held gauge',
+            'held 7',
+            '# TYPE tries histogram',
+            'tries_bucket{result="ok",le="1"} 0',
+            'tries_bucket{result="ok",le="2"} 1',
+            'tries_bucket{result="ok",le="+Inf"} 1',
+            'tries_sum{result="ok"} 2.0',
+            'tries_count{result="ok"} 1',
+        ]) + '\n', metrics.to_prometheus())
+
+    def test_client_metrics(self):
+        table   = DynamoDBLockMemoryTable()
+        policy  = DynamoDBLockPolicy(acquire_timeout=timedelta(seconds=0),
+            retry_period=timedelta(seconds=0))
+        client  = DynamoDBLockClient(table=table, policy=policy, owner='first')
+        other   = DynamoDBLockClient(table=table, policy=policy, owner='second',
+            metrics=client.metrics)
+
+        lock = client.acquire_lock('my.lock')
+        self.assertIsNone(other.try_acquire_lock('my.lock'))
+        client.worker.sweep()
+        client.release_all_locks()
+
+        metrics  = client.metrics
+        snapshot = metrics.snapshot()
+        self.assertEqual(0, snapshot['gauges']['dynamolock_held_locks{owner="first"}'])
+        self.assertEqual(1, metrics.get_histogram('dynamolock_acquire_tries', result='failed').count)
+        self.assertEqual(1, metrics.get_histogram('dynamolock_backend_latency_ms', operation='put').count)
+        self.assertEqual(2, metrics.get_histogram('dynamolock_backend_latency_ms', operation='get').count)
+        self.assertEqual(1, metrics.get_histogram('dynamolock_sweep_duration_ms').count)
+        self.assertEqual(1, metrics.get_counter('dynamolock_renewals_total', result='renewed'))
+        self.assertIn('dynamolock_backend_latency_ms_count{operation="delete"} 1', metrics.to_prometheus())
+
+        other.shutdown()
+        self.assertEqual(['dynamolock_held_locks{owner="first"}'], list(metrics.snapshot()['gauges']))
+
+    def test_conflict_counter(self):
+        table   = DynamoDBLockMemoryTable()
+        client  = DynamoDBLockClient(table=table)
+        attempt = client._start_acquire('my.lock', no_wait=True)
+        DynamoDBLockClient(table=table).acquire_lock('my.lock')
+
+        self.assertIsNone(client._acquire_entry(attempt, None)) # stale read
+        self.assertEqual(1, client.metrics.get_counter('dynamolock_acquire_conflicts_total', case='create'))
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
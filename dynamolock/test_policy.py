@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+import time
+import unittest
+from datetime import timedelta
+from dynamolock import policy as policy_module
+from dynamolock.lock import DynamoDBLock
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.worker import DynamoDBLockWorker
+from dynamolock.cache import DynamoDBLockCache
+from dynamolock.watcher import DynamoDBLockWatcher, DynamoDBLockLocalFeed
+
+class FakeClock(object):
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def create_lock(name, timestamp=0, duration=1000):
+    return DynamoDBLock(name=name, version='1', owner='owner', duration=duration,
+        timestamp=timestamp, is_locked=True, payload=None)
+
+class DynamoDBLockPolicyTest(unittest.TestCase):
+
+    def test_safety_margins(self):
+        clock  = FakeClock(10)
+        policy = DynamoDBLockPolicy(clock=clock, lock_duration=timedelta(seconds=1),
+            lease_margin=timedelta(milliseconds=200), takeover_margin=timedelta(milliseconds=300))
+        client = DynamoDBLockClient(table=DynamoDBLockMemoryTable(), policy=policy)
+        lock   = create_lock('my.lock', timestamp=policy.get_new_timestamp())
+        self.assertEqual(10000, lock.timestamp)
+        self.assertEqual(10800, policy.get_lease_end(lock))
+        self.assertEqual(11300, policy.get_expiry(lock))
+
+        clock.now = 10.8
+        self.assertTrue(client.is_lock_active(lock))
+        clock.now = 10.801
+        self.assertFalse(client.is_lock_active(lock))
+        clock.now = 11.3
+        self.assertFalse(client.is_lock_expired(lock))
+        clock.now = 11.301
+        self.assertTrue(client.is_lock_expired(lock))
+
+        self.assertRaises(ValueError, DynamoDBLockPolicy, lock_duration=timedelta(seconds=1),
+            lease_margin=timedelta(seconds=1))
+        self.assertRaises(ValueError, DynamoDBLockPolicy, clock='sundial')
+
+    def test_monotonic_clock(self):
+        if policy_module.monotonic is None:
+            self.assertRaises(ImportError, DynamoDBLockPolicy, clock='monotonic')
+            self.assertRaises(ImportError, DynamoDBLockPolicy.fast_failover)
+        else:
+            policy = DynamoDBLockPolicy.fast_failover()
+            self.assertEqual(policy_module.monotonic, policy.clock)
+            self.assertEqual(1000, policy.lock_duration)
+
+        policy = DynamoDBLockPolicy.fast_failover(clock='wall')
+        self.assertEqual(time.time, policy.clock)
+        self.assertEqual((1000, 200, 200, 100), (policy.lock_duration,
+            policy.lease_margin, policy.takeover_margin, policy.retry_period))
+
+    def test_worker_uses_lease_margin(self):
+        policy = DynamoDBLockPolicy(clock=FakeClock(), lease_margin=timedelta(milliseconds=400))
+        client = DynamoDBLockClient(table=DynamoDBLockMemoryTable(), policy=policy)
+        worker = DynamoDBLockWorker(client=client, renew_ratio=0.5, jitter=0)
+        self.assertEqual(policy, worker.policy)
+        self.assertEqual(300, worker.get_renewal_deadline(create_lock('my.lock')))
+        self.assertEqual(300, worker.get_retry_deadline(create_lock('my.lock')))
+
+    def test_cache_and_watcher_use_client_clock(self):
+        table   = DynamoDBLockMemoryTable()
+        policy  = DynamoDBLockPolicy(clock=FakeClock(10), takeover_margin=timedelta(milliseconds=200))
+        cache   = DynamoDBLockCache(ttl=timedelta(seconds=10))
+        watcher = DynamoDBLockWatcher(feed=DynamoDBLockLocalFeed(table=table))
+        client  = DynamoDBLockClient(table=table, policy=policy, cache=cache, watcher=watcher)
+        self.assertIs(policy, cache.policy)
+        self.assertIs(policy, watcher.policy)
+
+        DynamoDBLockClient(table=table, policy=policy).acquire_lock('my.lock')
+        self.assertTrue(client.does_lock_exist('my.lock', consistent=False))
+        self.assertTrue(client.does_lock_exist('my.lock', consistent=False))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        margins = DynamoDBLockPolicy(clock=policy.clock, takeover_margin=timedelta(seconds=1))
+        DynamoDBLockClient(table=table, policy=margins, cache=cache, watcher=watcher)
+        self.assertIs(policy, cache.policy) # the first client binds the clock
+        self.assertIs(policy, watcher.policy)
+        for shared in [{ 'cache': cache }, { 'watcher': watcher }]:
+            self.assertRaises(ValueError, DynamoDBLockClient, table=table, **shared)
+
+    def test_fast_failover(self):
+        table  = DynamoDBLockMemoryTable()
+        policy = DynamoDBLockPolicy.fast_failover(clock='wall', acquire_timeout=timedelta(seconds=2),
+            lock_duration=timedelta(milliseconds=200), lease_margin=timedelta(milliseconds=50),
+            takeover_margin=timedelta(milliseconds=50), retry_period=timedelta(milliseconds=10))
+        holder = DynamoDBLockClient(table=table, policy=policy)
+        waiter = DynamoDBLockClient(table=table, policy=policy)
+        self.assertTrue(holder.acquire_lock('my.lock', no_wait=True))
+        holder.locks.clear() # the holder dies without releasing
+
+        start = time.time()
+        lock  = waiter.acquire_lock('my.lock')
+        self.assertEqual(waiter.owner, lock.owner)
+        self.assertTrue(0.25 <= time.time() - start < 1)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import time
+import unittest
+from datetime import timedelta
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.test_support import RacingMemoryTable, create_client
+from dynamolock.semaphore import DynamoDBLockSemaphore
+
+class CountingTable(DynamoDBLockMemoryTable):
+
+    def __init__(self):
+        DynamoDBLockMemoryTable.__init__(self)
+        self.calls = []
+
+    def get_item(self, *args, **kwargs):
+        self.calls.append('get')
+        return DynamoDBLockMemoryTable.get_item(self, *args, **kwargs)
+
+    def _update_item(self, *args, **kwargs):
+        self.calls.append('update')
+        return DynamoDBLockMemoryTable._update_item(self, *args, **kwargs)
+
+class DynamoDBLockSemaphoreTest(unittest.TestCase):
+
+    def test_permits(self):
+        table   = DynamoDBLockMemoryTable()
+        clients = [create_client(table) for _ in range(4)]
+        locks   = [client.acquire_permit('my.sem', 3, no_wait=True) for client in clients]
+        self.assertEqual([True, True, True, False], [bool(lock) for lock in locks])
+
+        semaphore = DynamoDBLockSemaphore(client=clients[3], name='my.sem', permits=3)
+        self.assertEqual(set(client.owner for client in clients[:3]), set(semaphore.retrieve_holders()))
+        self.assertIsNone(clients[3].try_acquire_lock('my.sem'))
+        self.assertIsNone(clients[3].acquire_shared('my.sem', no_wait=True))
+
+        self.assertTrue(clients[0].release_lock(locks[0]))
+        with semaphore:
+            self.assertTrue(semaphore.lock)
+            self.assertEqual(3, len(semaphore.retrieve_holders()))
+        self.assertEqual(2, len(semaphore.retrieve_holders()))
+        self.assertTrue(all(client.release_lock(lock) for client, lock in zip(clients[1:3], locks[1:3])))
+        self.assertEqual([], semaphore.retrieve_holders())
+
+    def test_constant_work(self):
+        table  = CountingTable()
+        client = create_client(table)
+        for index in range(10):
+            create_client(table).acquire_permit('my.sem', 20, no_wait=True)
+        del table.calls[:]
+
+        self.assertTrue(client.acquire_permit('my.sem', 20, no_wait=True))
+        self.assertEqual(['get', 'update'], table.calls)
+
+    def test_expired_permit_reclaimed(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, lock_duration=timedelta(milliseconds=100))
+        waiter = create_client(table)
+        self.assertTrue(holder.acquire_permit('my.sem', 1, no_wait=True))
+        holder.locks.clear() # the holder dies without releasing
+
+        lock = waiter.acquire_permit('my.sem', 1)
+        self.assertEqual(waiter.owner, lock.owner)
+        self.assertEqual([waiter.owner], lock.readers.keys())
+
+    def test_worker_renews_permit(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, lock_duration=timedelta(milliseconds=200))
+        waiter = create_client(table, acquire_timeout=timedelta(milliseconds=100))
+        holder.startup()
+        try:
+            lock = holder.acquire_permit('my.sem', 1)
+            self.assertIsNone(waiter.acquire_permit('my.sem', 1))
+            time.sleep(0.1)
+            self.assertIsNone(waiter.acquire_permit('my.sem', 1))
+            self.assertNotEqual(lock.version, holder.locks['my.sem'].version)
+        finally: holder.shutdown()
+        self.assertTrue(waiter.acquire_permit('my.sem', 1, no_wait=True))
+
+    def test_renew_permit_when_racing(self):
+        table   = RacingMemoryTable()
+        clients = [create_client(table) for _ in range(2)]
+        locks   = [client.acquire_permit('my.sem', 2, no_wait=True) for client in clients]
+
+        table.racing = True # the other holders win every race
+        for client, lock in zip(clients, locks):
+            self.assertEqual([lock], [kept for kept, _ in client.worker.renew([lock])])
+            self.assertIs(lock, client.locks['my.sem'])
+
+        table.racing = False
+        semaphore = DynamoDBLockSemaphore(client=clients[0], name='my.sem', permits=2)
+        self.assertEqual(set(client.owner for client in clients), set(semaphore.retrieve_holders()))
+        self.assertTrue(all(client.touch_lock(lock) for client, lock in zip(clients, locks)))
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
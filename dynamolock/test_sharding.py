@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+import os
+import json
+import unittest
+from mock import patch
+from boto.dynamodb2.layer1 import DynamoDBConnection
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.test_support import CountingMemoryTable
+from dynamolock.backend import DynamoDBLockTableBackend
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.sharding import DynamoDBLockHashRing, DynamoDBLockShardedBackend, MOVED_OWNER
+
+def create_shards(count):
+    return [DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable()) for _ in range(count)]
+
+class DynamoDBLockShardingTest(unittest.TestCase):
+
+    def test_hash_ring_is_consistent(self):
+        names = ['lock.%d' % index for index in range(1000)]
+        small = DynamoDBLockHashRing(4)
+        large = DynamoDBLockHashRing(5)
+        counts = [0] * 4
+        for name in names: counts[small.get_shard(name)] += 1
+        self.assertTrue(min(counts) > 150)
+
+        moved = [name for name in names if small.get_shard(name) != large.get_shard(name)]
+        self.assertTrue(all(large.get_shard(name) == 4 for name in moved))
+        self.assertTrue(100 < len(moved) < 350)
+
+    def test_sharded_client(self):
+        shards  = create_shards(3)
+        backend = DynamoDBLockShardedBackend(shards=shards)
+        client  = DynamoDBLockClient(backend=backend)
+        names   = ['lock.%d' % index for index in range(30)]
+        for name in names:
+            self.assertTrue(client.acquire_lock(name, no_wait=True))
+
+        self.assertEqual(30, sum(len(shard.table.items) for shard in shards))
+        self.assertTrue(all(shard.table.items for shard in shards))
+        self.assertEqual(set(names), set(backend.retrieve_entries(names)))
+        self.assertTrue(client.release_all_locks())
+        self.assertEqual(0, sum(len(shard.table.items) for shard in shards))
+
+    def test_key_spaces(self):
+        table   = DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable())
+        backend = DynamoDBLockShardedBackend(key_spaces=4, backend=table)
+        client  = DynamoDBLockClient(backend=backend)
+        lock    = client.acquire_lock('reports', no_wait=True)
+        self.assertEqual('reports', client.retrieve_lock('reports').name)
+        self.assertTrue(table.table.items.keys()[0].endswith('#reports'))
+        self.assertTrue(client.release_lock(lock))
+
+    def test_transact_key_spaces(self):
+        table   = DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable())
+        backend = DynamoDBLockShardedBackend(key_spaces=4, backend=table)
+        client  = DynamoDBLockClient(backend=backend)
+        names   = ['lock.%d' % index for index in range(8)]
+        self.assertEqual(names, [lock.name for lock in client.acquire_locks(names)])
+        self.assertEqual(set(names), set(backend.retrieve_entries(names)))
+
+        shards = DynamoDBLockShardedBackend(shards=create_shards(2))
+        client = DynamoDBLockClient(backend=shards)
+        self.assertFalse(shards.can_transact(names))
+        self.assertRaises(ValueError, client.acquire_locks, names)
+        self.assertEqual({}, shards.retrieve_entries(names))
+
+        local = [name for name in names if shards.ring.get_shard(name) == 0]
+        self.assertEqual(local, [lock.name for lock in client.acquire_locks(local)])
+
+    def test_transact_tables(self):
+        environ = { 'AWS_ACCESS_KEY_ID': 'access-key', 'AWS_SECRET_ACCESS_KEY': 'secret-key' }
+        with patch.dict(os.environ, environ):
+            DynamoDBLockTableBackend.clear_cache()
+            backend = DynamoDBLockShardedBackend(tables=['locks-0', 'locks-1'], verify=False)
+        DynamoDBLockTableBackend.clear_cache()
+        names   = ['lock.%d' % index for index in range(8)]
+        writes  = [(name, { 'owner': 'owner', 'version': 'v1', 'is_locked': True }, None) for name in names]
+        self.assertTrue(backend.can_transact(names))
+        with patch.object(DynamoDBConnection, 'make_request', return_value={}) as request:
+            self.assertTrue(backend.transact_entries(writes))
+
+        self.assertEqual(1, request.call_count)
+        items = json.loads(request.call_args[0][1])['TransactItems']
+        self.assertEqual(set(['locks-0', 'locks-1']), set(item['Put']['TableName'] for item in items))
+
+    def test_transact_moved_names(self):
+        table   = DynamoDBLockTableBackend(table=DynamoDBLockMemoryTable())
+        backend = DynamoDBLockShardedBackend(key_spaces=3, previous=2, backend=table)
+        client  = DynamoDBLockClient(backend=backend)
+        names   = ['lock.%d' % index for index in range(20)]
+        moved   = [name for name in names if backend.get_previous_shard(name)]
+        self.assertTrue(moved)
+
+        locks = client.acquire_locks(names)
+        self.assertEqual(sorted(names), [lock.name for lock in locks])
+        for name in moved:
+            self.assertEqual(MOVED_OWNER, backend.get_previous_shard(name).retrieve_entry(name)['owner'])
+            self.assertEqual(client.owner, backend.get_shard(name).retrieve_entry(name)['owner'])
+        self.assertTrue(client.release_all_locks())
+
+    def test_grow_shards(self):
+        shards  = create_shards(3)
+        old     = DynamoDBLockClient(backend=DynamoDBLockShardedBackend(shards=shards[:2]))
+        backend = DynamoDBLockShardedBackend(shards=shards, previous=2)
+        new     = DynamoDBLockClient(backend=backend)
+        names   = ['lock.%d' % index for index in range(40)]
+        moved   = [name for name in names if backend.get_previous_shard(name)]
+        held, free = moved[0], moved[1]
+
+        # a lock held in its old shard is still used in place
+        lock = old.acquire_lock(held, no_wait=True)
+        self.assertFalse(new.try_acquire_lock(held))
+        self.assertTrue(new.does_lock_exist(held))
+        self.assertTrue(old.release_lock(lock))
+        self.assertTrue(new.try_acquire_lock(held))
+
+        # a moved name is fenced off for the clients on the old shards
+        self.assertTrue(new.try_acquire_lock(free))
+        self.assertEqual(MOVED_OWNER, old.retrieve_lock(free).owner)
+        self.assertFalse(old.try_acquire_lock(free))
+        self.assertTrue(new.release_all_locks())
+        self.assertTrue(new.try_acquire_lock(free))
+        self.assertTrue(new.release_all_locks())
+
+    def test_moved_names_read_once(self):
+        shards  = [DynamoDBLockTableBackend(table=CountingMemoryTable()) for _ in range(3)]
+        backend = DynamoDBLockShardedBackend(shards=shards, previous=2)
+        client  = DynamoDBLockClient(backend=backend)
+        name    = [name for name in ('lock.%d' % index for index in range(40)) if backend.get_previous_shard(name)][0]
+        current, previous = backend.get_shard(name).table, backend.get_previous_shard(name).table
+
+        # the moved name is fenced off on create, so its updates never read
+        lock  = client.acquire_lock(name, no_wait=True)
+        reads = (len(previous.reads), len(current.reads))
+        lock  = client.touch_lock(lock)
+        self.assertTrue(lock)
+        self.assertTrue(client.release_lock(lock))
+        self.assertEqual(reads, (len(previous.reads), len(current.reads)))
+
+        # another backend learns that the name moved on its first lookup
+        backend = DynamoDBLockShardedBackend(shards=shards, previous=2)
+        reads   = len(previous.reads)
+        for _ in range(3):
+            backend.retrieve_entry(name)
+        backend.retrieve_entries([name])
+        self.assertEqual(reads + 1, len(previous.reads))
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
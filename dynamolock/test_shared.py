@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread
+from datetime import timedelta
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.limiter import DynamoDBLockThrottledError
+from dynamolock.test_support import RacingMemoryTable, create_client
+from dynamolock.shared import SHARED_OWNER
+
+class DynamoDBLockSharedTest(unittest.TestCase):
+
+    def test_shared_readers(self):
+        table   = DynamoDBLockMemoryTable()
+        readers = [create_client(table) for _ in range(3)]
+        writer  = create_client(table)
+        locks   = [reader.acquire_shared('my.lock', no_wait=True) for reader in readers]
+        self.assertTrue(all(locks))
+        self.assertEqual([reader.owner for reader in readers], [lock.owner for lock in locks])
+
+        current = writer.retrieve_lock('my.lock')
+        self.assertEqual(SHARED_OWNER, current.owner)
+        self.assertEqual(set(reader.owner for reader in readers), set(current.readers))
+        self.assertIsNone(writer.try_acquire_lock('my.lock'))
+
+        touched = readers[0].touch_lock(locks[0])
+        self.assertNotEqual(locks[0].readers[readers[0].owner], touched.readers[readers[0].owner])
+        self.assertTrue(readers[0].release_lock(touched))
+        self.assertTrue(readers[1].release_lock(locks[1]))
+        self.assertIsNone(writer.try_acquire_lock('my.lock'))
+        self.assertTrue(readers[2].release_lock(locks[2]))
+
+        lock = writer.try_acquire_lock('my.lock')
+        self.assertIsNone(lock.readers)
+        self.assertIsNone(readers[0].acquire_shared('my.lock', no_wait=True))
+        self.assertTrue(writer.release_lock(lock))
+
+    def test_max_readers(self):
+        table   = DynamoDBLockMemoryTable()
+        readers = [create_client(table, max_readers=2) for _ in range(3)]
+        locks   = [reader.acquire_shared('my.lock', no_wait=True) for reader in readers]
+        self.assertEqual([True, True, False], [bool(lock) for lock in locks])
+
+    def test_writer_preference(self):
+        table  = DynamoDBLockMemoryTable()
+        reader = create_client(table)
+        writer = create_client(table)
+        late   = create_client(table)
+        lock   = reader.acquire_shared('my.lock')
+        result = []
+
+        thread = Thread(target=lambda: result.append(writer.acquire_exclusive('my.lock')))
+        thread.start()
+        time.sleep(0.05)
+        self.assertTrue(any(key.startswith('*') for key in writer.retrieve_lock('my.lock').readers))
+        self.assertIsNone(late.acquire_shared('my.lock', no_wait=True))
+        self.assertTrue(reader.release_lock(lock))
+        thread.join(5)
+
+        self.assertEqual(writer.owner, result[0].owner)
+        self.assertIsNone(writer.retrieve_lock('my.lock').readers)
+        self.assertTrue(writer.release_lock(result[0]))
+
+    def test_dead_reader_expires(self):
+        table  = DynamoDBLockMemoryTable()
+        reader = create_client(table, lock_duration=timedelta(milliseconds=100))
+        writer = create_client(table)
+        self.assertTrue(reader.acquire_shared('my.lock', no_wait=True))
+        reader.locks.clear() # the reader dies without releasing
+
+        lock = writer.acquire_exclusive('my.lock')
+        self.assertEqual(writer.owner, lock.owner)
+        self.assertIsNone(writer.retrieve_lock('my.lock').readers)
+
+    def test_touch_keeps_lease_when_racing(self):
+        table  = RacingMemoryTable()
+        reader = create_client(table)
+        lock   = reader.acquire_shared('my.lock', no_wait=True)
+
+        table.racing = True # every other reader wins the race
+        self.assertRaises(DynamoDBLockThrottledError, reader.touch_lock, lock)
+        self.assertEqual([lock], [kept for kept, _ in reader.worker.renew([lock])])
+        self.assertIs(lock, reader.locks['my.lock'])
+
+        table.racing = False
+        self.assertTrue(reader.touch_lock(lock))
+        self.assertTrue(reader.release_lock(reader.locks['my.lock']))
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+from threading import Thread
+from mock import patch
+from datetime import timedelta
+from dynamolock.sqlite import DynamoDBLockSQLiteBackend
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+
+class DynamoDBLockSQLiteBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend   = DynamoDBLockSQLiteBackend(path=os.path.join(self.directory, 'locks.db'))
+        self.policy    = DynamoDBLockPolicy(acquire_timeout=timedelta(seconds=0))
+        self.client    = DynamoDBLockClient(backend=self.backend, policy=self.policy)
+        self.other     = DynamoDBLockClient(backend=self.backend, policy=self.policy)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_acquire_and_release(self):
+        lock = self.client.acquire_lock('my.lock', payload={'key': 'value'})
+        self.assertIsNotNone(lock)
+        self.assertIsNone(self.other.try_acquire_lock('my.lock'))
+        self.assertEqual({'key': 'value'}, self.other.retrieve_lock('my.lock').payload)
+
+        new_lock = self.client.touch_lock(lock)
+        self.assertIsNotNone(new_lock)
+        self.assertIsNone(self.client.touch_lock(lock))
+        self.assertFalse(self.client.release_lock(lock))
+        self.assertTrue(self.client.release_lock(new_lock))
+        self.assertIsNotNone(self.other.try_acquire_lock('my.lock'))
+
+    def test_release_without_delete(self):
+        lock = self.client.acquire_lock('my.lock')
+        self.assertTrue(self.client.release_lock(lock, delete=False))
+        self.assertIsNotNone(self.backend.retrieve_entry('my.lock'))
+        self.assertFalse(self.client.does_lock_exist('my.lock'))
+        self.assertIsNotNone(self.other.try_acquire_lock('my.lock'))
+
+    def test_try_acquire_any(self):
+        names = ['partition.%d' % index for index in range(1200)]
+        held  = self.other.try_acquire_any(names, limit=1000)
+        locks = self.client.try_acquire_any(names, limit=1000)
+        self.assertEqual(1000, len(held))
+        self.assertEqual(200, len(locks))
+
+    def test_counter_versions(self):
+        policy = DynamoDBLockPolicy(versioning='counter')
+        client = DynamoDBLockClient(backend=self.backend, policy=policy)
+        lock   = client.touch_lock(client.acquire_lock('my.lock'))
+        self.assertEqual(2, lock.version)
+        self.assertEqual(2, self.backend.retrieve_entry('my.lock')['version'])
+        self.assertTrue(client.release_lock(lock))
+
+    def test_concurrent_create(self):
+        clients = [DynamoDBLockClient(backend=self.backend, policy=self.policy) for _ in range(8)]
+        locks   = []
+        threads = [Thread(target=lambda c=c: locks.append(c.try_acquire_lock('my.lock'))) for c in clients]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(1, len([lock for lock in locks if lock]))
+
+    def test_transact_entries(self):
+        lock = self.other.acquire_lock('lock.2')
+        self.assertIsNone(self.client.acquire_locks(['lock.1', 'lock.2'], no_wait=True))
+        self.assertIsNone(self.backend.retrieve_entry('lock.1'))
+        self.assertTrue(self.other.release_lock(lock, delete=False))
+
+        locks = self.client.acquire_locks(['lock.1', 'lock.2'], no_wait=True)
+        self.assertEqual([self.client.owner] * 2, [lock.owner for lock in locks])
+        self.assertEqual(self.client.owner, self.backend.retrieve_entry('lock.2')['owner'])
+
+    def test_transact_rolls_back_on_error(self):
+        writes = [
+            ('x', { 'owner': 'owner', 'version': 'v1', 'duration': 1000, 'is_locked': True }, None),
+            ('y', { 'owner': 'owner' }, { 'name': 'y', 'version': 'v0' }),
+        ]
+        with patch.object(self.backend, 'update_entry', side_effect=RuntimeError("failed")):
+            self.assertRaises(RuntimeError, self.backend.transact_entries, writes)
+        self.assertIsNone(self.backend.retrieve_entry('x'))
+        self.assertTrue(self.client.acquire_lock('x', no_wait=True)) # not left in a transaction
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
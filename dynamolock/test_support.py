@@ -0,0 +1,91 @@
+'''
+The helpers shared by the tests: a factory of clients with a quick
+policy, and in-memory tables that count, throttle, or race the requests
+made to them.
+'''
+import uuid
+from datetime import timedelta
+from boto.dynamodb2.exceptions import ProvisionedThroughputExceededException
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+POLICY_PARAMS = ('acquire_timeout', 'retry_period', 'lock_duration', 'delete_lock', 'wait_for_expiry',
+    'versioning', 'backoff', 'throttle_retries', 'throttle_backoff', 'clock', 'lease_margin', 'takeover_margin')
+
+#--------------------------------------------------------------------------------
+# helpers
+#--------------------------------------------------------------------------------
+
+def create_client(table, client_class=DynamoDBLockClient, **kwargs):
+    ''' Create a client of the supplied table with a quick policy,
+    any of whose parameters may be supplied along with those of the
+    client.
+    '''
+    params = {
+        'acquire_timeout': timedelta(seconds=2),
+        'retry_period':    timedelta(milliseconds=5),
+        'lock_duration':   timedelta(seconds=2),
+    }
+    params.update((key, kwargs.pop(key)) for key in POLICY_PARAMS if key in kwargs)
+    return client_class(table=table, policy=DynamoDBLockPolicy(**params), **kwargs)
+
+#--------------------------------------------------------------------------------
+# tables
+#--------------------------------------------------------------------------------
+
+class CountingMemoryTable(DynamoDBLockMemoryTable):
+    ''' Records the consistency of every read.
+    '''
+
+    def __init__(self, **kwargs):
+        super(CountingMemoryTable, self).__init__(**kwargs)
+        self.reads = []
+
+    def get_item(self, consistent=False, **kwargs):
+        self.reads.append(consistent)
+        return super(CountingMemoryTable, self).get_item(consistent=consistent, **kwargs)
+
+class ThrottlingMemoryTable(DynamoDBLockMemoryTable):
+    ''' Throttles the next `throttles` reads and updates.
+    '''
+
+    def __init__(self, **kwargs):
+        super(ThrottlingMemoryTable, self).__init__(**kwargs)
+        self.throttles = 0
+
+    def get_item(self, **kwargs):
+        self._throttle()
+        return super(ThrottlingMemoryTable, self).get_item(**kwargs)
+
+    def _update_item(self, *args, **kwargs):
+        self._throttle()
+        return super(ThrottlingMemoryTable, self)._update_item(*args, **kwargs)
+
+    def _throttle(self):
+        if self.throttles:
+            self.throttles -= 1
+            raise ProvisionedThroughputExceededException(400, "Bad Request", {
+                '__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+                'message': 'The level of configured provisioned throughput for the table was exceeded',
+            })
+
+class RacingMemoryTable(DynamoDBLockMemoryTable):
+    ''' Changes the version of an entry right before every update
+    of it while `racing`, as a busy reader would.
+    '''
+
+    def __init__(self, **kwargs):
+        super(RacingMemoryTable, self).__init__(**kwargs)
+        self.racing = False
+
+    def _update_item(self, key, *args, **kwargs):
+        if self.racing:
+            with self._mutex:
+                item = self.items.get(self._get_key(key))
+                if item: item[self.schema.version] = uuid.uuid4().hex
+        return super(RacingMemoryTable, self)._update_item(key, *args, **kwargs)
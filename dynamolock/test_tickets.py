@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread, Lock
+from functools import partial
+from datetime import timedelta
+from boto.dynamodb2.exceptions import ConditionalCheckFailedException
+from dynamolock import test_support
+from dynamolock.memory import DynamoDBLockMemoryTable
+
+create_client = partial(test_support.create_client, fair=True, acquire_timeout=timedelta(seconds=3))
+
+class StuckTailTable(DynamoDBLockMemoryTable):
+
+    def __init__(self):
+        DynamoDBLockMemoryTable.__init__(self)
+        self.tail_updates = 0
+
+    def _update_item(self, key, *args, **kwargs):
+        if self._get_key(key).endswith('#tail'):
+            self.tail_updates += 1
+            raise ConditionalCheckFailedException(400, "Bad Request", {
+                '__type': 'com.amazonaws.dynamodb.v20120810#ConditionalCheckFailedException',
+                'message': 'The conditional request failed',
+            })
+        return DynamoDBLockMemoryTable._update_item(self, key, *args, **kwargs)
+
+class DynamoDBLockTicketsTest(unittest.TestCase):
+
+    def test_fifo_order(self):
+        table   = DynamoDBLockMemoryTable()
+        holder  = create_client(table)
+        lock    = holder.acquire_lock('my.lock')
+        order, mutex = [], Lock()
+
+        def waiter(index):
+            client = create_client(table)
+            lock   = client.acquire_lock('my.lock')
+            with mutex: order.append(index)
+            time.sleep(0.01)
+            client.release_lock(lock)
+
+        threads = []
+        for index in range(4):
+            threads.append(Thread(target=waiter, args=(index,)))
+            threads[-1].start()
+            time.sleep(0.05) # take the tickets in order
+
+        self.assertTrue(holder.release_lock(lock))
+        for thread in threads: thread.join(5)
+        self.assertEqual([0, 1, 2, 3], order)
+        self.assertEqual(5, holder.backend.retrieve_entry('__queue__/my.lock#head')['version'])
+        self.assertEqual(['__queue__/my.lock#head', '__queue__/my.lock#tail'], sorted(table.items)) # no tickets left
+
+    def test_direct_handoff(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table)
+        waiter = create_client(table)
+        lock   = holder.acquire_lock('my.lock')
+        result = []
+
+        thread = Thread(target=lambda: result.append(waiter.acquire_lock('my.lock')))
+        thread.start()
+        time.sleep(0.05)
+        self.assertTrue(holder.release_lock(lock))
+        thread.join(5)
+
+        self.assertEqual(waiter.owner, result[0].owner)
+        self.assertTrue(result[0].is_locked)
+        self.assertEqual([], holder.locks.keys())
+        self.assertTrue(waiter.release_lock(result[0]))
+
+    def test_skip_abandoned_ticket(self):
+        table   = DynamoDBLockMemoryTable()
+        holder  = create_client(table)
+        quitter = create_client(table, acquire_timeout=timedelta(milliseconds=50))
+        waiter  = create_client(table)
+        lock    = holder.acquire_lock('my.lock')
+        result  = []
+
+        self.assertIsNone(quitter.acquire_lock('my.lock'))
+        self.assertFalse('__queue__/my.lock#ticket.2' in table.items)
+        thread = Thread(target=lambda: result.append(waiter.acquire_lock('my.lock')))
+        thread.start()
+        time.sleep(0.05)
+        self.assertTrue(holder.release_lock(lock))
+        thread.join(5)
+        self.assertEqual(waiter.owner, result[0].owner)
+
+    def test_take_ticket_gives_up(self):
+        table  = StuckTailTable()
+        holder = create_client(table)
+        waiter = create_client(table, acquire_timeout=timedelta(milliseconds=100))
+        self.assertTrue(holder.acquire_lock('my.lock'))
+
+        start = time.time()
+        self.assertIsNone(waiter.acquire_lock('my.lock'))
+        self.assertTrue(time.time() - start < 1)
+        self.assertTrue(1 < table.tail_updates < 40)
+
+    def test_delete_dead_ticket(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table)
+        dead   = create_client(table, lock_duration=timedelta(milliseconds=50))
+        waiter = create_client(table)
+        lock   = holder.acquire_lock('my.lock')
+        self.assertTrue(dead.queue._take_ticket(dead._start_acquire('my.lock')))
+        self.assertIn('__queue__/my.lock#ticket.2', table.items)
+        result = []
+
+        thread = Thread(target=lambda: result.append(waiter.acquire_lock('my.lock')))
+        thread.start()
+        time.sleep(0.2)
+        self.assertNotIn('__queue__/my.lock#ticket.2', table.items)
+        self.assertTrue(holder.release_lock(lock))
+        thread.join(5)
+        self.assertEqual(waiter.owner, result[0].owner)
+
+    def test_keep_live_ticket_with_counter_versions(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, versioning='counter')
+        first  = create_client(table, versioning='counter', lock_duration=timedelta(milliseconds=50))
+        second = create_client(table, versioning='counter')
+        lock   = holder.acquire_lock('my.lock')
+        order, mutex = [], Lock()
+
+        def waiter(client):
+            lock = client.acquire_lock('my.lock')
+            with mutex: order.append(client)
+            client.release_lock(lock)
+
+        threads = [Thread(target=waiter, args=(client,)) for client in (first, second)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05) # take the tickets in order
+        time.sleep(0.2) # a few leases of the first ticket
+        self.assertIn('__queue__/my.lock#ticket.2', table.items)
+        self.assertTrue(holder.release_lock(lock))
+        for thread in threads: thread.join(5)
+        self.assertEqual([first, second], order)
+
+    def test_keep_holder_ticket_alive(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table, lock_duration=timedelta(milliseconds=100))
+        waiter = create_client(table)
+        holder.startup()
+        holder.acquire_lock('my.lock')
+        result = []
+
+        thread = Thread(target=lambda: result.append(waiter.acquire_lock('my.lock')))
+        thread.start()
+        time.sleep(0.4) # a few leases of the holder
+        self.assertIn('__queue__/my.lock#ticket.1', table.items)
+        self.assertTrue(holder.release_lock(holder.locks['my.lock']))
+        thread.join(5)
+        self.assertEqual(waiter.owner, result[0].owner)
+        holder.shutdown()
+
+    def test_renew_ticket_within_backoff(self):
+        table   = DynamoDBLockMemoryTable()
+        holder  = create_client(table)
+        slow    = create_client(table, lock_duration=timedelta(milliseconds=100), retry_period=timedelta(milliseconds=300))
+        waiter  = create_client(table)
+        lock    = holder.acquire_lock('my.lock')
+
+        threads = [Thread(target=client.acquire_lock, args=('my.lock',)) for client in (slow, waiter)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05) # take the tickets in order
+        time.sleep(0.3) # a few leases of the slow ticket
+        self.assertIn('__queue__/my.lock#ticket.2', table.items)
+        self.assertTrue(holder.release_lock(lock))
+        for thread in threads: thread.join(5)
+
+    def test_queue_entries_not_acquirable(self):
+        table  = DynamoDBLockMemoryTable()
+        holder = create_client(table)
+        plain  = test_support.create_client(table)
+        self.assertTrue(holder.acquire_lock('my.lock'))
+        entries = ['__queue__/my.lock#head', '__queue__/my.lock#tail', '__queue__/my.lock#ticket.1']
+        self.assertEqual(entries + ['my.lock'], sorted(table.items))
+
+        for name in entries:
+            self.assertIsNone(plain.acquire_lock(name, no_wait=True))
+            self.assertIsNone(plain.acquire_shared(name, no_wait=True))
+        self.assertEqual([], plain.try_acquire_any(entries))
+        self.assertEqual(1, holder.backend.retrieve_entry('__queue__/my.lock#tail')['version'])
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Thread
+from datetime import timedelta
+from boto.dynamodb2.types import Dynamizer
+from dynamolock.memory import DynamoDBLockMemoryTable
+from dynamolock.policy import DynamoDBLockPolicy
+from dynamolock.client import DynamoDBLockClient
+from dynamolock.watcher import DynamoDBLockWatcher, DynamoDBLockLocalFeed, DynamoDBLockStreamFeed
+
+class FakeStreamsConnection(object):
+
+    def __init__(self, records):
+        self.records = records
+
+    def describe_stream(self, stream_arn, exclusive_start_shard_id=None):
+        return { 'StreamDescription': { 'Shards': [{ 'ShardId': 'shard-1', 'SequenceNumberRange': {} }] } }
+
+    def get_shard_iterator(self, stream_arn, shard_id, shard_iterator_type):
+        return { 'ShardIterator': 'iterator-0' }
+
+    def get_records(self, shard_iterator, limit=None):
+        records, self.records = self.records, []
+        return { 'Records': records, 'NextShardIterator': 'iterator-1' }
+
+def create_watcher(table):
+    watcher = DynamoDBLockWatcher(feed=DynamoDBLockLocalFeed(table=table))
+    watcher.start()
+    return watcher
+
+class DynamoDBLockWatcherTest(unittest.TestCase):
+
+    def test_watch_changes(self):
+        table   = DynamoDBLockMemoryTable()
+        watcher = create_watcher(table)
+        client  = DynamoDBLockClient(table=table)
+        changes = []
+        watcher.watch('my.lock', changes.append)
+
+        lock = client.acquire_lock('my.lock')
+        client.acquire_lock('other.lock')
+        client.release_lock(lock, delete=False)
+        self.assertEqual(['insert', 'modify'], [change.event for change in changes])
+        self.assertEqual([False, True], [change.is_released for change in changes])
+        self.assertEqual(client.owner, changes[0].lock.owner)
+
+        watcher.unwatch('my.lock', changes.append)
+        watcher.stop()
+        client.release_all_locks()
+        self.assertEqual(2, len(changes))
+        self.assertEqual({}, watcher.callbacks)
+
+    def test_wake_acquire_on_release(self):
+        table   = DynamoDBLockMemoryTable()
+        watcher = create_watcher(table)
+        policy  = DynamoDBLockPolicy(retry_period=timedelta(seconds=5), lock_duration=timedelta(seconds=10))
+        holder  = DynamoDBLockClient(table=table, policy=policy)
+        waiter  = DynamoDBLockClient(table=table, policy=policy, watcher=watcher)
+        lock    = holder.acquire_lock('my.lock')
+        result  = []
+
+        thread = Thread(target=lambda: result.append(waiter.acquire_lock('my.lock')))
+        thread.start()
+        time.sleep(0.05)
+        start = time.time()
+        holder.release_lock(lock)
+        thread.join(5)
+
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(waiter.owner, result[0].owner)
+        self.assertEqual({}, watcher.callbacks)
+
+    def test_stream_feed(self):
+        dynamizer = Dynamizer()
+        image     = { 'N': 'my.lock', 'O': 'owner', 'L': False, 'V': '2', 'D': 1000 }
+        records   = [
+            { 'eventName': 'MODIFY', 'dynamodb': { 'Keys': { 'N': dynamizer.encode('my.lock') },
+                'NewImage': { key : dynamizer.encode(value) for key, value in image.items() } } },
+            { 'eventName': 'REMOVE', 'dynamodb': { 'Keys': { 'N': dynamizer.encode('my.lock') } } },
+        ]
+        feed    = DynamoDBLockStreamFeed(stream_arn='arn', connection=FakeStreamsConnection(records))
+        watcher = DynamoDBLockWatcher(feed=feed)
+        changes = []
+        watcher.watch('my.lock', changes.append)
+        feed._refresh_shards('LATEST')
+
+        self.assertEqual(2, feed.poll(watcher))
+        self.assertEqual(['modify', 'remove'], [change.event for change in changes])
+        self.assertEqual('owner', changes[0].lock.owner)
+        self.assertIsNone(changes[1].lock)
+        self.assertEqual({ 'shard-1': 'iterator-1' }, feed.iterators)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
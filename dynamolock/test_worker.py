@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+import time
+import unittest
+from threading import Lock
+from dynamolock.lock import DynamoDBLock
+from dynamolock.worker import DynamoDBLockWorker
+
+class MockLockClient(object):
+
+    def __init__(self, failing=()):
+        self.locks   = {}
+        self.failing = set(failing)
+        self.touched = []
+        self.mutex   = Lock()
+
+    def touch_lock(self, lock):
+        with self.mutex: self.touched.append(lock.name)
+        if lock.name in self.failing: return None
+        return lock._replace(timestamp=long(time.time() * 1000))
+
+def create_lock(name):
+    return DynamoDBLock(name=name, version='1', owner='owner', duration=1000,
+        timestamp=0, is_locked=True, payload=None)
+
+class DynamoDBLockWorkerTest(unittest.TestCase):
+
+    def test_worker_sweep(self):
+        client = MockLockClient(failing=['lock.3', 'lock.7'])
+        for index in range(20):
+            client.locks['lock.%d' % index] = create_lock('lock.%d' % index)
+        worker = DynamoDBLockWorker(client=client, concurrency=4)
+        sweep  = worker.sweep()
+
+        self.assertEqual(20, sweep.count)
+        self.assertEqual(2, sweep.failures)
+        self.assertEqual(sweep, worker.last_sweep)
+        self.assertEqual(20, len(client.touched))
+        self.assertEqual(18, len(client.locks))
+        self.assertNotIn('lock.3', client.locks)
+
+    def test_worker_sweep_serial(self):
+        client = MockLockClient()
+        client.locks['lock'] = create_lock('lock')
+        worker = DynamoDBLockWorker(client=client, concurrency=1)
+        sweep  = worker.sweep()
+
+        self.assertEqual((1, 0), (sweep.count, sweep.failures))
+        self.assertEqual(['lock'], client.touched)
+
+    def test_worker_renewal_deadline(self):
+        client = MockLockClient()
+        worker = DynamoDBLockWorker(client=client, renew_ratio=0.5, jitter=0.1)
+        for _ in range(100):
+            deadline = worker.get_renewal_deadline(create_lock('lock'))
+            self.assertTrue(450 <= deadline <= 500)
+
+        worker = DynamoDBLockWorker(client=client, renew_ratio=0.5, jitter=0, period=0.1)
+        self.assertEqual(100, worker.get_renewal_deadline(create_lock('lock')))
+
+    def test_worker_schedule(self):
+        client = MockLockClient()
+        worker = DynamoDBLockWorker(client=client, jitter=0)
+        client.locks['lock.1'] = create_lock('lock.1')
+        client.locks['lock.2'] = create_lock('lock.2')._replace(timestamp=10 ** 15)
+        worker.schedule(client.locks['lock.1'])
+        worker.schedule(client.locks['lock.2'])
+        worker.schedule(client.locks['lock.1']) # replaces the earlier schedule
+
+        self.assertEqual([client.locks['lock.1']], worker._get_due_locks())
+        self.assertEqual({('owner', 'lock.2')}, set(worker._deadlines))
+
+    def test_worker_thread(self):
+        client = MockLockClient()
+        worker = DynamoDBLockWorker(client=client, jitter=0)
+        worker.start()
+        lock = create_lock('lock')._replace(timestamp=worker.policy.get_new_timestamp(), duration=30)
+        client.locks['lock'] = lock
+        worker.schedule(lock)
+        time.sleep(0.1)
+        worker.stop(timeout=1)
+
+        self.assertFalse(worker.is_alive())
+        self.assertTrue(1 <= len(client.touched) <= 20) # every 10 ms
+
+    def test_worker_stop_wakes(self):
+        client = MockLockClient()
+        worker = DynamoDBLockWorker(client=client)
+        worker.start()
+        client.locks['lock'] = create_lock('lock')._replace(timestamp=10 ** 15)
+        worker.schedule(client.locks['lock'])
+        time.sleep(0.05)
+        start = time.time()
+        worker.stop(timeout=5)
+
+        self.assertFalse(worker.is_alive())
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual([], worker._get_due_locks())
+        self.assertEqual([], client.touched)
+
+#---------------------------------------------------------------------------#
+# main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
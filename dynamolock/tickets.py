@@ -0,0 +1,463 @@
+'''
+The ticket queue makes the acquire of a contended lock fair. Instead of
+every waiter polling the lock entry and the fastest poller winning after
+each release, every waiter takes a numbered ticket in the lock table and
+polls only the ticket in front of it. Only the waiter at the front of
+the queue polls the lock itself, and a release hands the lock directly
+to the next ticket::
+
+    client = DynamoDBLockClient(fair=True)
+
+Each lock name uses a few extra entries next to the lock entry, which
+are kept in the `__queue__/` namespace that no client may acquire:
+
+* `__queue__/<name>#tail` - the last ticket that was handed out
+* `__queue__/<name>#head` - the ticket of the last waiter to acquire the lock
+* `__queue__/<name>#ticket.<n>` - the entry of the waiter holding ticket n
+
+A release hands the lock over by rewriting its owner to the identity of
+the next ticket (`<owner>#<n>`), which the waiter then claims as its
+own. A waiter that gives up deletes its ticket and is skipped, and the
+ticket of a waiter that died is skipped (and deleted) once it has not
+been renewed for a whole lease. The ticket of the holder is renewed by
+the heartbeat along with its lock. If the next ticket never claims its lock,
+the lock simply expires and is taken over by the normal protocol, so the
+queue can never hold a lock for longer than a lease.
+
+Every client contending for a name should use the fair mode, as a normal
+acquire does not queue (and neither does a `no_wait` or async acquire).
+'''
+import uuid
+from time import sleep
+from threading import Lock
+
+from .limiter import DynamoDBLockThrottledError
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# constants
+#--------------------------------------------------------------------------------
+
+QUEUE_PREFIX = '__queue__/' # the namespace of the queue entries
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockTicket(object):
+    ''' The state of a single ticket that a waiter holds in the
+    queue of a lock name.
+    '''
+
+    __slots__ = ('name', 'number', 'entry', 'renewed', 'previous')
+
+    def __init__(self, name, number, entry, renewed):
+        ''' Initialize a new instance of the DynamoDBLockTicket class
+
+        :param name: The name of the lock the ticket is for
+        :param number: The number of the ticket in the queue
+        :param entry: The current entry of the ticket
+        :param renewed: The timestamp the ticket was last renewed at
+        '''
+        self.name     = name
+        self.number   = number
+        self.entry    = entry
+        self.renewed  = renewed
+        self.previous = number - 1 # the ticket we are waiting behind
+
+
+class DynamoDBLockTicketQueue(object):
+    ''' The fair FIFO queues of the lock names acquired by a
+    single lock client.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockTicketQueue class
+
+        :param client: The lock client to queue the acquires of
+        '''
+        self.client  = kwargs.get('client')
+        self.tickets = {}  # name -> ticket of the held lock
+        self._mutex  = Lock()
+
+    def acquire(self, attempt, **params):
+        ''' Drive the supplied acquire attempt through the queue of
+        its lock name until it either acquires the lock or gives up.
+
+        All the supplied params that are applicable are passed on
+        to the underlying operation.
+
+        :param attempt: The acquire attempt to drive
+        :returns: The acquired lock on success, or None
+        '''
+        try:
+            ticket = self._take_ticket(attempt)
+        except DynamoDBLockThrottledError:
+            _logger.debug("throttled taking a ticket for lock: %s", attempt.name)
+            return None
+        if not ticket: return None
+
+        lock = None
+        try:
+            lock = self._wait(attempt, ticket, **params)
+        finally:
+            if not lock: lock = self._cancel(ticket, **params)
+
+        if lock:
+            with self._mutex:
+                self.tickets[lock.name] = ticket
+            self._advance_head(ticket)
+        return lock
+
+    def release(self, lock, **params):
+        ''' Hand the supplied lock directly to the next live ticket
+        in its queue, if it was acquired through the queue and there
+        is anyone waiting.
+
+        :param lock: The valid lock to hand over
+        :returns: True if handed over, False if we lost the lock, None if no one is waiting
+        '''
+        with self._mutex:
+            ticket = self.tickets.get(lock.name)
+        if not ticket: return None
+
+        tail = self._get_counter(lock.name, 'tail')
+        for number in range(ticket.number + 1, tail + 1):
+            entry = self._read(self._get_key(lock.name, 'ticket.%d' % number))
+            if not entry: continue # that waiter gave up
+
+            update = dict(params, owner=self._get_grant(entry['owner'], number), is_locked=True)
+            if not self.client._update_entry(lock, update=update):
+                return False
+            _logger.debug("handed lock %s to ticket %d", lock.name, number)
+            return True
+        return None
+
+    def touch(self, lock):
+        ''' Renew the ticket of the supplied held lock along with the
+        lock, so that the waiters behind it never take it for dead. Its
+        lease is stretched to that of the lock, which the heartbeat
+        renews well within.
+
+        :param lock: The renewed lock
+        '''
+        with self._mutex:
+            ticket = self.tickets.get(lock.name)
+        try:
+            if ticket: self._renew_ticket(ticket, long(lock.duration))
+        except DynamoDBLockThrottledError:
+            _logger.debug("throttled renewing the ticket of lock: %s", lock.name)
+
+    def forget(self, name):
+        ''' Remove the ticket of the supplied released lock, which
+        lets the next waiter in the queue know that it is its turn.
+
+        :param name: The name of the released lock
+        '''
+        with self._mutex:
+            ticket = self.tickets.pop(name, None)
+        try:
+            if ticket: self._delete_ticket(ticket)
+        except DynamoDBLockThrottledError:
+            _logger.debug("throttled leaving the queue of lock: %s", name) # skipped after a lease
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _wait(self, attempt, ticket, **params):
+        ''' Wait in the queue with the supplied ticket until it is
+        handed the lock, or it reaches the front of the queue and can
+        acquire the lock by the normal protocol.
+
+        :param attempt: The acquire attempt to drive
+        :param ticket: The ticket we are waiting with
+        :returns: The acquired lock on success, or None
+        '''
+        client  = self.client
+        name    = attempt.name
+        watched = {} # number -> (version, first seen timestamp)
+
+        while client._is_acquiring(attempt):
+            tries = attempt.tries
+            try:
+                created_lock = self._try_wait(attempt, ticket, watched, **params)
+                if created_lock:
+                    return created_lock
+            except DynamoDBLockThrottledError:
+                _logger.debug("throttled waiting with ticket %d for lock: %s", ticket.number, name)
+                attempt.tries = max(attempt.tries, tries + 1) # count it as a try
+
+            if client._is_acquiring(attempt):
+                delay = min(client._get_acquire_delay(attempt), self._get_renewal_delay(ticket))
+                _logger.debug("waiting %d ms with ticket %d for lock %s", delay, ticket.number, name)
+                sleep(delay / 1000.0)
+                attempt.waited_time += delay
+
+        return None
+
+    def _try_wait(self, attempt, ticket, watched, **params):
+        ''' Make a single try at acquiring the lock for the supplied
+        ticket, updating the ticket with where it is in the queue.
+
+        :param attempt: The acquire attempt to make a try for
+        :param ticket: The ticket we are waiting with
+        :param watched: The observed (version, timestamp) by ticket number
+        :returns: The acquired lock on success, or None
+        '''
+        client, name = self.client, attempt.name
+        self._renew_ticket(ticket)
+
+        # ------------------------------------------------------------
+        # Case 1:
+        # ------------------------------------------------------------
+        # Find the closest waiter in front of us that is still in the
+        # queue, skipping those that gave up or stopped renewing their
+        # ticket, but never walking past the last ticket to acquire the
+        # lock. If there is one, we only poll its ticket until it is
+        # gone, which is O(1) reads per waiter for any queue length.
+        # ------------------------------------------------------------
+        while ticket.previous > 0:
+            previous = ticket.previous
+            entry = self._read(self._get_key(name, 'ticket.%d' % previous))
+            if entry and not self._is_ticket_dead(watched, previous, entry):
+                break
+            if entry: self._delete_dead_ticket(watched, previous, entry)
+            head = self._get_counter(name, 'head')
+            ticket.previous = previous - 1 if previous > head else 0
+
+        if ticket.previous > 0:
+            attempt.tries += 1
+
+        # ------------------------------------------------------------
+        # Case 2:
+        # ------------------------------------------------------------
+        # We are at the front of the queue, so either the lock was
+        # handed to us and we can claim it, or we contend for it by
+        # the normal protocol (which also takes over a lock that was
+        # handed to a waiter that never claimed it).
+        # ------------------------------------------------------------
+        else:
+            current_lock = client._retrieve_entry(name)
+            if current_lock and current_lock.owner == self._get_grant(client.owner, ticket.number):
+                created_lock = self._claim(attempt, current_lock, **params)
+            else: created_lock = client._acquire_entry(attempt, current_lock, **params)
+            return created_lock
+        return None
+
+    def _cancel(self, ticket, **params):
+        ''' Leave the queue after giving up on the lock. If the lock
+        was handed to us while we were leaving we claim it anyway, as
+        it would otherwise be stuck until its lease ran out.
+
+        :param ticket: The ticket to leave the queue with
+        :returns: The lock if it was handed to us, None otherwise
+        '''
+        try:
+            self._delete_ticket(ticket)
+            current_lock = self.client._retrieve_entry(ticket.name)
+            if current_lock and current_lock.owner == self._get_grant(self.client.owner, ticket.number):
+                attempt = self.client._start_acquire(ticket.name, no_wait=True)
+                return self._claim(attempt, current_lock, **params)
+        except DynamoDBLockThrottledError:
+            _logger.debug("throttled leaving the queue of lock: %s", ticket.name)
+        return None
+
+    def _claim(self, attempt, current_lock, **params):
+        ''' Claim the supplied lock that was handed to our ticket
+        as our own.
+
+        :param attempt: The acquire attempt that was handed the lock
+        :param current_lock: The handed over lock entry
+        :returns: The claimed lock on success, or None
+        '''
+        attempt.tries += 1
+        params.update(self.client._get_takeover_params(**params))
+        created_lock = self.client._update_entry(current_lock, update=params)
+        if created_lock:
+            _logger.debug("claimed handed over lock %s", attempt.name)
+            self.client._hold_lock(created_lock)
+        return created_lock
+
+    def _take_ticket(self, attempt):
+        ''' Take the next ticket in the queue of the lock of the
+        supplied attempt and add its entry to the queue. The ticket
+        versions are always random, as they only show that the waiter
+        is alive and must change on every renewal. Every lost
+        race for the tail (or for the ticket entry) counts as a try of
+        the attempt and is retried after the policy backoff, so we
+        give up with the attempt.
+
+        :param attempt: The acquire attempt to take a ticket for
+        :returns: The ticket that we took, or None if we gave up
+        '''
+        client, name = self.client, attempt.name
+        key = self._get_key(name, 'tail')
+        while client._is_acquiring(attempt):
+            number = self._next_ticket(key)
+            if number:
+                entry = {
+                    'name':      self._get_key(name, 'ticket.%d' % number),
+                    'owner':     client.owner,
+                    'version':   uuid.uuid4().hex,
+                    'duration':  client.policy.lock_duration,
+                    'is_locked': True,
+                }
+                if client._call_backend('put', client.backend.create_entry, entry):
+                    return DynamoDBLockTicket(name, number, entry, client.policy.get_new_timestamp())
+                _logger.warning("ticket %d of lock %s already exists, taking another", number, name)
+
+            attempt.tries += 1
+            if client._is_acquiring(attempt):
+                delay = client._get_acquire_delay(attempt)
+                _logger.debug("waiting %d ms to take a ticket for lock %s", delay, name)
+                sleep(delay / 1000.0)
+                attempt.waited_time += delay
+        return None
+
+    def _next_ticket(self, key):
+        ''' Make a single try at advancing the supplied tail counter
+        of a queue.
+
+        :param key: The key of the tail counter
+        :returns: The number of the ticket we took, or None if we lost the race
+        '''
+        client = self.client
+        entry  = self._read(key)
+        if not entry:
+            record = { 'name': key, 'owner': client.owner, 'version': 1, 'duration': 0, 'is_locked': False }
+            return 1 if client._call_backend('put', client.backend.create_entry, record) else None
+
+        number = long(entry['version']) + 1
+        expect = { 'name': key, 'version': entry['version'] }
+        if client._call_backend('update', client.backend.update_entry, key, { 'version': number }, expect):
+            return number
+        return None
+
+    def _renew_ticket(self, ticket, duration=None):
+        ''' Renew the entry of the supplied ticket once half of its
+        lease has passed, so the waiters behind us know we are alive.
+
+        :param ticket: The ticket to renew
+        :param duration: The new lease of the ticket to renew it with now (default wait)
+        '''
+        client = self.client
+        now    = client.policy.get_new_timestamp()
+        if duration is None and now - ticket.renewed < ticket.entry['duration'] // 2:
+            return
+
+        update  = { 'version': uuid.uuid4().hex }
+        if duration is not None: update['duration'] = duration
+        expect  = { 'name': ticket.entry['name'], 'version': ticket.entry['version'] }
+        if client._call_backend('update', client.backend.update_entry, expect['name'], update, expect):
+            ticket.entry = dict(ticket.entry, **update)
+        ticket.renewed = now
+
+    def _get_renewal_delay(self, ticket):
+        ''' Retrieve the time until the supplied waiting ticket is
+        due to be renewed, so that a long backoff never sleeps through
+        a renewal.
+
+        :param ticket: The ticket we are waiting with
+        :returns: The time until the renewal in milliseconds
+        '''
+        due = ticket.renewed + long(ticket.entry['duration']) // 2
+        return max(due - self.client.policy.get_new_timestamp(), 0)
+
+    def _delete_ticket(self, ticket):
+        ''' Remove the entry of the supplied ticket from its queue.
+
+        :param ticket: The ticket to remove
+        '''
+        expect = { 'name': ticket.entry['name'], 'version': ticket.entry['version'] }
+        self.client._call_backend('delete', self.client.backend.delete_entry, expect['name'], expect)
+
+    def _delete_dead_ticket(self, watched, number, entry):
+        ''' Remove the entry of the supplied dead ticket from its
+        queue, unless its waiter renewed it after all.
+
+        :param watched: The observed (version, timestamp) by ticket number
+        :param number: The number of the dead ticket
+        :param entry: The current entry of the dead ticket
+        '''
+        expect = { 'name': entry['name'], 'version': entry['version'] }
+        if self.client._call_backend('delete', self.client.backend.delete_entry, expect['name'], expect):
+            _logger.debug("deleted dead ticket %s", entry['name'])
+        watched.pop(number, None)
+
+    def _advance_head(self, ticket):
+        ''' Record that the supplied ticket acquired its lock, so
+        that the waiters behind it never walk past it.
+
+        :param ticket: The ticket that acquired its lock
+        '''
+        client, key = self.client, self._get_key(ticket.name, 'head')
+        entry = self._read(key)
+        if not entry:
+            record = { 'name': key, 'owner': client.owner, 'version': ticket.number, 'duration': 0, 'is_locked': False }
+            client._call_backend('put', client.backend.create_entry, record)
+        elif long(entry['version']) < ticket.number:
+            expect = { 'name': key, 'version': entry['version'] }
+            client._call_backend('update', client.backend.update_entry, key, { 'version': ticket.number }, expect)
+
+    def _is_ticket_dead(self, watched, number, entry):
+        ''' Check if the waiter of the supplied ticket has stopped
+        renewing it for a whole lease, as observed by our own clock.
+
+        :param watched: The observed (version, timestamp) by ticket number
+        :param number: The number of the ticket
+        :param entry: The current entry of the ticket
+        :returns: True if the ticket is dead, False otherwise
+        '''
+        policy = self.client.policy
+        now    = policy.get_new_timestamp()
+        seen   = watched.get(number)
+        if not seen or seen[0] != entry['version']:
+            watched[number] = (entry['version'], now)
+            return False
+        return now - seen[1] > long(entry['duration']) + policy.takeover_margin
+
+    def _get_counter(self, name, counter):
+        ''' Retrieve the current value of the named queue counter.
+
+        :param name: The name of the lock of the queue
+        :param counter: The name of the counter, `head` or `tail`
+        :returns: The value of the counter
+        '''
+        entry = self._read(self._get_key(name, counter))
+        return long(entry['version']) if entry else 0
+
+    def _read(self, key):
+        ''' Retrieve the raw entry of the supplied queue key.
+
+        :param key: The key of the entry to retrieve
+        :returns: The fields of the entry if it exists, None otherwise
+        '''
+        return self.client._call_backend('get', self.client.backend.retrieve_entry, key, True)
+
+    @staticmethod
+    def _get_key(name, key):
+        ''' Retrieve the name of the supplied queue entry of a lock.
+
+        :param name: The name of the lock
+        :param key: The key of the queue entry
+        :returns: The name of the queue entry
+        '''
+        return '%s%s#%s' % (QUEUE_PREFIX, name, key)
+
+    @staticmethod
+    def _get_grant(owner, number):
+        ''' Retrieve the owner that a lock handed to the supplied
+        ticket is written with.
+
+        :param owner: The owner of the ticket
+        :param number: The number of the ticket
+        :returns: The owner of the handed over lock
+        '''
+        return '%s#%d' % (owner, number)
@@ -0,0 +1,319 @@
+'''
+The watcher consumes the change feed of the lock table so that the lock
+client learns that a lock was released or deleted as soon as it happens
+instead of on its next poll of the lock entry::
+
+    from dynamolock import DynamoDBLockClient, DynamoDBLockWatcher
+    from dynamolock import DynamoDBLockStreamFeed
+
+    watcher = DynamoDBLockWatcher(feed=DynamoDBLockStreamFeed(table_name='locks'))
+    watcher.start()
+    client  = DynamoDBLockClient(watcher=watcher)
+    watcher.watch('reports', lambda change: log(change.event, change.lock))
+
+A pending `acquire_lock` of the client is woken as soon as the lock it is
+waiting for is released, so the takeover latency drops from the retry
+period to the delay of the feed. The polling of the acquire protocol is
+kept as is, so a slow or broken feed can only make us as slow as before.
+
+In production the feed is the dynamodb stream of the lock table (which
+must be enabled with a `NEW_IMAGE` or `NEW_AND_OLD_IMAGES` view), while
+the in-memory table publishes its changes to a `DynamoDBLockLocalFeed`.
+A single watcher may be shared by every client of the same table, as long
+as they all use the same clock.
+'''
+from threading import Thread, Event, Lock
+from collections import namedtuple
+
+from boto.dynamodb2.types import Dynamizer
+
+from .lock   import DynamoDBLock
+from .schema import DynamoDBLockSchema
+from .policy import DynamoDBLockPolicy
+
+#--------------------------------------------------------------------------------
+# logging
+#--------------------------------------------------------------------------------
+
+import logging
+_logger = logging.getLogger(__name__)
+
+#--------------------------------------------------------------------------------
+# classes
+#--------------------------------------------------------------------------------
+
+class DynamoDBLockChange(namedtuple('DynamoDBLockChange', ['name', 'event', 'lock'])):
+    ''' A single change of a lock entry: its name, the kind of
+    change (`insert`, `modify`, or `remove`), and the new state of
+    the lock (None when it was removed).
+    '''
+    __slots__ = ()
+
+    @property
+    def is_released(self):
+        ''' True if the change left the lock free to acquire.
+        '''
+        return (self.lock is None) or (not self.lock.is_locked)
+
+
+class DynamoDBLockWatcher(object):
+    ''' The dispatcher of the changes of a lock table to the
+    callbacks watching each lock name.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockWatcher class
+
+        :param feed: The change feed of the lock table to consume
+        :param policy: The policy to read the time from (default the policy of the first client it is given to)
+        '''
+        self.feed      = kwargs.get('feed', None)
+        self.policy    = kwargs.get('policy', None) or DynamoDBLockPolicy()
+        self.callbacks = {} # name -> [callback]
+        self._mutex    = Lock()
+        self._is_bound = kwargs.get('policy', None) is not None
+
+    def use_policy(self, policy):
+        ''' Read the time from the clock of the supplied policy,
+        unless the watcher is already bound to a policy. Every change
+        is stamped once for all of its callbacks, so every policy that
+        shares the watcher must use the same clock.
+
+        :param policy: The policy of a client using the watcher
+        :raises ValueError: If the watcher is bound to another clock
+        '''
+        with self._mutex:
+            if not self._is_bound:
+                self.policy, self._is_bound = policy, True
+            elif self.policy.clock != policy.clock:
+                raise ValueError("the watcher is already used with another clock")
+
+    def start(self):
+        ''' Start consuming the change feed.
+        '''
+        if self.feed: self.feed.start(self)
+
+    def stop(self):
+        ''' Stop consuming the change feed.
+        '''
+        if self.feed: self.feed.stop()
+
+    def watch(self, name, callback):
+        ''' Call the supplied callback with a `DynamoDBLockChange`
+        for every change of the named lock until it is unwatched. The
+        callback is called on the thread of the feed, so it should
+        return quickly.
+
+        :param name: The name of the lock to watch
+        :param callback: The callback to call on every change
+        '''
+        with self._mutex:
+            self.callbacks.setdefault(name, []).append(callback)
+
+    def unwatch(self, name, callback):
+        ''' Stop calling the supplied callback for the named lock.
+
+        :param name: The name of the lock to stop watching
+        :param callback: The callback to stop calling
+        '''
+        with self._mutex:
+            callbacks = self.callbacks.get(name, [])
+            if callback in callbacks: callbacks.remove(callback)
+            if not callbacks: self.callbacks.pop(name, None)
+
+    def watch_released(self, name):
+        ''' Watch the named lock for being released.
+
+        :param name: The name of the lock to watch
+        :returns: The (event, callback) pair, the event is set on every release
+        '''
+        event = Event()
+        def callback(change):
+            if change.is_released: event.set()
+        self.watch(name, callback)
+        return event, callback
+
+    def notify(self, name, event, entry):
+        ''' Dispatch a single change of the lock table to all of
+        the callbacks watching its name. This is called by the feed.
+
+        :param name: The name of the changed lock
+        :param event: The kind of change, `insert`, `modify`, or `remove`
+        :param entry: The fields of the new lock entry (None when removed)
+        '''
+        with self._mutex:
+            callbacks = list(self.callbacks.get(name, ()))
+        if not callbacks: return
+
+        lock   = DynamoDBLock(**dict(entry, timestamp=self.policy.get_new_timestamp())) if entry else None
+        change = DynamoDBLockChange(name, event, lock)
+        for callback in callbacks:
+            try:
+                callback(change)
+            except Exception:
+                _logger.exception("failed notifying change of lock: %s", name)
+
+
+class DynamoDBLockLocalFeed(object):
+    ''' The change feed of a `DynamoDBLockMemoryTable`, which is
+    delivered synchronously by the thread that made each change.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockLocalFeed class
+
+        :param table: The in-memory table to consume the changes of
+        :param schema: The schema of the database table to work with
+        '''
+        self.table    = kwargs.get('table')
+        self.schema   = kwargs.get('schema', None) or self.table.schema
+        self._publish = None
+
+    def start(self, watcher):
+        ''' Start delivering the changes of the table to the
+        supplied watcher.
+
+        :param watcher: The watcher to deliver the changes to
+        '''
+        def publish(event, key, item):
+            watcher.notify(key, event, self.schema.to_dict(item) if item else None)
+        self._publish = publish
+        self.table.subscribe(publish)
+
+    def stop(self):
+        ''' Stop delivering the changes of the table.
+        '''
+        if self._publish:
+            self.table.unsubscribe(self._publish)
+            self._publish = None
+
+
+class DynamoDBLockStreamFeed(object):
+    ''' The change feed of a dynamodb table read from its
+    dynamodb stream by a background thread. This requires a version
+    of boto that includes `boto.dynamodbstreams`.
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initialize a new instance of the DynamoDBLockStreamFeed class
+
+        :param stream_arn: The arn of the stream (default the latest stream of the table)
+        :param table_name: The table to read the stream of (default the schema table name)
+        :param schema: The schema of the database table to work with
+        :param region: The region of the stream (default us-east-1)
+        :param connection: The dynamodb streams connection to use
+        :param period: The timedelta to wait between empty polls (default 250 ms)
+        '''
+        period = kwargs.get('period', None)
+        self.schema     = kwargs.get('schema', None) or DynamoDBLockSchema()
+        self.table_name = kwargs.get('table_name', self.schema.table_name)
+        self.stream_arn = kwargs.get('stream_arn', None)
+        self.region     = kwargs.get('region', None) or 'us-east-1'
+        self.connection = kwargs.get('connection', None)
+        self.period     = period.total_seconds() if period else 0.25
+        self.iterators  = {} # shard id -> shard iterator
+        self._closed    = set()
+        self._dynamizer = Dynamizer()
+        self._stopped   = Event()
+        self._thread    = None
+
+    def start(self, watcher):
+        ''' Start reading the stream on a background thread and
+        delivering its changes to the supplied watcher.
+
+        :param watcher: The watcher to deliver the changes to
+        '''
+        if not self.connection:
+            from boto.dynamodbstreams import connect_to_region
+            self.connection = connect_to_region(self.region)
+        if not self.stream_arn:
+            streams = self.connection.list_streams(table_name=self.table_name)['Streams']
+            if not streams: raise ValueError("no stream is enabled on table %s" % self.table_name)
+            self.stream_arn = streams[0]['StreamArn']
+
+        self._stopped.clear()
+        self._refresh_shards('LATEST')
+        self._thread = Thread(target=self._run, args=(watcher,), name='dynamolock-stream')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        ''' Stop reading the stream.
+
+        :param timeout: The seconds to wait for the thread to stop
+        '''
+        self._stopped.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def poll(self, watcher):
+        ''' Read one batch of records from every open shard of the
+        stream and deliver them to the supplied watcher.
+
+        :param watcher: The watcher to deliver the changes to
+        :returns: The number of records that were delivered
+        '''
+        count = 0
+        for shard, iterator in self.iterators.items():
+            response = self.connection.get_records(iterator, limit=1000)
+            for record in response.get('Records', []):
+                self._deliver(watcher, record)
+                count += 1
+
+            next_iterator = response.get('NextShardIterator')
+            if next_iterator: self.iterators[shard] = next_iterator
+            else: # the shard was closed, its children take over
+                del self.iterators[shard]
+                self._closed.add(shard)
+                self._refresh_shards('TRIM_HORIZON')
+        return count
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _run(self, watcher):
+        ''' Read the stream until we are stopped.
+
+        :param watcher: The watcher to deliver the changes to
+        '''
+        while not self._stopped.is_set():
+            try:
+                if not self.poll(watcher):
+                    self._stopped.wait(self.period)
+            except Exception:
+                _logger.exception("failed reading the stream of table %s", self.table_name)
+                self._stopped.wait(self.period)
+
+    def _refresh_shards(self, position):
+        ''' Start reading any open shard that we are not reading yet
+        from the supplied position.
+
+        :param position: Where to start reading new shards, `LATEST` or `TRIM_HORIZON`
+        '''
+        start = None
+        while True:
+            stream = self.connection.describe_stream(self.stream_arn,
+                exclusive_start_shard_id=start)['StreamDescription']
+            for shard in stream.get('Shards', []):
+                shard_id = shard['ShardId']
+                is_open  = 'EndingSequenceNumber' not in shard.get('SequenceNumberRange', {})
+                if is_open and shard_id not in self.iterators and shard_id not in self._closed:
+                    self.iterators[shard_id] = self.connection.get_shard_iterator(
+                        self.stream_arn, shard_id, position)['ShardIterator']
+            start = stream.get('LastEvaluatedShardId')
+            if not start: break
+
+    def _deliver(self, watcher, record):
+        ''' Deliver a single stream record to the supplied watcher.
+
+        :param watcher: The watcher to deliver the change to
+        :param record: The raw stream record
+        '''
+        change = record['dynamodb']
+        event  = record['eventName'].lower()
+        keys   = { key : self._dynamizer.decode(value) for key, value in change['Keys'].items() }
+        image  = change.get('NewImage') if event != 'remove' else None
+        entry  = self.schema.to_dict({ key : self._dynamizer.decode(value)
+            for key, value in image.items() }) if image else None
+        watcher.notify(keys[self.schema.name], event, entry)
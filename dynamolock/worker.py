@@ -1,8 +1,13 @@
-import time
-from threading import Thread, Event
+import heapq
+import random
+from threading import Thread, Event, Condition
 from datetime import timedelta
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
 
-from .policy import DynamoDBLockPolicy
+from .policy  import DynamoDBLockPolicy
+from .metrics import DynamoDBLockMetrics
+from .limiter import DynamoDBLockThrottledError
 
 #--------------------------------------------------------------------------------
 # logging
@@ -15,11 +20,26 @@ _logger = logging.getLogger(__name__)
 # classes
 #--------------------------------------------------------------------------------
 
+DynamoDBLockSweep = namedtuple('DynamoDBLockSweep',
+    ['count', 'failures', 'duration'])
+
+
 class DynamoDBLockWorker(Thread):
     ''' The worker that runs to periodically update lock leases as long
     as the system is alive. This prevents long running processes from
     losing their locks by possibly fast clients.
 
+    Each lock is renewed on its own schedule: after a fraction of its
+    own lease (`renew_ratio`) has passed, less a random `jitter` so
+    that many processes holding locks do not renew in lockstep. The
+    worker keeps the next renewal deadlines in a heap and sleeps until
+    the earliest one, or until it is told about a new lock.
+
+    The locks that are due at the same time are renewed through a
+    bounded pool of threads that all share the client's table handle
+    (and thus its underlying connection pool), so renewing N locks
+    costs roughly N / concurrency round trips instead of N.
+
     .. code-block:: python
 
         from dynamodb import DynamoDBLockWorker
@@ -27,8 +47,8 @@ class DynamoDBLockWorker(Thread):
 
         # Note, this is actually all internal to the client,
         # do not do this.
-        client = DynamoDBLockClient() 
-        worker = DynamoDBLockWorker(client=client)
+        client = DynamoDBLockClient()
+        worker = DynamoDBLockWorker(client=client, concurrency=16)
         worker.start()
         worker.stop(timeout=10) # seconds
     '''
@@ -37,38 +57,295 @@ class DynamoDBLockWorker(Thread):
         ''' Initializes a new instance of the DynamoDBLock class
 
         :param daemon: True to daemonize the thread, False otherwise (default True)
-        :param client: The client to perform management with
-        :param policy: The policy to operate the worker with
+        :param client: The client to perform management with (or None)
+        :param policy: The policy to operate the worker with (default the client policy)
         :param locks: The dictionary of locks to manage (default the client locks)
-        :param period: The length of each cycle in seconds (default 1 minutes)
+        :param period: The longest time in seconds between renewals (default None)
+        :param concurrency: The maximum number of renewals in flight (default 8)
+        :param renew_ratio: The fraction of a lease after which to renew it (default 1/3)
+        :param jitter: The fraction of the renewal time to randomize (default 0.1)
+        :param metrics: The metrics registry to record to (default the client metrics)
         '''
         super(DynamoDBLockWorker, self).__init__()
 
         self.daemon = kwargs.get('daemon', True)
         self.client = kwargs.get('client')
-        self.policy = kwargs.get('policy', DynamoDBLockPolicy())
-        self.locks  = kwargs.get('locks', self.client.locks)
-        self.period = kwargs.get('period', timedelta(seconds=10).total_seconds())
+        self.policy = (kwargs.get('policy', None)
+            or getattr(self.client, 'policy', None) or DynamoDBLockPolicy())
+        self.locks  = kwargs.get('locks', self.client.locks if self.client else {})
+        self.period = kwargs.get('period', None)
+        self.concurrency = max(kwargs.get('concurrency', 8), 1)
+        self.renew_ratio = kwargs.get('renew_ratio', 1 / 3.0)
+        self.jitter      = kwargs.get('jitter', 0.1)
+        self.metrics     = (kwargs.get('metrics', None)
+            or getattr(self.client, 'metrics', None) or DynamoDBLockMetrics())
+        self.last_sweep  = None
         self._is_stopped = Event()
+        self._wakeup     = Condition()
+        self._schedule   = [] # heap of (deadline, owner, name)
+        self._deadlines  = {} # (owner, name) -> current deadline
+        self._clients    = {} # owner -> client
+        self._pool       = None
+
+    def register(self, client):
+        ''' Register another client whose locks this worker
+        should renew along with its own. The locks of a client are
+        identified by their owner, so each registered client must
+        have a unique owner. The renewals of a client are timed with
+        its own policy, but they are all kept on the clock of the
+        worker, so the client must use the same clock.
+
+        :param client: The client to renew the locks of
+        :raises ValueError: If the client uses a different clock
+        '''
+        if client.policy.clock != self.policy.clock:
+            raise ValueError("the client clock must match the worker clock")
+        with self._wakeup:
+            self._clients[client.owner] = client
+        if self.is_alive():
+            for lock in list(client.locks.values()):
+                self.schedule(lock)
+
+    def unregister(self, client):
+        ''' Stop renewing the locks of a previously registered
+        client. Their pending renewals are simply discarded.
+
+        :param client: The client to stop renewing the locks of
+        '''
+        with self._wakeup:
+            self._clients.pop(client.owner, None)
 
     def stop(self, timeout=None):
         ''' Stop the underlying worker thread and join on its
-        completion for the specified timeout.
+        completion for the specified timeout. The worker is woken
+        right away, so this only waits for a sweep in flight.
 
         :param timeout: The amount of time to wait for the shutdown
         '''
         self._is_stopped.set()
+        with self._wakeup:
+            self._wakeup.notify()
         if self.is_alive(): self.join(timeout)
+        elif self._pool: # only swept by hand
+            self._pool.close()
+            self._pool = None
+
+    def schedule(self, lock, deadline=None):
+        ''' Schedule the next renewal of the supplied lock based
+        on its lease, waking the worker if this is now the earliest
+        renewal.
+
+        :param lock: The lock to schedule the renewal of
+        :param deadline: The time to renew the lock at (default from its lease)
+        '''
+        deadline = deadline or self.get_renewal_deadline(lock)
+        with self._wakeup:
+            self._deadlines[(lock.owner, lock.name)] = deadline
+            heapq.heappush(self._schedule, (deadline, lock.owner, lock.name))
+            if self._schedule[0][0] == deadline:
+                self._wakeup.notify()
+
+    def get_renewal_deadline(self, lock):
+        ''' Retrieve the time at which the supplied lock should
+        next be renewed. The jitter only ever moves the renewal
+        earlier so that it never eats into the safety margin, and
+        the ratio is taken of the lease that we trust (less the
+        `lease_margin` of the policy of the lock owner).
+
+        :param lock: The lock to get the renewal time of
+        :returns: The renewal time in milliseconds
+        '''
+        policy   = self._get_policy(lock.owner)
+        interval = (policy.get_lease_end(lock) - lock.timestamp) * self.renew_ratio
+        if self.period is not None:
+            interval = min(interval, self.period * 1000)
+        interval *= 1 - random.uniform(0, self.jitter)
+        return long(lock.timestamp + interval)
+
+    def get_retry_deadline(self, lock):
+        ''' Retrieve the time at which the renewal of the supplied
+        lock should be retried after it was throttled: halfway to the
+        end of its lease, so that we get a few more tries before it
+        can be taken from us.
+
+        :param lock: The lock to get the retry time of
+        :returns: The retry time in milliseconds
+        '''
+        policy  = self._get_policy(lock.owner)
+        now     = policy.get_new_timestamp()
+        expires = policy.get_lease_end(lock)
+        return now + max((expires - now) // 2, 1)
+
+    def sweep(self, locks=None):
+        ''' Perform a single renewal pass over the supplied locks
+        (by default all the currently held locks) and schedule the
+        next renewal of each lock that we kept, see `renew`.
+
+        :param locks: The locks to renew (default all held locks)
+        :returns: The DynamoDBLockSweep report for this pass
+        '''
+        for lock, deadline in self.renew(locks):
+            self.schedule(lock, deadline)
+        return self.last_sweep
+
+    def renew(self, locks=None):
+        ''' Renew the supplied locks (by default all the currently
+        held locks) without scheduling them, so that the caller may
+        drive the renewals itself. The renewals are issued
+        concurrently, but never more than `concurrency` at once.
+
+        Any lock that fails to be renewed is dropped from the set
+        of held locks. A lock whose renewal was throttled is kept
+        and retried before its lease runs out.
+
+        :param locks: The locks to renew (default all held locks)
+        :returns: The list of (lock, next renewal deadline) of the kept locks
+        '''
+        start = self.policy.get_new_timestamp()
+        locks = self._get_all_locks() if locks is None else locks
 
-    def run(self): 
+        if len(locks) > 1 and self.concurrency > 1:
+            if not self._pool:
+                self._pool = ThreadPool(processes=self.concurrency)
+            touched = self._pool.map(self._touch_lock, locks)
+        else: touched = [self._touch_lock(lock) for lock in locks]
+        return self.settle(locks, touched, start)
+
+    def settle(self, locks, touched, start):
+        ''' Settle the outcome of renewing the supplied locks, see
+        `renew`, for a caller that touched the locks itself (with
+        `touch_lock` of each lock) instead of on our pool.
+
+        :param locks: The locks that were renewed
+        :param touched: The renewed lock of each, the same lock if throttled, or None on failure
+        :param start: The time at which the renewals started
+        :returns: The list of (lock, next renewal deadline) of the kept locks
+        '''
+        failures, renewals = 0, []
+        for lock, new_lock in zip(locks, touched):
+            if new_lock is lock: # throttled
+                renewals.append((lock, self.get_retry_deadline(lock)))
+            elif new_lock:
+                renewals.append((new_lock, self.get_renewal_deadline(new_lock)))
+            else:
+                failures += 1
+                held = self._get_locks(lock.owner)
+                if held.get(lock.name) is lock:
+                    held.pop(lock.name, None)
+
+        duration = self.policy.get_new_timestamp() - start
+        self.last_sweep = DynamoDBLockSweep(len(locks), failures, duration)
+        self.metrics.observe('dynamolock_sweep_duration_ms', duration)
+        self.metrics.increment('dynamolock_renewals_total', len(locks) - failures, result='renewed')
+        self.metrics.increment('dynamolock_renewals_total', failures, result='failed')
+        if failures:
+            _logger.warning("worker sweep failed to renew %d of %d locks in %d ms", failures, len(locks), duration)
+        else: _logger.debug("worker sweep renewed %d locks in %d ms", len(locks), duration)
+        return renewals
+
+    def run(self):
         ''' The worker thread used to update the lock leases
         for the currently handled locks.
         '''
-        while not self._is_stopped.is_set():
-            _logger.debug("starting next round of worker: %d locks", len(self.locks))
-            start = self.policy.get_new_timestamp()
-            for lock in self.locks.values():
-                if not self.client.touch_lock(lock):
-                    del self.locks[lock.name]
-            elapsed = (self.policy.get_new_timestamp() - start) / 1000
-            time.sleep(max(self.period - elapsed, 0))
+        for lock in self._get_all_locks():
+            self.schedule(lock)
+
+        try:
+            while not self._is_stopped.is_set():
+                locks = self._get_due_locks()
+                if locks:
+                    _logger.debug("starting next round of worker: %d locks", len(locks))
+                    self.sweep(locks)
+        finally:
+            if self._pool:
+                self._pool.close()
+                self._pool = None
+
+    # ------------------------------------------------------------
+    # private methods
+    # ------------------------------------------------------------
+
+    def _get_client(self, owner):
+        ''' Retrieve the client that owns the locks of the supplied
+        owner, by default the client of the worker.
+
+        :param owner: The owner of the locks
+        :returns: The client that owns the locks
+        '''
+        return self._clients.get(owner, self.client)
+
+    def _get_policy(self, owner):
+        ''' Retrieve the policy that times the locks of the supplied
+        owner, by default the policy of the worker.
+
+        :param owner: The owner of the locks
+        :returns: The policy of the client that owns the locks
+        '''
+        return getattr(self._get_client(owner), 'policy', None) or self.policy
+
+    def _get_locks(self, owner):
+        ''' Retrieve the held locks of the supplied owner.
+
+        :param owner: The owner of the locks
+        :returns: The dictionary of the held locks of the owner
+        '''
+        client = self._clients.get(owner)
+        return client.locks if client else self.locks
+
+    def _get_all_locks(self):
+        ''' Retrieve all of the held locks of all of the clients
+        that this worker renews the locks for.
+
+        :returns: The list of all of the held locks
+        '''
+        locks = list(self.locks.values())
+        for client in list(self._clients.values()):
+            if client.locks is not self.locks:
+                locks.extend(client.locks.values())
+        return locks
+
+    def _get_due_locks(self):
+        ''' Wait until the earliest renewal deadline (or until we
+        are woken) and then collect all of the locks that are due.
+        Stale schedule entries for locks that have since been
+        released or rescheduled are discarded.
+
+        :returns: The list of locks that are due to be renewed
+        '''
+        with self._wakeup:
+            now = self.policy.get_new_timestamp()
+            if self._is_stopped.is_set(): # checked under the lock so a stop is never missed
+                return []
+            if not self._schedule or self._schedule[0][0] > now:
+                timeout = (self._schedule[0][0] - now) / 1000.0 if self._schedule else None
+                self._wakeup.wait(timeout)
+                now = self.policy.get_new_timestamp()
+                if self._is_stopped.is_set(): return []
+
+            locks = []
+            while self._schedule and self._schedule[0][0] <= now:
+                deadline, owner, name = heapq.heappop(self._schedule)
+                if self._deadlines.get((owner, name)) != deadline:
+                    continue # this entry was rescheduled since
+                del self._deadlines[(owner, name)]
+                lock = self._get_locks(owner).get(name)
+                if lock:
+                    self.metrics.observe('dynamolock_renewal_lag_ms', now - deadline)
+                    locks.append(lock)
+            return locks
+
+    def _touch_lock(self, lock):
+        ''' Helper to renew a single lock, making sure that an
+        error on one lock does not abort the rest of the sweep.
+
+        :param lock: The lock to renew
+        :returns: The renewed lock, the same lock if throttled, or None on failure
+        '''
+        try:
+            return self._get_client(lock.owner).touch_lock(lock)
+        except DynamoDBLockThrottledError:
+            _logger.warning("throttled renewing lock, will retry: %s", lock.name)
+            return lock
+        except Exception:
+            _logger.exception("failed to renew lock: %s", lock.name)
+        return None
@@ -25,6 +25,10 @@ setup(name  = 'dynamolock',
     extras_require = {
         'quality'   : [ 'coverage >= 3.5.3', 'nose >= 1.3.1', 'mock >= 1.0.0', 'pep8 >= 1.3.3' ],
         'documents' : [ 'Sphinx >= 1.2.2' ],
+        'async'     : [ 'trollius >= 2.0' ],
+        'msgpack'   : [ 'msgpack >= 0.6.0' ],
+        'zstd'      : [ 'zstandard >= 0.10.0' ],
+        'monotonic' : [ 'monotonic >= 1.0' ],
     },
     test_suite = 'nose.collector'
 )